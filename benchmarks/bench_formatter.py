@@ -0,0 +1,73 @@
+"""
+    Microbenchmark of 300 row formatting
+
+    Compares writing rows with csv.writer against the batch formatter
+    used by NEM12.build_lines. Run with: python benchmarks/bench_formatter.py
+"""
+
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+from io import StringIO
+
+from nemwriter import NEM12
+from nemwriter.output import write_rows
+
+
+def build(num_days: int, interval: int) -> NEM12:
+    random.seed(1)
+    m = NEM12(to_participant="BENCH")
+    num_intervals = num_days * 24 * 60 // interval
+    readings = [
+        [
+            datetime(2024, 1, 1) + timedelta(minutes=interval * (i + 1)),
+            round(random.random() * 3, 3),
+            "A",
+        ]
+        for i in range(num_intervals)
+    ]
+    m.add_readings(
+        nmi="NMI0000001",
+        nmi_configuration="E1",
+        nmi_suffix="E1",
+        uom="kWh",
+        readings=readings,
+    )
+    return m
+
+
+def csv_writer_path(m: NEM12) -> int:
+    with StringIO(newline="") as stream:
+        write_rows(m.build_output(), stream)
+        return len(stream.getvalue())
+
+
+def formatter_path(m: NEM12) -> int:
+    with StringIO(newline="") as stream:
+        stream.writelines(m.build_lines())
+        return len(stream.getvalue())
+
+
+def timed(func, m: NEM12) -> float:
+    start = time.perf_counter()
+    func(m)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--interval", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    m = build(args.days, args.interval)
+    assert csv_writer_path(m) == formatter_path(m)
+    for name, func in [("csv.writer", csv_writer_path), ("formatter", formatter_path)]:
+        best = min(timed(func, m) for _ in range(args.repeat))
+        print(f"{name:>12}: {args.days / best:,.0f} day rows/s ({best:.3f}s)")
+
+
+if __name__ == "__main__":
+    main()
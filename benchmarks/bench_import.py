@@ -0,0 +1,59 @@
+"""
+    Benchmark of the time to import nemwriter
+
+    Each import runs in a fresh interpreter, timed against a bare interpreter
+    start. numpy and pandas should only be loaded once dataframes are used.
+    Run with: python benchmarks/bench_import.py
+"""
+
+import argparse
+import subprocess
+import sys
+import time
+
+CASES = {
+    "python": "pass",
+    "nemwriter": "import nemwriter",
+    "nemwriter+pandas": "import nemwriter, pandas",
+}
+HEAVY_MODULES = ("numpy", "pandas", "pyarrow")
+
+
+def timed_import(code: str) -> float:
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", code], check=True)
+    return time.perf_counter() - start
+
+
+def loaded_modules(code: str) -> list[str]:
+    """Get the heavy modules loaded after running some code"""
+    check = (
+        f"import sys; {code}; print(*[x for x in {HEAVY_MODULES} if x in sys.modules])"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", check], check=True, capture_output=True, text=True
+    )
+    return result.stdout.split()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--limit", type=float, help="Fail if importing nemwriter takes longer (s)"
+    )
+    args = parser.parse_args()
+
+    best = {}
+    for name, code in CASES.items():
+        best[name] = min(timed_import(code) for _ in range(args.repeat))
+        print(f"{name:>18}: {best[name]:.3f}s")
+    cost = best["nemwriter"] - best["python"]
+    heavy = loaded_modules(CASES["nemwriter"])
+    print(f"{'import nemwriter':>18}: {cost:.3f}s, loads {', '.join(heavy) or 'none'}")
+    if heavy or (args.limit is not None and cost > args.limit):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
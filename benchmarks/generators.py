@@ -0,0 +1,103 @@
+"""
+    Synthetic meter data for benchmarks
+"""
+
+from collections.abc import Generator
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+START = datetime(2024, 1, 1)
+CHANNELS = ("E1", "B1")
+VARIANTS = 16  # Distinct frames to cycle through when generating many NMIs
+
+
+def nmi_name(i: int) -> str:
+    return f"NMI{i:07d}"
+
+
+def interval_frame(
+    num_days: int,
+    interval: int,
+    quality: bool = False,
+    seed: int = 0,
+    channels: tuple[str, ...] = CHANNELS,
+) -> pd.DataFrame:
+    """Wide dataframe of interval reads, optionally with mixed quality and gaps"""
+    rng = np.random.default_rng(seed)
+    num_intervals = num_days * 24 * 60 // interval
+    index = pd.date_range(
+        START + timedelta(minutes=interval),
+        periods=num_intervals,
+        freq=f"{interval}min",
+    )
+    data = {ch: np.round(rng.gamma(1.5, 0.3, num_intervals), 3) for ch in channels}
+    df = pd.DataFrame(data, index=index)
+    if quality:
+        estimated = rng.random(num_intervals) < 0.02
+        df["Quality"] = np.where(estimated, "E52", "A")
+        df["EventDesc"] = np.where(estimated, "Estimated", None)
+        missing = rng.random(num_intervals) < 0.01
+        df.loc[missing, channels[0]] = np.nan
+    return df
+
+
+def interval_frames(
+    num_nmis: int, num_days: int, interval: int, quality: bool = False
+) -> Generator[tuple[str, pd.DataFrame], None, None]:
+    """Emit (nmi, dataframe) pairs, reusing a few distinct frames"""
+    variants = [
+        interval_frame(num_days, interval, quality, seed)
+        for seed in range(min(num_nmis, VARIANTS))
+    ]
+    for i in range(num_nmis):
+        yield nmi_name(i), variants[i % len(variants)]
+
+
+def interval_readings(
+    num_days: int, interval: int, quality: bool = False, seed: int = 0
+) -> list[tuple]:
+    """Readings in the (end, value, quality, event_code, event_desc) form"""
+    df = interval_frame(num_days, interval, quality, seed, channels=("E1",))
+    values = df["E1"].tolist()
+    if not quality:
+        return [(end, val, "A") for end, val in zip(df.index, values, strict=True)]
+    return [
+        (end, val, q, 79 if q != "A" else None, desc)
+        for end, val, q, desc in zip(
+            df.index, values, df["Quality"], df["EventDesc"], strict=True
+        )
+        if not np.isnan(val)
+    ]
+
+
+def accumulation_records(
+    num_nmis: int, num_reads: int, quality: bool = False
+) -> Generator[dict, None, None]:
+    """Keyword arguments for NEM13.add_reading, a quarterly read per record"""
+    rng = np.random.default_rng(0)
+    for i in range(num_nmis):
+        reading = 1000
+        read_date = START
+        for _ in range(num_reads):
+            quantity = int(rng.integers(100, 1000))
+            next_date = read_date + timedelta(days=91)
+            estimated = quality and rng.random() < 0.1
+            yield {
+                "nmi": nmi_name(i),
+                "nmi_configuration": "11",
+                "register_id": "01",
+                "nmi_suffix": "11",
+                "previous_read": reading,
+                "previous_read_date": read_date,
+                "current_read": reading + quantity,
+                "current_read_date": next_date,
+                "quantity": quantity,
+                "meter_serial_number": "31188",
+                "previous_quality_method": "A",
+                "current_quality_method": "E52" if estimated else "A",
+                "current_reason_code": 79 if estimated else None,
+            }
+            reading += quantity
+            read_date = next_date
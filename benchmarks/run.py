@@ -0,0 +1,262 @@
+"""
+    Benchmark suite for NEM12 and NEM13 generation
+
+    Each case runs in a fresh process so peak memory is measured on its own.
+    Results are written as JSON, and can be compared to an earlier run:
+
+    python benchmarks/run.py --preset small --output results.json
+    python benchmarks/run.py --preset small --compare results.json
+"""
+
+import argparse
+import json
+import platform
+import resource
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from multiprocessing import get_context
+from pathlib import Path
+
+import pandas as pd
+from generators import (
+    accumulation_records,
+    interval_frames,
+    interval_readings,
+    nmi_name,
+)
+
+import nemwriter
+from nemwriter import NEM12, NEM13
+
+NEM12_STAGES = [
+    "add_dataframe",
+    "add_readings",
+    "build_output",
+    "build_lines",
+    "output_csv",
+    "output_zip",
+]
+
+
+@dataclass
+class Case:
+    stage: str
+    nmis: int
+    days: int
+    interval: int = 30
+    quality: bool = False
+
+    @property
+    def name(self) -> str:
+        quality = "mixed" if self.quality else "actual"
+        return f"{self.stage}[{self.nmis}nmi-{self.days}d-{self.interval}min-{quality}]"
+
+
+def nem12_cases(sizes: list[tuple[int, int, int]], quality: bool) -> list[Case]:
+    return [
+        Case(stage, nmis, days, interval, quality)
+        for nmis, days, interval in sizes
+        for stage in NEM12_STAGES
+    ]
+
+
+def nem13_cases(nmis: int) -> list[Case]:
+    return [
+        Case(stage, nmis, days=4, quality=True)
+        for stage in ("nem13_add_reading", "nem13_add_dataframe")
+    ]
+
+
+PRESETS = {
+    "small": nem12_cases([(1, 1, 30), (10, 7, 5), (100, 1, 15)], quality=True)
+    + nem13_cases(100),
+    "medium": nem12_cases([(1, 365, 5), (100, 30, 30), (1000, 1, 30)], quality=True)
+    + nem13_cases(10_000),
+    "production": nem12_cases(
+        [(1, 365, 5), (1000, 30, 5), (10_000, 30, 30), (100_000, 1, 30)],
+        quality=True,
+    )
+    + nem13_cases(100_000),
+}
+
+
+def build_nem12(case: Case) -> NEM12:
+    m = NEM12(to_participant="BENCH")
+    for nmi, df in interval_frames(case.nmis, case.days, case.interval, case.quality):
+        m.add_dataframe(nmi, df)
+    return m
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        return peak / 2**20  # Bytes on macOS, kilobytes elsewhere
+    return peak / 2**10
+
+
+def run_case(case: Case) -> dict:
+    """Set up and time a single case, called in its own process"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        work, count_rows = setup(case, Path(tmp_dir))
+        start_rss = peak_rss_mb()
+        start = time.perf_counter()
+        result = work()
+        seconds = time.perf_counter() - start
+        rows = count_rows(result)
+        file_bytes = result.stat().st_size if isinstance(result, Path) else None
+
+    return {
+        "case": case.name,
+        **asdict(case),
+        "seconds": seconds,
+        "rows": rows,
+        "rows_per_second": rows / seconds if seconds else None,
+        "bytes": file_bytes,
+        "peak_rss_mb": peak_rss_mb(),
+        "rss_growth_mb": peak_rss_mb() - start_rss,
+    }
+
+
+def setup(case: Case, tmp_dir: Path) -> tuple[Callable, Callable]:
+    """Get the timed work of a case, and how to count the rows it made"""
+
+    def meter_rows(m):
+        return sum(len(rows) for ch in m.meters.values() for rows in ch.values())
+
+    if case.stage == "add_dataframe":
+        frames = list(
+            interval_frames(case.nmis, case.days, case.interval, case.quality)
+        )
+
+        def work():
+            m = NEM12(to_participant="BENCH")
+            for nmi, df in frames:
+                m.add_dataframe(nmi, df)
+            return m
+
+        return work, meter_rows
+
+    if case.stage == "add_readings":
+        readings = [
+            interval_readings(case.days, case.interval, case.quality, seed)
+            for seed in range(min(case.nmis, 16))
+        ]
+
+        def work():
+            m = NEM12(to_participant="BENCH")
+            for i in range(case.nmis):
+                m.add_readings(
+                    nmi=nmi_name(i),
+                    nmi_configuration="E1",
+                    nmi_suffix="E1",
+                    uom="kWh",
+                    readings=readings[i % len(readings)],
+                )
+            return m
+
+        return work, meter_rows
+
+    if case.stage == "nem13_add_reading":
+        records = list(accumulation_records(case.nmis, case.days, case.quality))
+
+        def work():
+            m = NEM13(to_participant="BENCH")
+            for record in records:
+                m.add_reading(**record)
+            return m
+
+        return work, meter_rows
+
+    if case.stage == "nem13_add_dataframe":
+        df = pd.DataFrame(
+            list(accumulation_records(case.nmis, case.days, case.quality))
+        )
+
+        def work():
+            m = NEM13(to_participant="BENCH")
+            m.add_dataframe(df)
+            return m
+
+        return work, meter_rows
+
+    m = build_nem12(case)
+    if case.stage == "build_output":
+        return lambda: sum(1 for _ in m.build_output()), int
+    if case.stage == "build_lines":
+        return lambda: sum(1 for _ in m.build_lines()), int
+    output_rows = meter_rows(m) + 2
+    if case.stage == "output_csv":
+        return lambda: Path(m.output_csv(tmp_dir / "bench.csv")), lambda x: output_rows
+    if case.stage == "output_zip":
+        return lambda: Path(m.output_zip(tmp_dir / "bench.zip")), lambda x: output_rows
+    raise ValueError(f"Unknown stage {case.stage}")
+
+
+def compare(results: list[dict], baseline_file: Path, tolerance: float) -> bool:
+    """Print the change against a baseline, and if any case is slower"""
+    with open(baseline_file) as f:
+        baseline = {x["case"]: x for x in json.load(f)["results"]}
+    ok = True
+    for result in results:
+        before = baseline.get(result["case"])
+        if before is None:
+            continue
+        ratio = result["seconds"] / before["seconds"]
+        slower = ratio > 1 + tolerance
+        ok = ok and not slower
+        flag = " REGRESSION" if slower else ""
+        print(f"{result['case']:<60} {ratio:6.2f}x time{flag}")
+    return ok
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark NEM12 and NEM13 generation")
+    parser.add_argument("--preset", choices=PRESETS, default="small")
+    parser.add_argument("--stage", action="append", help="Only run these stages")
+    parser.add_argument("--output", type=Path, help="Write results JSON here")
+    parser.add_argument("--compare", type=Path, help="Baseline results JSON")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.2, help="Allowed slowdown vs baseline"
+    )
+    args = parser.parse_args()
+
+    cases = PRESETS[args.preset]
+    if args.stage:
+        cases = [x for x in cases if x.stage in args.stage]
+
+    results = []
+    for case in cases:
+        # A new process for each case keeps peak memory separate
+        with ProcessPoolExecutor(1, mp_context=get_context("spawn")) as pool:
+            result = pool.submit(run_case, case).result()
+        results.append(result)
+        rate = result["rows_per_second"] or 0
+        print(
+            f"{result['case']:<60} {result['seconds']:8.3f}s "
+            f"{rate:12,.0f} rows/s {result['peak_rss_mb']:8.1f} MB peak"
+        )
+
+    report = {
+        "meta": {
+            "nemwriter": nemwriter.__version__,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "time": datetime.now().isoformat(timespec="seconds"),
+            "preset": args.preset,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare and not compare(results, args.compare, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
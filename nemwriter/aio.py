@@ -0,0 +1,91 @@
+"""
+    nemwriter.aio
+    ~~~~~
+    Build and write NEM files from asyncio without blocking the event loop
+"""
+
+import asyncio
+from collections.abc import AsyncGenerator, AsyncIterable, Callable, Iterable
+from concurrent.futures import Executor
+from itertools import islice
+from pathlib import Path
+from typing import TextIO
+from zipfile import ZIP_DEFLATED
+
+from .output import open_output, write_rows
+
+CHUNK_SIZE = 2**12  # Rows or lines handled between returns to the event loop
+
+
+async def iterate(
+    items: Iterable, chunk_size: int = CHUNK_SIZE
+) -> AsyncGenerator[object, None]:
+    """Emit items, giving other tasks a turn after each chunk"""
+    for i, item in enumerate(items, start=1):
+        yield item
+        if i % chunk_size == 0:
+            await asyncio.sleep(0)
+
+
+async def collect(items: Iterable | AsyncIterable) -> list:
+    """Get the items of a regular or async iterable as a list"""
+    if isinstance(items, AsyncIterable):
+        return [x async for x in items]
+    return list(items)
+
+
+def write_text(stream: TextIO, lines: list[str]) -> None:
+    stream.writelines(lines)
+
+
+def write_csv_rows(stream: TextIO, rows: list[list]) -> None:
+    write_rows(rows, stream)
+
+
+def write_chunk(
+    stream: TextIO,
+    items: Iterable,
+    write: Callable[[TextIO, list], None],
+    chunk_size: int,
+) -> int:
+    """Write the next chunk of items, returning how many there were"""
+    chunk = list(islice(items, chunk_size))
+    if chunk:
+        write(stream, chunk)
+    return len(chunk)
+
+
+async def write_async(
+    file_path: Path,
+    items: Iterable,
+    write: Callable[[TextIO, list], None],
+    zipped: bool = False,
+    compression: int = ZIP_DEFLATED,
+    compresslevel: int | None = None,
+    executor: Executor | None = None,
+    chunk_size: int = CHUNK_SIZE,
+    date_time: tuple | None = None,
+    digest=None,
+) -> Path:
+    """Write items to a file in chunks, run in the executor
+    Items are generated, formatted and compressed in the executor, so the
+    event loop is free while the file is written.
+    """
+    loop = asyncio.get_running_loop()
+    output = open_output(
+        file_path, zipped, compression, compresslevel, date_time, digest
+    )
+    stream = await loop.run_in_executor(executor, output.__enter__)
+    items = iter(items)
+    try:
+        while await loop.run_in_executor(
+            executor, write_chunk, stream, items, write, chunk_size
+        ):
+            pass
+    except BaseException as e:
+        await loop.run_in_executor(
+            executor, output.__exit__, type(e), e, e.__traceback__
+        )
+        raise
+    await loop.run_in_executor(executor, output.__exit__, None, None, None)
+    return file_path
@@ -0,0 +1,147 @@
+"""
+    nemwriter.arrow
+    ~~~~~
+    Read interval columns from Arrow tables and parquet files without pandas
+"""
+
+from collections.abc import Generator, Iterable
+from pathlib import Path
+
+import numpy as np
+
+from .chunks import DEFAULT_CHUNKSIZE
+from .columnar import label_columns, relabel
+from .intervals import DAY_OFFSET, NS_PER_DAY
+
+
+def import_pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.compute as pc
+    except ImportError as e:
+        raise ImportError("pyarrow is needed to read Arrow and parquet data") from e
+    return pa, pc
+
+
+def time_column_name(table, time_column: str | None = None) -> str:
+    """Get the column of interval end times
+    Defaults to the index saved by pandas, then the first timestamp column
+    """
+    pa, _ = import_pyarrow()
+    if time_column is not None:
+        return time_column
+    pandas_meta = table.schema.pandas_metadata or {}
+    for name in pandas_meta.get("index_columns", []):
+        if isinstance(name, str):  # A RangeIndex is saved as a dict
+            return name
+    for field in table.schema:
+        if pa.types.is_timestamp(field.type):
+            return field.name
+    raise ValueError("No column of interval end times found")
+
+
+def arrow_end_times(column) -> np.ndarray:
+    """Get interval end times as int64 nanoseconds of local wall time"""
+    pa, pc = import_pyarrow()
+    if not pa.types.is_timestamp(column.type):
+        raise ValueError(f"Interval end times must be timestamps, not {column.type}")
+    if column.null_count:
+        raise ValueError("Interval end times can not be null")
+    utc_ends = None
+    if column.type.tz is not None:
+        utc_ends = column.cast(pa.timestamp("ns")).to_numpy().view(np.int64)
+        column = pc.local_timestamp(column)
+    if column.type.unit != "ns":
+        column = column.cast(pa.timestamp("ns"))
+    read_ends = column.to_numpy().view(np.int64)
+    if utc_ends is not None:
+        offsets = read_ends - utc_ends
+        if len(offsets) and (offsets != offsets[0]).any():
+            # Gaps in wall time are then not the length of the intervals
+            raise ValueError("Interval end times change UTC offset, use add_dataframe")
+    return read_ends
+
+
+def arrow_values(column) -> np.ndarray:
+    """Get a channel as a numpy array, with nulls as NaN"""
+    pa, _ = import_pyarrow()
+    if pa.types.is_decimal(column.type):
+        column = column.cast(pa.float64())
+    elif not (pa.types.is_integer(column.type) or pa.types.is_floating(column.type)):
+        raise ValueError(f"Channel values must be numbers, not {column.type}")
+    return column.to_numpy()
+
+
+def arrow_codes(column, fill: object = None) -> tuple[np.ndarray, list]:
+    """Encode a column as integer codes and labels, as column_codes does for pandas
+    Each distinct value is converted to Python once, nulls are None.
+    """
+    pa, pc = import_pyarrow()
+    if isinstance(column, pa.ChunkedArray):
+        column = column.combine_chunks()
+    if not pa.types.is_dictionary(column.type):
+        column = pc.dictionary_encode(column)
+    indices = column.indices.fill_null(-1).to_numpy()
+    return relabel(indices, column.dictionary.to_pylist(), fill)
+
+
+def arrow_columns(
+    table, time_column: str | None = None
+) -> tuple[np.ndarray, dict[str, np.ndarray], dict[str, tuple[np.ndarray, list]]]:
+    """Get the end times, channel values and quality and event labels of a table
+    Numeric buffers are passed to numpy without a copy where Arrow allows.
+    """
+    pa, _ = import_pyarrow()
+    if isinstance(table, pa.RecordBatch):
+        table = pa.Table.from_batches([table])
+    time_column = time_column_name(table, time_column)
+    read_ends = arrow_end_times(table.column(time_column))
+    names = [x for x in table.column_names if x != time_column]
+    channel_names, label_names = label_columns(names)
+    channels = {name: arrow_values(table.column(name)) for name in channel_names}
+    labels = {
+        name: arrow_codes(table.column(name), "N" if field == "Quality" else None)
+        for name, field in label_names.items()
+    }
+    return read_ends, channels, labels
+
+
+def arrow_day_batches(batches: Iterable, time_column: str | None = None) -> Generator:
+    """Emit tables of whole days from record batches sorted by time
+    Same as chunks.day_chunks, holding back the last day of each batch
+    """
+    pa, _ = import_pyarrow()
+    carry = None
+    for batch in batches:
+        table = pa.Table.from_batches([batch])
+        if carry is not None:
+            table = pa.concat_tables([carry, table])
+        if not table.num_rows:
+            continue
+        time_column = time_column_name(table, time_column)
+        days = (arrow_end_times(table.column(time_column)) - DAY_OFFSET) // NS_PER_DAY
+        split = int(np.searchsorted(days, days[-1]))
+        carry = table.slice(split)
+        if split:
+            yield table.slice(0, split)
+    if carry is not None and carry.num_rows:
+        yield carry
+
+
+def read_parquet_batches(
+    file_path: str | Path, batch_size: int = DEFAULT_CHUNKSIZE
+) -> Generator:
+    """Read a parquet file as Arrow record batches"""
+    import_pyarrow()
+    import pyarrow.parquet as pq
+
+    with pq.ParquetFile(file_path) as parquet_file:
+        yield from parquet_file.iter_batches(batch_size=batch_size)
+
+
+def read_parquet_table(file_path: str | Path):
+    """Read a whole parquet file as an Arrow table"""
+    import_pyarrow()
+    import pyarrow.parquet as pq
+
+    return pq.read_table(file_path)
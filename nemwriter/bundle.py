@@ -0,0 +1,302 @@
+"""
+    nemwriter.bundle
+    ~~~~~
+    Write many NEM files into one zip archive, compressing them in parallel
+"""
+
+import os
+import shutil
+import struct
+import zlib
+from collections.abc import Iterable, Mapping
+from contextlib import nullcontext
+from datetime import datetime
+from io import BufferedWriter, RawIOBase, TextIOWrapper
+from itertools import chain
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import TYPE_CHECKING
+from zipfile import ZIP_DEFLATED, ZIP_STORED
+
+from .output import ZIP_FILE_MODE, ZIP_UNIX_SYSTEM, HashingWriter, write_rows
+
+if TYPE_CHECKING:
+    from concurrent.futures import Executor
+
+BUFFER_SIZE = 2**16
+ZIP64_LIMIT = 2**31 - 1  # Same as zipfile, for readers with signed sizes
+MAX_ENTRIES = 2**16 - 1
+ZIP_VERSION = 20
+ZIP64_VERSION = 45
+UTF8_FLAG = 0x800
+LOCAL_HEADER = struct.Struct("<4s5H3L2H")
+CENTRAL_HEADER = struct.Struct("<4s6H3L5H2L")
+END_RECORD = struct.Struct("<4s4H2LH")
+ZIP64_END_RECORD = struct.Struct("<4sQ2H2L4Q")
+ZIP64_LOCATOR = struct.Struct("<4sLQL")
+
+
+class MemberSpool(RawIOBase):
+    """Compress the bytes of a zip member into a file, keeping its CRC and size"""
+
+    def __init__(
+        self, file_path: Path, compression: int, compresslevel: int | None
+    ) -> None:
+        if compression not in (ZIP_DEFLATED, ZIP_STORED):
+            raise ValueError("Bundle members can only be deflated or stored")
+        self.file = open(file_path, "wb")  # noqa: SIM115 closed with the spool
+        self.compressor = None
+        if compression == ZIP_DEFLATED:
+            level = -1 if compresslevel is None else compresslevel
+            self.compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+        self.crc = 0
+        self.file_size = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        size = len(data)
+        self.crc = zlib.crc32(data, self.crc)
+        self.file_size += size
+        if self.compressor is not None:
+            data = self.compressor.compress(data)
+        self.file.write(data)
+        return size
+
+    def close(self) -> None:
+        if not self.closed:
+            if self.compressor is not None:
+                self.file.write(self.compressor.flush())
+            self.file.close()
+        super().close()
+
+
+def write_member(source, stream) -> None:
+    """Write the csv text of a NEM12 or NEM13 object, rows or csv lines"""
+    if hasattr(source, "build_lines"):
+        stream.writelines(source.build_lines())
+    elif hasattr(source, "build_output"):
+        write_rows(source.build_output(), stream)  # As NEM13.output_csv
+    else:
+        rows = iter(source)
+        first = next(rows, None)
+        if first is None:
+            return
+        if isinstance(first, str):
+            stream.writelines(chain([first], rows))
+        else:
+            write_rows(chain([first], rows), stream)
+
+
+def compress_member(
+    source, file_path: Path, compression: int, compresslevel: int | None
+) -> tuple[int, int, int, str]:
+    """Compress the csv text of a member into a file, run in a worker
+    Returns the CRC, size and compressed size, and the hash of the text
+    """
+    spool = MemberSpool(file_path, compression, compresslevel)
+    text = TextIOWrapper(
+        BufferedWriter(spool, BUFFER_SIZE), encoding="utf-8", newline=""
+    )
+    stream = HashingWriter(text)
+    write_member(source, stream)
+    stream.close()
+    return spool.crc, spool.file_size, file_path.stat().st_size, stream.hexdigest()
+
+
+def dos_time(date_time: tuple) -> tuple[int, int]:
+    """Get the time and date fields of a zip entry"""
+    year, month, day, hour, minute, second = date_time
+    return hour << 11 | minute << 5 | second // 2, (year - 1980) << 9 | month << 5 | day
+
+
+class BundleEntry:
+    """Details of a member already written to the archive"""
+
+    __slots__ = ("name", "flags", "method", "date_time", "crc", "sizes", "offset")
+
+    def __init__(
+        self,
+        name: str,
+        compression: int,
+        date_time: tuple,
+        crc: int,
+        file_size: int,
+        compress_size: int,
+        offset: int,
+    ) -> None:
+        self.name = name.encode("utf-8")
+        self.flags = 0 if name.isascii() else UTF8_FLAG
+        self.method = compression
+        self.date_time = dos_time(date_time)
+        self.crc = crc
+        self.sizes = (file_size, compress_size)
+        self.offset = offset
+
+    def local_header(self) -> bytes:
+        file_size, compress_size = self.sizes
+        extra = b""
+        version = ZIP_VERSION
+        if max(self.sizes) > ZIP64_LIMIT:
+            extra = struct.pack("<2H2Q", 1, 16, file_size, compress_size)
+            version = ZIP64_VERSION
+            file_size = compress_size = 0xFFFFFFFF
+        header = LOCAL_HEADER.pack(
+            b"PK\x03\x04",
+            version,
+            self.flags,
+            self.method,
+            *self.date_time,
+            self.crc,
+            compress_size,
+            file_size,
+            len(self.name),
+            len(extra),
+        )
+        return header + self.name + extra
+
+    def central_header(self) -> bytes:
+        file_size, compress_size = self.sizes
+        offset = self.offset
+        zip64 = []
+        if max(self.sizes) > ZIP64_LIMIT:
+            zip64.extend(self.sizes)
+            file_size = compress_size = 0xFFFFFFFF
+        if offset > ZIP64_LIMIT:
+            zip64.append(offset)
+            offset = 0xFFFFFFFF
+        extra = b""
+        version = ZIP_VERSION
+        if zip64:
+            extra = struct.pack(f"<2H{len(zip64)}Q", 1, 8 * len(zip64), *zip64)
+            version = ZIP64_VERSION
+        header = CENTRAL_HEADER.pack(
+            b"PK\x01\x02",
+            ZIP_UNIX_SYSTEM << 8 | version,
+            version,
+            self.flags,
+            self.method,
+            *self.date_time,
+            self.crc,
+            compress_size,
+            file_size,
+            len(self.name),
+            len(extra),
+            0,  # Comment
+            0,  # Disk
+            0,  # Internal attributes
+            ZIP_FILE_MODE << 16,
+            offset,
+        )
+        return header + self.name + extra
+
+
+def end_records(num_entries: int, start: int, end: int) -> bytes:
+    """Get the records after the central directory from start to end"""
+    size = end - start
+    records = b""
+    if num_entries > MAX_ENTRIES or max(start, size) > ZIP64_LIMIT:
+        records = ZIP64_END_RECORD.pack(
+            b"PK\x06\x06",
+            ZIP64_END_RECORD.size - 12,
+            ZIP64_VERSION,
+            ZIP64_VERSION,
+            0,
+            0,
+            num_entries,
+            num_entries,
+            size,
+            start,
+        ) + ZIP64_LOCATOR.pack(b"PK\x06\x07", 0, end, 1)
+        num_entries = min(num_entries, MAX_ENTRIES)
+        start = min(start, 0xFFFFFFFF)
+        size = min(size, 0xFFFFFFFF)
+    return records + END_RECORD.pack(
+        b"PK\x05\x06", 0, 0, num_entries, num_entries, size, start, 0
+    )
+
+
+def write_bundle(
+    file_path: str | Path,
+    members: Mapping[str, object] | Iterable,
+    compression: int = ZIP_DEFLATED,
+    compresslevel: int | None = None,
+    max_workers: int | None = None,
+    executor: "Executor | None" = None,
+    date_time: datetime | None = None,
+) -> Path:
+    """Write many NEM files as the csv members of one zip archive
+
+    members are NEM12 or NEM13 objects, named like nem_filename, or a
+    mapping of csv names to those objects or to iterables of rows or csv
+    lines. Each member is compressed into a temporary file in a thread pool,
+    or in the executor given such as a ProcessPoolExecutor (the members must
+    then be picklable). The compressed data is copied into the archive in
+    order, so the csv text is never held in memory.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    if isinstance(members, Mapping):
+        members = list(members.items())
+    else:
+        members = [(None, x) for x in members]
+    if any(getattr(source, "is_empty", False) for _, source in members):
+        raise ValueError("No readings to output in a bundle member")
+    members = [
+        (f"{source.nem_filename()}.csv" if name is None else name, source)
+        for name, source in members
+    ]
+    names = [name for name, _ in members]
+    if len(set(names)) < len(names):
+        raise ValueError("Bundle members must have different names")
+    if date_time is None:
+        date_time = datetime.now()
+    date_time = date_time.timetuple()[:6]
+
+    file_path = Path(file_path)
+    pool = ThreadPoolExecutor(max_workers) if executor is None else nullcontext()
+    try:
+        # Workers are finished before their temporary files are removed
+        with (
+            TemporaryDirectory(dir=file_path.parent) as temp_dir,
+            pool,
+            open(file_path, "wb") as f,
+        ):
+            workers = executor if executor is not None else pool
+            pending = []
+            for i, (name, source) in enumerate(members):
+                spool_path = Path(temp_dir) / f"{i}.part"
+                future = workers.submit(
+                    compress_member, source, spool_path, compression, compresslevel
+                )
+                pending.append((name, source, spool_path, future))
+
+            entries = []
+            for name, source, spool_path, future in pending:
+                crc, file_size, compress_size, text_hash = future.result()
+                if hasattr(source, "output_hash"):
+                    source.output_hash = text_hash
+                entry = BundleEntry(
+                    name,
+                    compression,
+                    getattr(source, "zip_time", date_time),
+                    crc,
+                    file_size,
+                    compress_size,
+                    f.tell(),
+                )
+                f.write(entry.local_header())
+                with open(spool_path, "rb") as spool:
+                    shutil.copyfileobj(spool, f, BUFFER_SIZE * 16)
+                os.remove(spool_path)
+                entries.append(entry)
+
+            start = f.tell()
+            for entry in entries:
+                f.write(entry.central_header())
+            f.write(end_records(len(entries), start, f.tell()))
+    except BaseException:
+        file_path.unlink(missing_ok=True)
+        raise
+    return file_path
@@ -0,0 +1,95 @@
+"""
+    nemwriter.cache
+    ~~~~~
+    Caches of formatted 300 and 400 rows, so unchanged days are not formatted
+    again in later exports
+"""
+
+import hashlib
+from abc import ABC, abstractmethod
+from array import array
+from collections import OrderedDict
+
+from .records import DayRecord, unpack_runs
+
+
+def block_key(
+    nmi: str, nmi_suffix: str, record: DayRecord, decimals: int | None = None
+) -> str:
+    """Key of the formatted text of a day, from everything the text depends on
+    Keyed on the built record, as late readings are merged into the day
+    first and merges, staging and select all need its values.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    fields = (
+        nmi,
+        nmi_suffix,
+        record.day,
+        record.interval_length,
+        decimals,
+        record.scale,
+        record.update_time,
+        record.msats_time,
+        list(unpack_runs(record.runs)),
+    )
+    digest.update(repr(fields).encode())
+    values = record.values
+    if isinstance(values, array | memoryview):
+        digest.update(memoryview(values).format.encode())
+        digest.update(values.tobytes())
+    else:
+        digest.update(repr(values).encode())
+    return digest.hexdigest()
+
+
+class BlockCache(ABC):
+    """Store of formatted day text by block_key"""
+
+    @abstractmethod
+    def get(self, key: str) -> str | None:
+        """Get the text of a block, or None if it is not cached"""
+
+    @abstractmethod
+    def set(self, key: str, text: str) -> None:
+        """Store the text of a block"""
+
+    def get_many(self, keys: list[str]) -> dict[str, str]:
+        """Get the blocks that are cached out of many keys"""
+        found = {}
+        for key in keys:
+            text = self.get(key)
+            if text is not None:
+                found[key] = text
+        return found
+
+    def close(self) -> None:  # noqa: B027 optional, nothing to close by default
+        pass
+
+    def __enter__(self) -> "BlockCache":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+
+class MemoryBlockCache(BlockCache):
+    """Keep the most recently used blocks in memory"""
+
+    def __init__(self, max_items: int = 2**16) -> None:
+        self.max_items = max_items
+        self.blocks = OrderedDict()
+
+    def __repr__(self):
+        return f"<MemoryBlockCache {len(self.blocks)}/{self.max_items}>"
+
+    def get(self, key: str) -> str | None:
+        text = self.blocks.get(key)
+        if text is not None:
+            self.blocks.move_to_end(key)
+        return text
+
+    def set(self, key: str, text: str) -> None:
+        self.blocks[key] = text
+        self.blocks.move_to_end(key)
+        if len(self.blocks) > self.max_items:
+            self.blocks.popitem(last=False)
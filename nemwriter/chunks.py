@@ -0,0 +1,67 @@
+"""
+    nemwriter.chunks
+    ~~~~~
+    Read large interval files in chunks that end on a day boundary
+"""
+
+from collections.abc import Generator, Iterable
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from .intervals import DAY_OFFSET, NS_PER_DAY
+
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+    from pandas import DataFrame
+
+DEFAULT_CHUNKSIZE = 2**16
+
+
+def read_days(index: "pd.Index") -> "np.ndarray":
+    """Get the day number each interval end belongs to"""
+    import pandas as pd
+
+    if not isinstance(index, pd.DatetimeIndex):
+        index = pd.DatetimeIndex(index)
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    return (index.as_unit("ns").asi8 - DAY_OFFSET) // NS_PER_DAY
+
+
+def day_chunks(
+    chunks: Iterable["DataFrame"],
+) -> Generator["DataFrame", None, None]:
+    """Emit chunks of whole days from chunks of readings sorted by time
+    Readings for the last day of a chunk are held back and emitted with
+    the next chunk, so a day split across chunks is kept together.
+    """
+    import pandas as pd
+
+    carry = None
+    for chunk in chunks:
+        if carry is not None:
+            chunk = pd.concat([carry, chunk])
+        if chunk.empty:
+            continue
+        days = read_days(chunk.index)
+        last_day = days == days[-1]
+        carry = chunk[last_day]
+        if not last_day.all():
+            yield chunk[~last_day]
+    if carry is not None and not carry.empty:
+        yield carry
+
+
+def read_csv_chunks(
+    file_path: str | Path, chunksize: int = DEFAULT_CHUNKSIZE, **kwargs
+) -> Generator["DataFrame", None, None]:
+    """Read a csv with the interval end times in the first column in chunks
+    Extra arguments are passed to pandas.read_csv
+    """
+    import pandas as pd
+
+    kwargs.setdefault("index_col", 0)
+    kwargs.setdefault("parse_dates", True)
+    with pd.read_csv(file_path, chunksize=chunksize, **kwargs) as reader:
+        yield from reader
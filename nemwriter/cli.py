@@ -0,0 +1,257 @@
+"""
+    nemwriter.cli
+    ~~~~~
+    Convert interval and accumulation files to NEM12 and NEM13 in bulk
+"""
+
+import argparse
+import re
+import sys
+import time
+from collections.abc import Callable, Generator, Iterable
+from glob import glob
+from pathlib import Path
+
+from .nem12_writer import NEM12, UOMS, build_nmi_channels
+from .nem13_writer import NEM13
+from .version import __version__
+
+FILE_SUFFIXES = (".csv", ".parquet")
+DEFAULT_NMI_PATTERN = r"[^_]+"  # File name up to the first underscore
+
+
+def find_files(paths: Iterable[str]) -> list[Path]:
+    """Expand files, directories and glob patterns into csv and parquet files"""
+    files = []
+    for path in paths:
+        if any(x in path for x in "*?["):
+            matches = [Path(x) for x in sorted(glob(path, recursive=True))]
+        elif Path(path).is_dir():
+            matches = sorted(Path(path).iterdir())
+        else:
+            matches = [Path(path)]
+        files.extend(x for x in matches if x.suffix.lower() in FILE_SUFFIXES)
+    return list(dict.fromkeys(files))
+
+
+def file_nmi(file_path: Path, pattern: str) -> str:
+    """Get the NMI from a file name, the first group of the pattern if any"""
+    match = re.search(pattern, file_path.stem)
+    if match is None:
+        raise ValueError(f"No NMI found in file name {file_path.name}")
+    return match.group(1) if match.groups() else match.group(0)
+
+
+def read_interval_file(file_path: Path):
+    """Read a file of interval end times then a column for each channel"""
+    import pandas as pd
+
+    if file_path.suffix.lower() == ".parquet":
+        return pd.read_parquet(file_path)
+    return pd.read_csv(file_path, index_col=0, parse_dates=True)
+
+
+def read_accumulation_file(file_path: Path):
+    """Read a file with a column for each NEM13.add_reading argument
+    csv values are kept as text, so they are written as they were read
+    """
+    import pandas as pd
+
+    if file_path.suffix.lower() == ".parquet":
+        return pd.read_parquet(file_path)
+    return pd.read_csv(file_path, dtype=str)
+
+
+def build_nem12_nmi(
+    nmi: str, file_paths: list[Path], uoms: dict[str, str], meter_serial_number: str
+) -> tuple[dict, list[str]]:
+    """Build the channels of one NMI from all of its files"""
+    import pandas as pd
+
+    frames = [read_interval_file(x) for x in file_paths]
+    df = frames[0] if len(frames) == 1 else pd.concat(frames).sort_index(kind="stable")
+    return build_nmi_channels(nmi, df, uoms, meter_serial_number)
+
+
+def build_nem13_file(file_path: Path) -> dict:
+    """Build the accumulation reads of one file"""
+    m = NEM13(to_participant="")
+    m.add_dataframe(read_accumulation_file(file_path))
+    return m.meters
+
+
+def run_jobs(
+    func: Callable, jobs: dict, workers: int | None
+) -> Generator[tuple[object, object, Exception | None], None, None]:
+    """Emit (key, result, error) of func(*args) for each job as it finishes
+    With 0 workers the jobs run in this process
+    """
+    if workers == 0:
+        for key, args in jobs.items():
+            try:
+                yield key, func(*args), None
+            except Exception as e:
+                yield key, None, e
+        return
+
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    with ProcessPoolExecutor(workers) as pool:
+        futures = {pool.submit(func, *args): key for key, args in jobs.items()}
+        for future in as_completed(futures):
+            error = future.exception()
+            result = None if error else future.result()
+            yield futures[future], result, error
+
+
+def uom_mapping(text: str) -> tuple[str, str]:
+    nmi_suffix, sep, uom = text.partition("=")
+    if not sep or not nmi_suffix:
+        raise argparse.ArgumentTypeError(f"Expected SUFFIX=UOM, not {text!r}")
+    return nmi_suffix, uom
+
+
+def output_nem12(m: NEM12, args: argparse.Namespace) -> list[Path]:
+    zipped = not args.csv
+    if args.max_bytes or args.max_nmis:
+        return m.output_parts(
+            args.output_dir,
+            args.max_bytes,
+            args.max_nmis,
+            zipped,
+            decimals=args.decimals,
+        )
+    file_path = args.output_dir / f"{m.nem_filename()}{'.zip' if zipped else '.csv'}"
+    if zipped:
+        m.output_zip(file_path, decimals=args.decimals)
+    else:
+        m.output_csv(file_path, decimals=args.decimals)
+    return [file_path]
+
+
+def output_nem13(m: NEM13, args: argparse.Namespace) -> list[Path]:
+    file_path = args.output_dir / f"{m.nem_filename()}{'.csv' if args.csv else '.zip'}"
+    if args.csv:
+        m.output_csv(file_path)
+    else:
+        m.output_zip(file_path)
+    return [file_path]
+
+
+def convert(args: argparse.Namespace) -> int:
+    """Convert the input files, then report throughput and failures"""
+    start = time.perf_counter()
+    files = find_files(args.paths)
+    if not files:
+        print("No csv or parquet files found", file=sys.stderr)
+        return 1
+
+    failures = []
+    if args.format == "nem12":
+        m = NEM12(args.to_participant, args.from_participant)
+        groups = {}
+        for file_path in files:
+            try:
+                nmi = args.nmi or file_nmi(file_path, args.nmi_pattern)
+            except ValueError as e:
+                failures.append((file_path, e))
+                continue
+            groups.setdefault(nmi, []).append(file_path)
+        uoms = {**UOMS, **dict(args.uom)}
+        jobs = {
+            nmi: (nmi, paths, uoms, args.meter_serial_number)
+            for nmi, paths in groups.items()
+        }
+        built = {}
+        for nmi, result, error in run_jobs(build_nem12_nmi, jobs, args.workers):
+            if error is not None:
+                failures.extend((x, error) for x in groups[nmi])
+            else:
+                built[nmi] = result
+        for nmi in sorted(built):
+            channels, days = built[nmi]
+            m.merge_channels(nmi, channels)
+            m.add_days(days)
+    else:
+        m = NEM13(args.to_participant, args.from_participant)
+        jobs = {file_path: (file_path,) for file_path in files}
+        built = {}
+        for file_path, result, error in run_jobs(build_nem13_file, jobs, args.workers):
+            if error is not None:
+                failures.append((file_path, error))
+            else:
+                built[file_path] = result
+        for file_path in sorted(built):
+            for nmi, channels in built[file_path].items():
+                for nmi_suffix, rows in channels.items():
+                    m.meters.setdefault(nmi, {}).setdefault(nmi_suffix, []).extend(rows)
+
+    for file_path, error in failures:
+        print(f"Failed {file_path}: {error}", file=sys.stderr)
+    if m.is_empty:
+        print("No readings to output", file=sys.stderr)
+        return 1
+
+    args.output_dir.mkdir(parents=True, exist_ok=True)
+    output = output_nem12 if args.format == "nem12" else output_nem13
+    output_files = output(m, args)
+    seconds = time.perf_counter() - start
+    rows = sum(len(x) for channels in m.meters.values() for x in channels.values())
+    num_files = len(files) - len(failures)
+    for file_path in output_files:
+        print(file_path)
+    print(
+        f"Converted {num_files} of {len(files)} files, {len(m.meters)} NMIs and "
+        f"{rows:,} rows in {seconds:.2f}s ({rows / seconds:,.0f} rows/s)",
+        file=sys.stderr,
+    )
+    return 1 if failures else 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="nemwriter", description="Convert csv and parquet files to NEM12/NEM13"
+    )
+    parser.add_argument("--version", action="version", version=__version__)
+    parser.add_argument("format", choices=("nem12", "nem13"))
+    parser.add_argument(
+        "paths", nargs="+", help="Files, directories or glob patterns to convert"
+    )
+    parser.add_argument("--to-participant", "-t", required=True)
+    parser.add_argument("--from-participant", "-f")
+    parser.add_argument("--output-dir", "-o", type=Path, default=Path("."))
+    parser.add_argument("--csv", action="store_true", help="Write csv, not zip")
+    parser.add_argument(
+        "--workers",
+        "-w",
+        type=int,
+        help="Number of processes, 0 to convert in this process",
+    )
+
+    nem12 = parser.add_argument_group("NEM12")
+    nem12.add_argument("--nmi", help="NMI of all files, instead of from file names")
+    nem12.add_argument(
+        "--nmi-pattern",
+        default=DEFAULT_NMI_PATTERN,
+        help="Regex to find the NMI in a file name, using the first group if any",
+    )
+    nem12.add_argument(
+        "--uom",
+        type=uom_mapping,
+        action="append",
+        default=[],
+        metavar="SUFFIX=UOM",
+        help="Unit of measure of a channel, e.g. E1=kWh",
+    )
+    nem12.add_argument("--meter-serial-number", default="")
+    nem12.add_argument("--decimals", type=int, help="Fixed decimal places")
+    nem12.add_argument("--max-bytes", type=int, help="Split into parts of this size")
+    nem12.add_argument(
+        "--max-nmis", type=int, help="Split into parts of this many NMIs"
+    )
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = build_parser().parse_args(argv)
+    return convert(args)
@@ -0,0 +1,259 @@
+"""
+    nemwriter.columnar
+    ~~~~~
+    Vectorised conversion of interval arrays into NEM12 day data
+"""
+
+from array import array
+from collections.abc import Callable, Generator, Iterable
+
+import numpy as np
+
+from .intervals import (
+    DAY_OFFSET,
+    DEFAULT_INTERVAL,
+    MINUTES_PER_DAY,
+    NS_PER_DAY,
+    NS_PER_MINUTE,
+    NS_PER_SECOND,
+    interval_geometry,
+)
+from .records import MAX_DECIMALS
+
+LABEL_COLUMNS = ("Quality", "EventCode", "EventDesc")
+
+
+def relabel(
+    indices: np.ndarray, labels: list, fill: object = None
+) -> tuple[np.ndarray, list]:
+    """Convert category codes into codes of a list of labels, with the fill
+    value as code 0. Missing values have code -1 and become None. Each label
+    is looked at once, and labels are matched the same way tuples compare
+    their items (identity, then equality).
+    """
+    lookup = {fill: 0}
+    mapping = np.array(
+        [lookup.setdefault(x, len(lookup)) for x in [*labels, None]], dtype=np.int64
+    )
+    return mapping[indices], list(lookup)
+
+
+def label_columns(names: Iterable) -> tuple[list, dict]:
+    """Split column names into channels and quality and event columns
+    Quality, EventCode and EventDesc apply to every channel, while a column
+    such as E1_Quality applies only to the E1 channel.
+    Returns the channels and a mapping of label column to its field.
+    """
+    channels = []
+    labels = {}
+    for name in names:
+        channel, _, field = str(name).rpartition("_")
+        if name in LABEL_COLUMNS:
+            labels[name] = name
+        elif field in LABEL_COLUMNS and channel:
+            labels[name] = field
+        else:
+            channels.append(name)
+    for name, field in labels.items():
+        if name != field and name[: -len(field) - 1] not in channels:
+            raise ValueError(f"Column {name} does not match a channel")
+    return channels, labels
+
+
+def compact_array(values: np.ndarray) -> tuple[str, np.ndarray, int | None]:
+    """Get the typed array code, values and decimal scale to store values in
+    Matches records.compact_values, preferring 32 bit integer counts of
+    10**-scale where they hold the values exactly.
+    """
+    if values.dtype.kind == "f":
+        values = values.astype(np.float64, copy=False)
+        if not np.isfinite(values).all():
+            return "d", values, None
+        for scale in range(MAX_DECIMALS + 1):
+            factor = 10.0**scale
+            scaled = np.round(values * factor)
+            if scaled.size and np.abs(scaled).max() >= 2**31:
+                break  # More decimals will not fit either
+            if (scaled / factor == values).all():
+                return "i", scaled.astype(np.int32), scale
+        return "d", values, None
+    if values.dtype.kind == "u" and values.size and values.max() >= 2**63:
+        return "d", values.astype(np.float64), None
+    values = values.astype(np.int64, copy=False)
+    if not values.size or np.abs(values).max() < 2**31:
+        return "i", values.astype(np.int32), 0
+    return "q", values, 0
+
+
+def channel_days(
+    read_ends: np.ndarray,
+    values: np.ndarray,
+    quality_codes: np.ndarray,
+    quality_labels: list,
+    event_codes: np.ndarray,
+    event_labels: list,
+    desc_codes: np.ndarray,
+    desc_labels: list,
+    added_day: Callable[[str], tuple | None] | None = None,
+) -> Generator[tuple[str, int, array, int | None, list], None, None]:
+    """Emit (day, interval length, values, scale, events) for each day of a channel
+
+    read_ends are the interval end times as int64 nanoseconds of wall time.
+    Code 0 of each label list is the value used to fill missing intervals.
+    Days are emitted in the order they first appear, matching add_readings.
+    added_day gets the (interval length, record) of a day already added, such
+    as ChannelRows.day, so late reads are placed in the intervals of that day.
+    """
+    if values.dtype.kind == "f":
+        valid = ~np.isnan(values)
+        read_ends = read_ends[valid]
+        values = values[valid]
+        quality_codes = quality_codes[valid]
+        event_codes = event_codes[valid]
+        desc_codes = desc_codes[valid]
+    if not len(read_ends):
+        return
+
+    # Bucket into days, keeping days and reads in order of appearance
+    day_nums = (read_ends - DAY_OFFSET) // NS_PER_DAY
+    uniq_days, first_seen, inverse = np.unique(
+        day_nums, return_index=True, return_inverse=True
+    )
+    day_order = np.argsort(first_seen, kind="stable")
+    day_rank = np.empty_like(day_order)
+    day_rank[day_order] = np.arange(len(day_order))
+    groups = day_rank[inverse.ravel()]
+    order = np.argsort(groups, kind="stable")
+    groups = groups[order]
+    read_ends = read_ends[order]
+    values = values[order]
+    quality_codes = quality_codes[order]
+    event_codes = event_codes[order]
+    desc_codes = desc_codes[order]
+
+    num_days = len(day_order)
+    day_starts = np.searchsorted(groups, np.arange(num_days))
+    day_counts = np.diff(np.append(day_starts, len(groups)))
+
+    # Interval length is the smallest gap between reads within each day
+    deltas = np.diff(read_ends)
+    same_day = groups[1:] == groups[:-1]
+    gap_minutes = ((deltas // NS_PER_SECOND) % (24 * 60 * 60)) // 60
+    no_gap = np.iinfo(np.int64).max
+    interval_lengths = np.full(num_days, no_gap, dtype=np.int64)
+    np.minimum.at(interval_lengths, groups[1:][same_day], gap_minutes[same_day])
+    interval_lengths[interval_lengths == no_gap] = DEFAULT_INTERVAL
+    if not interval_lengths.all():
+        raise ZeroDivisionError("Reads less than a minute apart in the same day")
+
+    # Reads start one interval before they end, using the last gap of the day
+    last_delta = np.full(num_days, DEFAULT_INTERVAL * NS_PER_MINUTE, dtype=np.int64)
+    multiple = day_counts > 1
+    last_delta[multiple] = deltas[day_starts[multiple] + day_counts[multiple] - 2]
+
+    day_names = np.datetime_as_string(
+        uniq_days[day_order].astype("datetime64[D]"), unit="D"
+    )
+    if added_day is not None:
+        for i, day in enumerate(day_names.tolist()):
+            added = added_day(day.replace("-", ""))
+            if added is None:
+                continue
+            # A single late read uses the intervals of the day
+            length = added[0]
+            if day_counts[i] == 1 or interval_lengths[i] == length:
+                interval_lengths[i] = length
+                last_delta[i] = length * NS_PER_MINUTE
+    read_starts = read_ends - last_delta[groups]
+    minutes = (read_starts // NS_PER_MINUTE) % MINUTES_PER_DAY
+    read_lengths = interval_lengths[groups]
+    positions = np.empty(len(minutes), dtype=np.int64)
+    num_positions = np.empty(num_days, dtype=np.int64)
+    for length in np.unique(interval_lengths).tolist():
+        geometry = interval_geometry(length)
+        slot_of_minute = np.frombuffer(geometry.slot_of_minute, dtype=np.uint16)
+        reads = read_lengths == length
+        positions[reads] = slot_of_minute[minutes[reads]]
+        num_positions[interval_lengths == length] = geometry.num_intervals
+
+    # Place reads into dense slots for all days, last read wins for a slot
+    offsets = np.zeros(num_days, dtype=np.int64)
+    offsets[1:] = np.cumsum(num_positions)[:-1]
+    in_day = positions < num_positions[groups]
+    slots = (offsets[groups] + positions)[in_day]
+    _, last_seen = np.unique(slots[::-1], return_index=True)
+    keep = np.flatnonzero(in_day)[len(slots) - 1 - last_seen]
+    slots = slots[len(slots) - 1 - last_seen]
+
+    total = int(num_positions.sum())
+    dense_values = np.zeros(total, dtype=values.dtype)
+    dense_quality = np.zeros(total, dtype=np.int64)
+    dense_event = np.zeros(total, dtype=np.int64)
+    dense_desc = np.zeros(total, dtype=np.int64)
+    dense_values[slots] = values[keep]
+    dense_quality[slots] = quality_codes[keep]
+    dense_event[slots] = event_codes[keep]
+    dense_desc[slots] = desc_codes[keep]
+
+    # A new quality run starts on any change of quality or event
+    changed = np.zeros(total, dtype=bool)
+    changed[1:] = (
+        (dense_quality[1:] != dense_quality[:-1])
+        | (dense_event[1:] != dense_event[:-1])
+        | (dense_desc[1:] != dense_desc[:-1])
+    )
+    changed[offsets] = True
+    run_starts = np.flatnonzero(changed)
+    run_bounds = np.searchsorted(run_starts, np.append(offsets, total))
+
+    typecode, dense_values, scale = compact_array(dense_values)
+    run_qualities = [quality_labels[x] for x in dense_quality[run_starts].tolist()]
+    run_events = [event_labels[x] for x in dense_event[run_starts].tolist()]
+    run_descs = [desc_labels[x] for x in dense_desc[run_starts].tolist()]
+    run_starts = run_starts.tolist()
+
+    for i in range(num_days):
+        offset = int(offsets[i])
+        end = offset + int(num_positions[i])
+        events = [
+            (run_starts[j] - offset, run_qualities[j], run_events[j], run_descs[j])
+            for j in range(run_bounds[i], run_bounds[i + 1])
+        ]
+        day = day_names[i].replace("-", "")
+        day_values = array(typecode)
+        day_values.frombytes(dense_values[offset:end].tobytes())
+        yield day, int(interval_lengths[i]), day_values, scale, events
+
+
+def civil_dates(days: np.ndarray) -> np.ndarray:
+    """Get dates as YYYYMMDD numbers from days since 1970-01-01
+    Uses integer arithmetic of the proleptic Gregorian calendar, which is
+    much faster than converting between datetime64 units.
+    """
+    days = days + 719468  # Days since 0000-03-01
+    era = days // 146097
+    day_of_era = days - era * 146097
+    year_of_era = (
+        day_of_era - day_of_era // 1460 + day_of_era // 36524 - day_of_era // 146096
+    ) // 365
+    day_of_year = day_of_era - (
+        365 * year_of_era + year_of_era // 4 - year_of_era // 100
+    )
+    month_index = (5 * day_of_year + 2) // 153  # Starting from March
+    day = day_of_year - (153 * month_index + 2) // 5 + 1
+    month = np.where(month_index < 10, month_index + 3, month_index - 9)
+    year = year_of_era + era * 400 + (month <= 2)
+    return year * 10000 + month * 100 + day
+
+
+def format_timestamps(times: np.ndarray) -> list[str]:
+    """Format int64 nanoseconds of wall time as DateTime(14) text
+    Each distinct time is only formatted once, as read dates repeat a lot.
+    """
+    times, inverse = np.unique(times, return_inverse=True)
+    seconds = times // NS_PER_SECOND
+    days = seconds // (MINUTES_PER_DAY * 60)
+    seconds -= days * MINUTES_PER_DAY * 60
+    time_number = seconds // 3600 * 10000 + seconds % 3600 // 60 * 100 + seconds % 60
+    texts = list(map(str, (civil_dates(days) * 10**6 + time_number).tolist()))
+    return list(map(texts.__getitem__, inverse.tolist()))
@@ -0,0 +1,185 @@
+"""
+    nemwriter.formatting
+    ~~~~~
+    Format NEM rows as csv text without going through csv.writer
+"""
+
+from array import array
+from collections.abc import Generator, Iterable
+from functools import cache
+
+from .cache import BlockCache, block_key
+from .records import ChannelHeader, ChannelRows, DayRecord, unpack_runs
+
+LINE_END = "\r\n"  # Same as csv.writer
+QUOTE_CHARS = frozenset(',"\r\n')
+MAX_CACHED_VALUES = 2**16
+
+
+def csv_field(value: object) -> str:
+    """Format a field the same way as csv.writer with QUOTE_MINIMAL"""
+    if value is None:
+        return ""
+    text = str(value)
+    if QUOTE_CHARS.isdisjoint(text):
+        return text
+    return '"' + text.replace('"', '""') + '"'
+
+
+def format_row(row: Iterable) -> str:
+    """Format a row as a csv line"""
+    return ",".join(map(csv_field, row)) + LINE_END
+
+
+class ValueText(dict):
+    """Text of interval values, cached as meter readings repeat a lot"""
+
+    def __init__(self, scale: int | None, decimals: int | None) -> None:
+        super().__init__()
+        self.scale = scale
+        self.format = "{}".format if decimals is None else f"{{:.{decimals}f}}".format
+
+    def __missing__(self, value: float) -> str:
+        if self.scale:
+            factor = 10**self.scale
+            number = value // factor if value % factor == 0 else value / factor
+        elif isinstance(value, float) and value.is_integer():
+            number = int(value)  # Shrink file size
+        else:
+            number = value
+        text = self.format(number)
+        if len(self) < MAX_CACHED_VALUES:
+            self[value] = text
+        return text
+
+
+@cache
+def value_text(scale: int | None, decimals: int | None) -> ValueText:
+    return ValueText(scale, decimals)
+
+
+def format_values(
+    values: array | memoryview | list,
+    scale: int | None,
+    decimals: int | None = None,
+) -> str:
+    """Format the interval values of a day as comma separated text in one go
+    By default whole numbers are written without a decimal, otherwise a
+    fixed number of decimal places is used.
+    """
+    if isinstance(values, array | memoryview):
+        return ",".join(map(value_text(scale, decimals).__getitem__, values))
+    if decimals is None:
+        return ",".join(map(csv_field, values))  # Stored as they are written
+    return ",".join(f"{x:.{decimals}f}" for x in values)
+
+
+def format_day(
+    record: DayRecord, decimals: int | None = None, cache: bool = False
+) -> str:
+    """Format the 300 row and any 400 rows of a day
+    With cache the text is kept on the record, so it is only formatted
+    again once the day changes
+    """
+    if record.text is not None and record.text[0] == decimals:
+        return record.text[1]
+    if record.num_runs == 1:
+        tail = next(unpack_runs(record.runs))[2:]
+    else:
+        tail = ("V", None, None)
+    fields = [
+        "300",
+        csv_field(record.day),
+        format_values(record.values, record.scale, decimals),
+        *map(csv_field, (*tail, record.update_time, record.msats_time)),
+    ]
+    if not record.values:
+        del fields[2]  # No intervals in the day
+    text = ",".join(fields) + LINE_END
+    if record.num_runs > 1:
+        text += "".join(format_row(["400", *x]) for x in unpack_runs(record.runs))
+    if cache:
+        record.text = (decimals, text)
+    return text
+
+
+def format_day_block(
+    record: DayRecord,
+    header: ChannelHeader,
+    block_cache: BlockCache,
+    decimals: int | None = None,
+    cache: bool = False,
+) -> str:
+    """Format a day, using the text from the block cache if it is there"""
+    if record.text is not None and record.text[0] == decimals:
+        return record.text[1]
+    key = block_key(header.nmi, header.nmi_suffix, record, decimals)
+    text = block_cache.get(key)
+    if text is None:
+        text = format_day(record, decimals)
+        block_cache.set(key, text)
+    if cache:
+        record.text = (decimals, text)
+    return text
+
+
+def channel_lines(
+    rows: ChannelRows | list,
+    decimals: int | None = None,
+    cache: bool = False,
+    block_cache: BlockCache | None = None,
+) -> Generator[str, None, None]:
+    """Emit csv text for the rows of a channel
+    With a block cache, days already formatted in an earlier run are reused
+    """
+    records = rows.records if isinstance(rows, ChannelRows) else rows
+    if block_cache is not None:
+        yield from cached_channel_lines(records, block_cache, decimals, cache)
+        return
+    for record in records:
+        if isinstance(record, DayRecord):
+            yield format_day(record, decimals, cache)
+        elif isinstance(record, ChannelHeader):
+            yield format_row(record.to_row())
+        else:
+            yield format_row(record)
+
+
+def cached_channel_lines(
+    records: list,
+    block_cache: BlockCache,
+    decimals: int | None = None,
+    cache: bool = False,
+) -> Generator[str, None, None]:
+    """Emit csv text for the rows of a channel, looking up all its days at once"""
+    keys = {}
+    header = None
+    for record in records:
+        if isinstance(record, ChannelHeader):
+            header = record
+        elif (
+            isinstance(record, DayRecord)
+            and header is not None
+            and (record.text is None or record.text[0] != decimals)
+        ):
+            keys[id(record)] = block_key(
+                header.nmi, header.nmi_suffix, record, decimals
+            )
+    found = block_cache.get_many(list(keys.values())) if keys else {}
+
+    for record in records:
+        if isinstance(record, ChannelHeader):
+            yield format_row(record.to_row())
+        elif not isinstance(record, DayRecord):
+            yield format_row(record)
+        elif id(record) not in keys:
+            yield format_day(record, decimals, cache)
+        else:
+            key = keys[id(record)]
+            text = found.get(key)
+            if text is None:
+                text = format_day(record, decimals)
+                block_cache.set(key, text)
+            if cache:
+                record.text = (decimals, text)
+            yield text
@@ -0,0 +1,59 @@
+"""
+    nemwriter.intervals
+    ~~~~~
+    Lookup tables for placing readings into the intervals of a day
+"""
+
+from array import array
+from collections.abc import Sequence
+from functools import cache
+from itertools import islice
+from operator import sub
+
+MINUTES_PER_DAY = 24 * 60
+DEFAULT_INTERVAL = 5
+NS_PER_SECOND = 10**9
+NS_PER_MINUTE = 60 * NS_PER_SECOND
+NS_PER_DAY = MINUTES_PER_DAY * NS_PER_MINUTE
+DAY_OFFSET = 5 * NS_PER_SECOND  # A read ending at midnight belongs to the day before
+
+
+class IntervalGeometry:
+    """Slots of a day for an interval length, worked out once"""
+
+    __slots__ = ("interval_length", "num_intervals", "slot_of_minute", "slot_starts")
+
+    def __init__(self, interval_length: int) -> None:
+        num_intervals = MINUTES_PER_DAY / interval_length
+        self.interval_length = interval_length
+        self.num_intervals = int(num_intervals)
+        # Same float arithmetic as placing each reading one at a time
+        self.slot_of_minute = array(
+            "H",
+            [
+                int((minute / MINUTES_PER_DAY) * num_intervals)
+                for minute in range(MINUTES_PER_DAY)
+            ],
+        )
+        self.slot_starts = array(
+            "H", [slot * interval_length for slot in range(self.num_intervals)]
+        )
+
+    def __repr__(self):
+        return f"<IntervalGeometry {self.interval_length}min>"
+
+
+@cache
+def interval_geometry(interval_length: int) -> IntervalGeometry:
+    """Get the slot lookup tables of an interval length"""
+    return IntervalGeometry(interval_length)
+
+
+def detect_interval_length(ends: Sequence) -> int | None:
+    """Get the smallest whole minutes between consecutive read end times
+    Returns None if there is only one read
+    """
+    if len(ends) < 2:
+        return None
+    # Seconds of a timedelta ignore whole days, the same as the earlier loop
+    return min(x.seconds for x in map(sub, islice(ends, 1, None), ends)) // 60
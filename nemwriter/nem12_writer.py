@@ -4,56 +4,156 @@
     Write meter readings to MDFF format
 """
 
-import csv
-from collections.abc import Generator, Iterable
-from datetime import datetime, timedelta
-from io import StringIO
+import copy
+import hashlib
+import os
+import shutil
+import sys
+from array import array
+from collections import deque
+from collections.abc import (
+    AsyncGenerator,
+    AsyncIterable,
+    Generator,
+    Iterable,
+    Mapping,
+    Sequence,
+)
+from datetime import date, datetime, timedelta
+from functools import partial
+from itertools import chain
 from pathlib import Path
-from zipfile import ZIP_DEFLATED, ZipFile, ZipInfo
+from tempfile import SpooledTemporaryFile
+from typing import TYPE_CHECKING
+from zipfile import ZIP_DEFLATED, ZipFile
 
-import numpy as np
-from pandas import DataFrame
+from .cache import BlockCache
+from .chunks import DEFAULT_CHUNKSIZE, day_chunks, read_csv_chunks
+from .formatting import channel_lines, format_day, format_day_block, format_row
+from .intervals import DEFAULT_INTERVAL, detect_interval_length, interval_geometry
+from .output import (
+    DEFAULT_HASH,
+    HashingWriter,
+    hash_lines,
+    open_output,
+    open_zip_entry,
+    write_lines,
+    zip_date_time,
+)
+from .records import (
+    ChannelHeader,
+    ChannelRows,
+    DayRecord,
+    compact_values,
+    dense_day,
+    quality_events,
+)
+from .staging import read_staged, write_staged
+from .stats import NULL_STATS, Stats, timed, timed_rows
+
+if TYPE_CHECKING:
+    # numpy, pandas and asyncio are only imported once they are used
+    from concurrent.futures import Executor
+
+    import numpy as np
+    from pandas import DataFrame, Index, Series
 
 UOMS = {"E1": "kWh", "E2": "kWh", "B1": "kWh"}
+DAY_OFFSET = timedelta(seconds=5)  # A read ending at midnight is the day before
 
 
-def convert_to_channels(df: DataFrame) -> dict[str, list]:
+def convert_to_channels(df: "DataFrame") -> dict[str, list]:
     """Convert dataframe to lists of channel data
     Assumes the dataframe index is the end of the metering interval
     """
-    d = {}
+    import numpy as np
 
-    read_ends = df.index.tolist()
-    channels = list(df.columns)
+    from .columnar import label_columns
 
-    if "Quality" in channels:
-        qualities = df["Quality"].tolist()
-        channels.remove("Quality")
-    else:
-        qualities = ["A" for x in read_ends]
+    d = {}
 
-    if "EventDesc" in channels:
-        eventdescs = df["EventDesc"].tolist()
-        channels.remove("EventDesc")
-    else:
-        eventdescs = [None for x in read_ends]
+    read_ends = df.index.tolist()
+    channels, label_names = label_columns(df.columns)
+    labels = {}
+    for name in label_names:
+        column = df[name].astype(object)
+        labels[name] = column.where(column.notna(), None).tolist()
 
     # Input: end, val, quality, event_code, event_desc
     for channel in channels:
+        qualities = labels.get(f"{channel}_Quality", labels.get("Quality"))
+        event_codes = labels.get(f"{channel}_EventCode", labels.get("EventCode"))
+        event_descs = labels.get(f"{channel}_EventDesc", labels.get("EventDesc"))
         ch_data = []
         for i, val in enumerate(df[channel].tolist()):
             if np.isnan(val):
                 continue  # Skip Nulls
             end = read_ends[i]
-            quality = qualities[i]
-            event_code = None
-            event_desc = eventdescs[i]
+            quality = "A" if qualities is None else qualities[i]
+            event_code = None if event_codes is None else event_codes[i]
+            event_desc = None if event_descs is None else event_descs[i]
             read = (end, val, quality, event_code, event_desc)
             ch_data.append(read)
         d[channel] = ch_data
     return d
 
 
+def column_codes(column: "Series", fill: object = None) -> tuple["np.ndarray", list]:
+    """Encode a quality or event column as integer codes and labels
+    Categorical columns use their codes directly, others are factorized by
+    pandas, so only the distinct values become Python objects. Nulls are None.
+    """
+    from pandas import CategoricalDtype, factorize
+
+    from .columnar import relabel
+
+    if isinstance(column.dtype, CategoricalDtype):
+        indices = column.cat.codes.to_numpy()
+        uniques = column.cat.categories
+    else:
+        indices, uniques = factorize(column)
+    return relabel(indices, uniques.tolist(), fill)
+
+
+def read_end_times(index: "Index") -> "np.ndarray | None":
+    """Get interval end times as int64 nanoseconds of local wall time
+    Returns None if the index does not hold datetimes, or if its UTC offset
+    changes such as over daylight saving, where gaps in wall time are not
+    the length of the intervals
+    """
+    from pandas import DatetimeIndex
+
+    if not isinstance(index, DatetimeIndex):
+        if index.inferred_type not in ("datetime", "datetime64"):
+            return None
+        try:
+            index = DatetimeIndex(index)
+        except (TypeError, ValueError):
+            return None
+    index = index.as_unit("ns")
+    if index.tz is None:
+        return index.asi8
+    read_ends = index.tz_localize(None).asi8
+    offsets = read_ends - index.asi8
+    if len(offsets) and (offsets != offsets[0]).any():
+        return None
+    return read_ends
+
+
+def is_numeric_column(column: "Series") -> bool:
+    """Check if a column holds plain numpy numbers"""
+    import numpy as np
+
+    return isinstance(column.dtype, np.dtype) and column.dtype.kind in "biuf"
+
+
+def format_datetime(value: datetime | None) -> str | None:
+    """Format as DateTime(14) used in 300 rows"""
+    if value is None:
+        return None
+    return value.strftime("%Y%m%d%H%M%S")
+
+
 def remove_zero_decimal(x: float) -> float | int:
     """Make integer when decimal is a zero to shrink file size"""
     if x != int(x):
@@ -61,14 +161,40 @@ def remove_zero_decimal(x: float) -> float | int:
     return int(x)
 
 
+def build_nmi_channels(
+    nmi: str, df: "DataFrame", uoms: dict[str, str], meter_serial_number: str
+) -> tuple[dict[str, ChannelRows], list[str]]:
+    """Build the channel records of one NMI, used by NEM12.add_dataframes"""
+    m = NEM12(to_participant="")
+    m.add_dataframe(nmi, df, uoms, meter_serial_number)
+    return m.meters.get(nmi, {}), m.days
+
+
 class NEM12:
-    """An NEM file object"""
+    """An NEM file object
+
+    Readings added again for a day of a channel are merged into that day.
+    Use cache_lines to keep the formatted text of each day, so outputs
+    after adding more readings only format the days that changed.
+    """
 
     def __init__(
-        self, to_participant: str, from_participant: str | None = None
+        self,
+        to_participant: str,
+        from_participant: str | None = None,
+        cache_lines: bool = False,
+        stats: Stats | None = None,
+        file_time: datetime | None = None,
+        block_cache: BlockCache | None = None,
     ) -> None:
+        """Set file_time to write the same header and zip entry time on every
+        run, so the same readings always give the same bytes. A block_cache
+        keeps the formatted text of each day to reuse in later exports.
+        """
         version_header = "NEM12"
-        self.file_time = datetime.now().strftime("%Y%m%d%H%M")
+        if file_time is None:
+            file_time = datetime.now()
+        self.file_time = file_time.strftime("%Y%m%d%H%M")
         self.from_participant = from_participant
         self.to_participant = to_participant
         self.header = [
@@ -81,6 +207,10 @@ class NEM12:
 
         self.meters = {}
         self.days = []
+        self.cache_lines = cache_lines
+        self.block_cache = block_cache
+        self.stats = stats if stats is not None else NULL_STATS
+        self.output_hash = None  # Hash of the csv text last output
 
     def __repr__(self):
         return f"<NEM12 Builder {self.file_time} {self.to_participant}>"
@@ -91,6 +221,7 @@ class NEM12:
             return True
         return False
 
+    @timed("add_readings")
     def add_readings(
         self,
         nmi: str,
@@ -105,129 +236,482 @@ class NEM12:
         update_datetime: datetime | None = None,
         msats_load_datetime: datetime | None = None,
     ):
-        if nmi not in self.meters:
-            self.meters[nmi] = {}
-
-        if nmi_suffix not in self.meters[nmi]:
-            self.meters[nmi][nmi_suffix] = []
-
-        daily_readings = {}
+        readings_by_date = {}
         for reading in readings:
             end = reading[0]
-            start = end - timedelta(seconds=5)
-            date = start.strftime("%Y%m%d")
+            start = end - DAY_OFFSET
+            date = start.date()
 
-            if date not in daily_readings:
-                daily_readings[date] = [reading]
+            if date not in readings_by_date:
+                readings_by_date[date] = [reading]
             else:
-                daily_readings[date].append(reading)
+                readings_by_date[date].append(reading)
+        if self.stats.enabled:
+            self.stats["add_readings"].rows += sum(map(len, readings_by_date.values()))
 
+        # Format each day once rather than for every reading
+        daily_readings = {
+            date.strftime("%Y%m%d"): day_readings
+            for date, day_readings in readings_by_date.items()
+        }
         dates = [x for x in daily_readings]
-        self.days = dates
+        self.add_days(dates)
+        channel_rows = self.meters.get(nmi, {}).get(nmi_suffix)
 
-        last_header = []
-        reading_dict = dict()
+        channel_header = ChannelHeader(
+            nmi,
+            nmi_configuration,
+            register_id,
+            nmi_suffix,
+            mdm_datastream_identitfier,
+            meter_serial_number,
+            uom,
+            None,  # Interval length
+            next_scheduled_read_date,
+        )
+        update_time = format_datetime(update_datetime)
+        msats_time = format_datetime(msats_load_datetime)
+
+        days = []
         for date in dates:
             # Determine the interval length
-            interval_length = 5  # Assume default in case needed
-            interval_delta = timedelta(minutes=5)
-            interval_lengths = []
-            for i, _ in enumerate(daily_readings[date]):
-                if i == 0:
-                    continue
-                first = daily_readings[date][i - 1]
-                second = daily_readings[date][i]
-                interval_delta = second[0] - first[0]
-                interval_length = int(interval_delta.seconds / 60)
-                interval_lengths.append(interval_length)
-            if interval_lengths:
-                interval_length = min(interval_lengths)
-
-            channel_header = [
-                200,
-                nmi,
-                nmi_configuration,
-                register_id,
-                nmi_suffix,
-                mdm_datastream_identitfier,
-                meter_serial_number,
-                uom,
-                interval_length,
-                next_scheduled_read_date,
-            ]
-
-            if channel_header != last_header:
-                self.meters[nmi][nmi_suffix].append(channel_header)
-
-            last_header = channel_header
-
-            rows = []
-            for reading in daily_readings[date]:
-                # Input: end, val, quality, event_code, event_desc
-                # Output: pos, start, end, val, quality, event_code, event_desc
-                end = reading[0]
-                val = reading[1]
-                val = remove_zero_decimal(val)  # Make int to make file smaller
-                try:
-                    quality = reading[2]
-                except IndexError:
-                    quality = None
-                try:
-                    event_code = reading[3]
-                except IndexError:
-                    event_code = None
-                try:
-                    event_desc = reading[4]
-                except IndexError:
-                    event_desc = None
-
-                start = end - interval_delta
-                pos = self.get_interval_pos(start, interval_length)
-                if date not in reading_dict:
-                    reading_dict[date] = dict()
-                row = (pos, start, end, val, quality, event_code, event_desc)
-                rows.append(row)
-
-            for row in self.get_daily_rows(
-                date, rows, interval_length, update_datetime, msats_load_datetime
-            ):
-                self.meters[nmi][nmi_suffix].append(row)
+            day_readings = daily_readings[date]
+            interval_length = detect_interval_length([x[0] for x in day_readings])
+            added = None if channel_rows is None else channel_rows.day(date)
+            if added is not None and interval_length in (None, added[0]):
+                # A single late reading uses the intervals of the day
+                interval_length = added[0]
+                interval_delta = timedelta(minutes=interval_length)
+            elif interval_length is not None:
+                interval_delta = day_readings[-1][0] - day_readings[-2][0]
+            else:
+                interval_length = DEFAULT_INTERVAL  # Assume default in case needed
+                interval_delta = timedelta(minutes=DEFAULT_INTERVAL)
+            geometry = interval_geometry(interval_length)
+            slot_of_minute = geometry.slot_of_minute
+
+            # Input: end, val, quality, event_code, event_desc
+            # Placed: pos, val, quality, event_code, event_desc
+            placed = []
+            for reading in day_readings:
+                start = reading[0] - interval_delta
+                pos = slot_of_minute[start.hour * 60 + start.minute]
+                val = remove_zero_decimal(reading[1])  # Make int to make file smaller
+                placed.append((pos, val, *reading[2:5]))
+            day_values, day_events = dense_day(placed, geometry.num_intervals)
+            record = self.day_record(
+                date, day_values, day_events, interval_length, update_time, msats_time
+            )
+            days.append((interval_length, record))
+
+        self.add_channel_records(nmi, nmi_suffix, channel_header, days)
+
+    def add_channel_records(
+        self,
+        nmi: str,
+        nmi_suffix: str,
+        channel_header: ChannelHeader,
+        days: Iterable[tuple[int, DayRecord]],
+    ) -> None:
+        """Add the day records of a channel
+        Days that were already added for the channel are merged, and a 200
+        record is added whenever the interval length changes
+        """
+        channel_rows = self.meters.setdefault(nmi, {}).setdefault(
+            nmi_suffix, ChannelRows()
+        )
+        for interval_length, record in days:
+            channel_rows.add_day(interval_length, record, channel_header)
 
+    def add_days(self, days: Iterable[str]) -> None:
+        """Keep track of the days with readings, in the order first added"""
+        seen = set(self.days)
+        for day in days:
+            if day not in seen:
+                self.days.append(day)
+                seen.add(day)
+
+    @timed("add_dataframe")
     def add_dataframe(
         self,
         nmi: str,
-        df: DataFrame,
+        df: "DataFrame",
         uoms: dict[str, str] = UOMS,
         meter_serial_number: str = "",
     ):
-        """Add readings from pandas dataframe"""
-
-        channels = convert_to_channels(df)
-        channel_config = "".join(channels.keys())
-        for nmi_suffix in channels:
-            uom = uoms.get(nmi_suffix, "")
-            self.add_readings(
-                nmi=nmi,
-                nmi_configuration=channel_config,
-                nmi_suffix=nmi_suffix,
-                uom=uom,
-                readings=channels[nmi_suffix],
-                meter_serial_number=meter_serial_number,
+        """Add readings from pandas dataframe
+        Assumes the dataframe index is the end of the metering interval
+        """
+        from .columnar import label_columns
+
+        self.stats["add_dataframe"].rows += len(df)
+        channels, label_names = label_columns(df.columns)
+        read_ends = read_end_times(df.index)
+        numeric = all(is_numeric_column(df[ch]) for ch in channels)
+        if read_ends is None or not numeric:
+            # Fall back to converting one reading at a time
+            with self.stats.stage("convert_to_channels"):
+                channel_reads = convert_to_channels(df)
+            channel_config = "".join(channel_reads.keys())
+            for nmi_suffix in channel_reads:
+                uom = uoms.get(nmi_suffix, "")
+                self.add_readings(
+                    nmi=nmi,
+                    nmi_configuration=channel_config,
+                    nmi_suffix=nmi_suffix,
+                    uom=uom,
+                    readings=channel_reads[nmi_suffix],
+                    meter_serial_number=meter_serial_number,
+                )
+            return
+
+        labels = {
+            name: column_codes(df[name], "N" if field == "Quality" else None)
+            for name, field in label_names.items()
+        }
+        columns = {ch: df[ch].to_numpy() for ch in channels}
+        self.add_columns(nmi, read_ends, columns, labels, uoms, meter_serial_number)
+
+    @timed("add_arrow")
+    def add_arrow(
+        self,
+        nmi: str,
+        table,
+        uoms: dict[str, str] = UOMS,
+        meter_serial_number: str = "",
+        time_column: str | None = None,
+    ) -> None:
+        """Add readings from a pyarrow Table or RecordBatch, without pandas
+        time_column holds the interval end times, by default the index
+        saved by pandas or the first timestamp column. Other columns are
+        channels, except the Quality and EventDesc columns.
+        """
+        from .arrow import arrow_columns
+
+        read_ends, columns, labels = arrow_columns(table, time_column)
+        self.add_columns(nmi, read_ends, columns, labels, uoms, meter_serial_number)
+
+    def add_parquet(
+        self,
+        nmi: str,
+        file_path: str | Path,
+        uoms: dict[str, str] = UOMS,
+        meter_serial_number: str = "",
+        time_column: str | None = None,
+    ) -> None:
+        """Add readings from a parquet file, see add_arrow. Needs pyarrow."""
+        from .arrow import read_parquet_table
+
+        table = read_parquet_table(file_path)
+        self.add_arrow(nmi, table, uoms, meter_serial_number, time_column)
+
+    def add_columns(
+        self,
+        nmi: str,
+        read_ends: "np.ndarray",
+        columns: Mapping[str, "np.ndarray"],
+        labels: Mapping[str, tuple["np.ndarray", list]],
+        uoms: dict[str, str] = UOMS,
+        meter_serial_number: str = "",
+        channel_config: str | None = None,
+    ) -> None:
+        """Add channels of numpy values at int64 nanosecond end times
+        labels holds the (codes, labels) of the Quality, EventCode and
+        EventDesc columns, or of one channel's columns such as E1_Quality.
+        The NMI configuration defaults to the channels given.
+        """
+        import numpy as np
+
+        from .columnar import LABEL_COLUMNS, channel_days
+
+        num_reads = len(read_ends)
+        defaults = {
+            "Quality": (np.ones(num_reads, dtype=np.int64), ["N", "A"]),
+            "EventCode": (np.zeros(num_reads, dtype=np.int64), [None]),
+            "EventDesc": (np.zeros(num_reads, dtype=np.int64), [None]),
+        }
+
+        if channel_config is None:
+            channel_config = "".join(columns)
+        for nmi_suffix, column in columns.items():
+            channel_labels = []
+            for field in LABEL_COLUMNS:
+                shared = labels.get(field, defaults[field])
+                channel_labels.extend(labels.get(f"{nmi_suffix}_{field}", shared))
+            channel_rows = self.meters.get(nmi, {}).get(nmi_suffix)
+            added_day = None if channel_rows is None else channel_rows.day
+            with self.stats.stage("channel_days") as stage:
+                stage.rows += num_reads
+                days = list(channel_days(read_ends, column, *channel_labels, added_day))
+            self.add_days(x[0] for x in days)
+            channel_header = ChannelHeader(
+                nmi,
+                channel_config,
+                "",
+                nmi_suffix,
+                "",
+                meter_serial_number,
+                uoms.get(nmi_suffix, ""),
+                None,  # Interval length
+                None,
             )
+            records = (
+                (length, self.day_record(day, values, events, length, scale=scale))
+                for day, length, values, scale, events in days
+            )
+            self.add_channel_records(nmi, nmi_suffix, channel_header, records)
+
+    @timed("add_long_dataframe")
+    def add_long_dataframe(
+        self,
+        df: "DataFrame | Mapping[str, Sequence]",
+        uoms: dict[str, str] = UOMS,
+        meter_serial_number: str = "",
+        nmi_column: str = "nmi",
+        suffix_column: str = "nmi_suffix",
+        time_column: str = "end_time",
+        value_column: str = "value",
+        quality_column: str = "quality",
+        event_code_column: str = "event_code",
+        event_desc_column: str = "event_desc",
+        nmi_configuration: str | None = None,
+    ) -> None:
+        """Add readings of many NMIs from a table with a row per reading
+        The rows are grouped by NMI and suffix in one pass, then each
+        channel is built from its slice of the columns. Quality and event
+        columns are optional. The NMI configuration defaults to the sorted
+        suffixes of each NMI, so it does not depend on the order of the rows.
+        """
+        import numpy as np
+        from pandas import DataFrame, Index
+
+        if not isinstance(df, DataFrame):
+            df = DataFrame(df)
+        missing = [
+            x
+            for x in (nmi_column, suffix_column, time_column, value_column)
+            if x not in df.columns
+        ]
+        if missing:
+            raise ValueError(f"Missing columns: {', '.join(missing)}")
+        self.stats["add_long_dataframe"].rows += len(df)
+
+        times = Index(df[time_column])
+        read_ends = read_end_times(times)
+        if read_ends is None and getattr(times, "tz", None) is None:
+            raise ValueError(f"Column {time_column} must hold datetimes")
+        if not is_numeric_column(df[value_column]):
+            raise ValueError(f"Column {value_column} must hold numbers")
+
+        groups = df.groupby([nmi_column, suffix_column], sort=False)
+        channels = list(groups.size().index)
+        nmi_suffixes = {}
+        for nmi, nmi_suffix in channels:
+            nmi_suffixes.setdefault(nmi, []).append(nmi_suffix)
+        configs = {
+            nmi: nmi_configuration or "".join(sorted(suffixes))
+            for nmi, suffixes in nmi_suffixes.items()
+        }
+        if read_ends is None:
+            # The UTC offset changes, so add one reading at a time
+            columns = {
+                quality_column: "A",
+                event_code_column: None,
+                event_desc_column: None,
+            }
+            for (nmi, nmi_suffix), group in groups:
+                group = group.sort_values(time_column, kind="stable")
+                fields = [
+                    group[x].astype(object).where(group[x].notna(), None)
+                    if x in df.columns
+                    else [fill] * len(group)
+                    for x, fill in columns.items()
+                ]
+                reads = zip(
+                    group[time_column], group[value_column], *fields, strict=True
+                )
+                readings = [x for x in reads if not np.isnan(x[1])]
+                self.add_readings(
+                    nmi,
+                    configs[nmi],
+                    nmi_suffix,
+                    uoms.get(nmi_suffix, ""),
+                    readings,
+                    meter_serial_number=meter_serial_number,
+                )
+            return
+        values = df[value_column].to_numpy()
+        labels = {}
+        for key, column, fill in (
+            ("Quality", quality_column, "N"),
+            ("EventCode", event_code_column, None),
+            ("EventDesc", event_desc_column, None),
+        ):
+            if column in df.columns:
+                labels[key] = column_codes(df[column], fill)
+
+        # One sort puts each channel's reads together and in time order
+        group_codes = groups.ngroup().to_numpy()
+        order = np.lexsort((read_ends, group_codes))
+        read_ends = read_ends[order]
+        values = values[order]
+        labels = {key: (codes[order], names) for key, (codes, names) in labels.items()}
+        bounds = np.searchsorted(group_codes[order], np.arange(groups.ngroups + 1))
+
+        for i, (nmi, nmi_suffix) in enumerate(channels):
+            rows = slice(bounds[i], bounds[i + 1])
+            self.add_columns(
+                nmi,
+                read_ends[rows],
+                {nmi_suffix: values[rows]},
+                {key: (codes[rows], names) for key, (codes, names) in labels.items()},
+                uoms,
+                meter_serial_number,
+                configs[nmi],
+            )
+
+    def add_dataframes(
+        self,
+        frames: Mapping[str, "DataFrame"] | Iterable[tuple[str, "DataFrame"]],
+        uoms: dict[str, str] = UOMS,
+        meter_serial_number: str = "",
+        max_workers: int | None = None,
+        executor: "Executor | None" = None,
+        chunksize: int = 16,
+    ):
+        """Add readings from a pandas dataframe for each NMI in parallel
+
+        The rows of each NMI are built in a process pool, or in the given
+        executor (e.g. a ThreadPoolExecutor), and merged in NMI order.
+        """
+        if isinstance(frames, Mapping):
+            frames = frames.items()
+        frames = list(frames)
+        nmis = [nmi for nmi, _ in frames]
+        dfs = [df for _, df in frames]
+        num_nmis = len(frames)
+
+        if executor is None:
+            from concurrent.futures import ProcessPoolExecutor
+
+            with ProcessPoolExecutor(max_workers) as pool:
+                return self.add_dataframes(
+                    frames,
+                    uoms,
+                    meter_serial_number,
+                    executor=pool,
+                    chunksize=chunksize,
+                )
+
+        results = executor.map(
+            build_nmi_channels,
+            nmis,
+            dfs,
+            [uoms] * num_nmis,
+            [meter_serial_number] * num_nmis,
+            chunksize=chunksize,
+        )
+        built = {}
+        for nmi, (channels, days) in zip(nmis, results, strict=True):
+            if nmi in built:
+                for nmi_suffix, channel_rows in channels.items():
+                    built[nmi].setdefault(nmi_suffix, ChannelRows()).merge(channel_rows)
+            else:
+                built[nmi] = channels
+            self.add_days(days)
+
+        for nmi in sorted(built):
+            self.merge_channels(nmi, built[nmi])
+
+    def merge_channels(self, nmi: str, channels: dict[str, ChannelRows]) -> None:
+        """Merge channel rows built separately, such as in another process"""
+        if nmi not in self.meters:
+            self.meters[nmi] = channels
+            return
+        for nmi_suffix, channel_rows in channels.items():
+            self.meters[nmi].setdefault(nmi_suffix, ChannelRows()).merge(channel_rows)
+
+    def select(
+        self,
+        nmis: Iterable[str] | None = None,
+        start_date: date | None = None,
+        end_date: date | None = None,
+    ) -> "NEM12":
+        """Get some of the NMIs and days, to output without building again
+        Days are included from start_date to end_date. Records are shared with
+        this object, and 200 records are repeated for the days selected.
+        """
+        first_day = None if start_date is None else start_date.strftime("%Y%m%d")
+        last_day = None if end_date is None else end_date.strftime("%Y%m%d")
+        if nmis is None:
+            nmis = self.meters
+        elif isinstance(nmis, str):
+            nmis = [nmis]
+        subset = copy.copy(self)
+        subset.meters = {}
+        subset.output_hash = None
+        days = set()
+        for nmi in nmis:
+            if nmi not in self.meters or nmi in subset.meters:
+                continue
+            channels = {}
+            for nmi_suffix, channel_rows in self.meters[nmi].items():
+                selected = channel_rows.select(first_day, last_day)
+                if selected.day_index:
+                    channels[nmi_suffix] = selected
+                    days.update(selected.day_index)
+            if channels:
+                subset.meters[nmi] = channels
+        subset.days = [x for x in self.days if x in days]
+        return subset
+
+    @timed("dump_staged")
+    def dump_staged(self, file_path: str | Path) -> Path:
+        """Save the day records to a binary staging file, to output later
+        with load_staged, such as on another machine
+        """
+        details = {
+            "to_participant": self.to_participant,
+            "from_participant": self.from_participant,
+        }
+        return write_staged(file_path, self.meters, self.days, details)
+
+    @classmethod
+    def load_staged(
+        cls,
+        file_path: str | Path,
+        stats: Stats | None = None,
+        file_time: datetime | None = None,
+        block_cache: BlockCache | None = None,
+    ) -> "NEM12":
+        """Load a staging file written by dump_staged
+        The file is memory mapped, so interval values are not copied into
+        memory before they are output.
+        """
+        meters, days, details = read_staged(file_path)
+        m = cls(
+            details["to_participant"],
+            details["from_participant"],
+            stats=stats,
+            file_time=file_time,
+            block_cache=block_cache,
+        )
+        m.meters = meters
+        m.days = days
+        return m
 
     @staticmethod
-    def get_interval_pos(start: int, interval_length: int) -> int:
+    def get_interval_pos(start: datetime, interval_length: int) -> int:
         """Get position of time interval"""
-        num_intervals = 60 * 24 / interval_length
         minutes = (start.hour) * 60 + start.minute
-        day_progress = minutes / (60 * 24)
-        return int(day_progress * num_intervals)
+        return interval_geometry(interval_length).slot_of_minute[minutes]
 
     @staticmethod
     def get_num_intervals(interval_length: int) -> int:
         """Get the number of intervals in a day"""
-        return int(60 * 24 / interval_length)
+        return interval_geometry(interval_length).num_intervals
 
+    @timed_rows("build_output")
     def build_output(self) -> Generator[list, None, None]:
         """Emit rows for NEM file"""
         yield self.header
@@ -237,6 +721,20 @@ class NEM12:
                 yield from self.meters[nmi][ch]
         yield [900]  # End of data row
 
+    @timed_rows("build_lines")
+    def build_lines(self, decimals: int | None = None) -> Generator[str, None, None]:
+        """Emit csv lines for NEM file, formatting each day of values in one go
+        Use decimals to write values with a fixed number of decimal places
+        """
+        yield format_row(self.header)
+        for nmi in sorted(self.meters):
+            suffixes = list(self.meters[nmi].keys())
+            for ch in sorted(suffixes):
+                yield from channel_lines(
+                    self.meters[nmi][ch], decimals, self.cache_lines, self.block_cache
+                )
+        yield format_row([900])  # End of data row
+
     def get_daily_rows(
         self,
         day: str,
@@ -246,121 +744,229 @@ class NEM12:
         msats_load_datetime: datetime | None,
     ) -> Generator[list, None, None]:
         """Emit 300 row for the day data and 400 rows if required"""
+        record = self.daily_record(
+            day,
+            daily_readings,
+            interval_length,
+            format_datetime(update_datetime),
+            format_datetime(msats_load_datetime),
+        )
+        yield from record.to_rows()
 
-        day_reads_dict = {}
-        for read in daily_readings:
-            pos = read[0]  # pos is first item in tuple
-            day_reads_dict[pos] = read
-
-        day_row = [300, day]
-        day_events = []
+    def daily_record(
+        self,
+        day: str,
+        daily_readings: list,
+        interval_length: int,
+        update_time: str | None = None,
+        msats_time: str | None = None,
+    ) -> DayRecord:
+        """Build the day record from the readings placed in their intervals
+        daily_readings are (pos, start, end, val, quality, event_code, event_desc)
+        """
+        readings = ((x[0], x[3], x[4], x[5], x[6]) for x in daily_readings)
         num_pos = self.get_num_intervals(interval_length)
+        day_values, day_events = dense_day(readings, num_pos)
+        return self.day_record(
+            day, day_values, day_events, interval_length, update_time, msats_time
+        )
 
-        for pos in range(0, num_pos):
-            try:
-                read = day_reads_dict[pos]
-                # pos, start, end, val, quality, event_code, event_desc
-                val = read[3]
-                quality = read[4]
-                event_code = read[5]
-                event_desc = read[6]
-            except KeyError:
-                val = 0
-                quality = "N"
-                event_code = None
-                event_desc = None
-
-            try:
-                prev = day_events[-1]
-            except IndexError:  # First row
-                prev = (None, None, None, None)
-
-            if (quality, event_code, event_desc) == (
-                prev[1],
-                prev[2],
-                prev[3],
-            ):
-                pass
-            else:
-                event_record = (pos, quality, event_code, event_desc)
-                day_events.append(event_record)
-            day_row.append(val)
-
-        event_rows = []
-        if len(day_events) == 1:
-            # Same quality for all records
-            first_event = day_events[0]
-            quality_method = first_event[1]
-            event_code = first_event[2]
-            event_desc = first_event[3]
-        else:
-            quality_method = "V"
-            event_code = None
-            event_desc = None
-            # Create an event row
-            for i, (pos, quality, code, desc) in enumerate(day_events):
-                try:
-                    end_pos = day_events[i + 1][0]
-                except IndexError:
-                    end_pos = self.get_num_intervals(interval_length)
-                event_row = [
-                    "400",
-                    pos + 1,
-                    end_pos,
-                    quality,
-                    code,
-                    desc,
-                ]
-                event_rows.append(event_row)
-
-        datetime_format = "%Y%m%d%H%M%S"
-
-        update_time = None
-        if update_datetime is not None:
-            update_time = update_datetime.strftime(datetime_format)
-
-        msats_time = None
-        if msats_load_datetime is not None:
-            msats_time = msats_load_datetime.strftime(datetime_format)
-
-        day_row_end = [
-            quality_method,
-            event_code,
-            event_desc,
-            update_time,
-            msats_time,
-        ]
-        day_row += day_row_end
-        yield day_row
-        # Emit event (400) rows if they exist
-        for event_row in event_rows:
-            yield event_row
+    def day_record(
+        self,
+        day: str,
+        day_values: list,
+        day_events: list[tuple],
+        interval_length: int,
+        update_time: str | None = None,
+        msats_time: str | None = None,
+        scale: int | None = None,
+    ) -> DayRecord:
+        """Build the day record from its values and quality events
+        day_events are the (pos, quality, event_code, event_desc) where each run starts
+        Values already in a typed array need their decimal scale given
+        """
+        num_pos = self.get_num_intervals(interval_length)
+        runs = quality_events(day_events, num_pos)
+        if not isinstance(day_values, array):
+            day_values, scale = compact_values(day_values)
+        day = sys.intern(day)  # Days are repeated for every channel
+        return DayRecord(day, day_values, scale, runs, update_time, msats_time)
 
     def nem_filename(self) -> str:
         """Return suggested NEM filename"""
-        start = self.days[0]
-        end = self.days[-1]
-        nmis = list(self.meters.keys())
+        return self.part_filename(list(self.meters.keys()), self.days)
+
+    def part_filename(
+        self, nmis: list[str], days: list[str], part: int | None = None
+    ) -> str:
+        """Return suggested NEM filename for some of the NMIs and days"""
+        start = min(days)
+        end = max(days)
         first_nmi = nmis[0]
         uid = f"{first_nmi}_{start}_{end}" if len(nmis) == 1 else f"{start}_{end}"
+        if part is not None:
+            uid = f"{uid}_{part}"
         file_name = f"NEM12#{uid}#{self.from_participant}#{self.to_participant}"
         return file_name
 
-    def output_csv(self, file_path="") -> str:
+    @property
+    def zip_time(self) -> tuple:
+        """Time of the zip entries, the same as the header file time"""
+        return zip_date_time(self.file_time)
+
+    def nmi_hash(self, nmi: str, decimals: int | None = None) -> str:
+        """Hash the lines of an NMI, which do not change with the file time
+        Used to skip NMIs that are unchanged since an earlier export
+        """
+        return hash_lines(self.nmi_lines(nmi, decimals))
+
+    def nmi_lines(self, nmi: str, decimals: int | None = None) -> list[str]:
+        """Get the csv lines for the channels of an NMI"""
+        lines = []
+        for ch in sorted(self.meters[nmi]):
+            lines.extend(
+                channel_lines(
+                    self.meters[nmi][ch], decimals, self.cache_lines, self.block_cache
+                )
+            )
+        return lines
+
+    def split_parts(
+        self,
+        max_bytes: int | None = None,
+        max_nmis: int | None = None,
+        decimals: int | None = None,
+    ) -> Generator[tuple[list[str], list[str]], None, None]:
+        """Group NMIs in order into parts of at most max_bytes of text
+        (including the 100 and 900 rows) and max_nmis NMIs, emitting the
+        NMIs and csv lines of each part. Parts are only split between NMIs,
+        so an NMI larger than max_bytes has a part of its own.
+        """
+        frame_size = len(format_row(self.header)) + len(format_row([900]))
+        nmis = []
+        lines = []
+        size = frame_size
+        for nmi in sorted(self.meters):
+            nmi_lines = self.nmi_lines(nmi, decimals)
+            nmi_size = sum(map(len, nmi_lines))
+            full = (max_nmis is not None and len(nmis) >= max_nmis) or (
+                max_bytes is not None and size + nmi_size > max_bytes
+            )
+            if nmis and full:
+                yield nmis, lines
+                nmis = []
+                lines = []
+                size = frame_size
+            nmis.append(nmi)
+            lines.extend(nmi_lines)
+            size += nmi_size
+        if nmis:
+            yield nmis, lines
+
+    @timed("output_parts")
+    def output_parts(
+        self,
+        directory: str | Path = "",
+        max_bytes: int | None = None,
+        max_nmis: int | None = None,
+        zipped: bool = True,
+        max_workers: int | None = None,
+        compression: int = ZIP_DEFLATED,
+        compresslevel: int | None = None,
+        decimals: int | None = None,
+    ) -> list[Path]:
+        """Output the NEM file split into parts, see split_parts
+        Each part has its own 100 and 900 rows, and is named like
+        nem_filename with the part number. Parts are written and compressed
+        in a pool of max_workers threads (the CPU count by default) while
+        the next part is formatted. Up to max_workers formatted parts wait
+        to be written, so memory use is about max_workers * max_bytes.
+        """
+        if self.is_empty:
+            raise ValueError("No readings to output")
+        if max_bytes is None and max_nmis is None:
+            raise ValueError("Give max_bytes or max_nmis to split the file")
+
+        from concurrent.futures import ThreadPoolExecutor
+
+        if max_workers is None:
+            max_workers = os.cpu_count() or 1
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+        directory = Path(directory)
+        suffix = ".zip" if zipped else ".csv"
+        header = format_row(self.header)
+        trailer = format_row([900])  # End of data row
+        file_paths = []
+        with ThreadPoolExecutor(max_workers) as pool:
+            pending = deque()
+            for part, (nmis, lines) in enumerate(
+                self.split_parts(max_bytes, max_nmis, decimals), start=1
+            ):
+                days = self.part_days(nmis)
+                file_path = (
+                    directory / f"{self.part_filename(nmis, days, part)}{suffix}"
+                )
+                file_paths.append(file_path)
+                pending.append(
+                    pool.submit(
+                        write_lines,
+                        file_path,
+                        chain([header], lines, [trailer]),
+                        zipped,
+                        compression,
+                        compresslevel,
+                        self.zip_time,
+                    )
+                )
+                # Limit how many formatted parts are held in memory
+                if len(pending) >= max_workers:
+                    pending.popleft().result()
+            for future in pending:
+                future.result()
+        if self.stats.enabled:
+            sizes = [x.stat().st_size for x in file_paths]
+            self.stats["output_parts"].bytes += sum(sizes)
+            self.stats["output_parts"].peak_bytes = max(
+                self.stats["output_parts"].peak_bytes, *sizes
+            )
+        return file_paths
+
+    def part_days(self, nmis: list[str]) -> list[str]:
+        """Get the days with readings for some of the NMIs"""
+        days = set()
+        for nmi in nmis:
+            for channel_rows in self.meters[nmi].values():
+                days.update(channel_rows.day_index)
+        return [x for x in self.days if x in days]
+
+    @timed("output_csv")
+    def output_csv(self, file_path="", decimals: int | None = None) -> str:
         """Output NEM file"""
         if self.is_empty:
             raise ValueError("No readings to output")
 
         if not file_path:
             file_path = f"{self.nem_filename()}.csv"
-        with open(file_path, "w", newline="") as csvfile:
-            writer = csv.writer(csvfile, quoting=csv.QUOTE_MINIMAL)
-            for row in self.build_output():
-                writer.writerow(row)
+        digest = hashlib.new(DEFAULT_HASH)
+        with open_output(Path(file_path), digest=digest) as csvfile:
+            csvfile.writelines(self.build_lines(decimals))
+        self.output_hash = digest.hexdigest()
+        if self.stats.enabled:
+            self.stats["output_csv"].bytes += os.path.getsize(file_path)
         return file_path
 
-    def output_zip(self, file_path="") -> str:
-        """Output NEM file"""
+    @timed("output_zip")
+    def output_zip(
+        self,
+        file_path="",
+        compression: int = ZIP_DEFLATED,
+        compresslevel: int | None = None,
+        decimals: int | None = None,
+    ) -> str:
+        """Output NEM file as a csv in a zip archive
+        Rows are compressed as they are written, use ZIP_STORED for no compression
+        """
         if self.is_empty:
             raise ValueError("No readings to output")
 
@@ -368,13 +974,346 @@ class NEM12:
             file_path = f"{self.nem_filename()}.zip"
         file_path = Path(file_path)
 
-        with StringIO(newline="") as stream:
-            writer = csv.writer(stream, quoting=csv.QUOTE_MINIMAL)
-            for row in self.build_output():
-                writer.writerow(row)
-            csv_str = stream.getvalue()
+        digest = hashlib.new(DEFAULT_HASH)
+        with open_output(
+            file_path, True, compression, compresslevel, self.zip_time, digest
+        ) as stream:
+            stream.writelines(self.build_lines(decimals))
+        self.output_hash = digest.hexdigest()
+        if self.stats.enabled:
+            self.stats["output_zip"].bytes += file_path.stat().st_size
+        return file_path
+
+    async def abuild_output(self) -> AsyncGenerator[list, None]:
+        """Emit rows for NEM file with async for, letting other tasks run"""
+        from .aio import iterate
+
+        async for row in iterate(self.build_output()):
+            yield row
 
-        with ZipFile(file_path, "w", compression=ZIP_DEFLATED) as zip_archive:
-            file1 = ZipInfo(f"{file_path.stem}.csv")
-            zip_archive.writestr(file1, csv_str, compress_type=ZIP_DEFLATED)
+    async def add_readings_async(
+        self,
+        nmi: str,
+        nmi_configuration: str,
+        nmi_suffix: str,
+        uom: str,
+        readings: Iterable[list | tuple] | AsyncIterable[list | tuple],
+        executor: "Executor | None" = None,
+        **kwargs,
+    ) -> None:
+        """Add readings from a regular or async iterable, see add_readings
+        Readings are converted in the executor, so await each call before
+        adding more readings.
+        """
+        import asyncio
+
+        from .aio import collect
+
+        readings = await collect(readings)
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(
+            executor,
+            partial(
+                self.add_readings,
+                nmi,
+                nmi_configuration,
+                nmi_suffix,
+                uom,
+                readings,
+                **kwargs,
+            ),
+        )
+
+    async def output_csv_async(
+        self,
+        file_path="",
+        decimals: int | None = None,
+        executor: "Executor | None" = None,
+    ) -> str:
+        """Output NEM file, formatting and writing in chunks in the executor"""
+        from .aio import write_async, write_text
+
+        if self.is_empty:
+            raise ValueError("No readings to output")
+
+        if not file_path:
+            file_path = f"{self.nem_filename()}.csv"
+        lines = self.build_lines(decimals)
+        digest = hashlib.new(DEFAULT_HASH)
+        await write_async(
+            Path(file_path), lines, write_text, executor=executor, digest=digest
+        )
+        self.output_hash = digest.hexdigest()
         return file_path
+
+    async def output_zip_async(
+        self,
+        file_path="",
+        compression: int = ZIP_DEFLATED,
+        compresslevel: int | None = None,
+        decimals: int | None = None,
+        executor: "Executor | None" = None,
+    ) -> Path:
+        """Output NEM file as a csv in a zip archive, formatting and
+        compressing in chunks in the executor
+        """
+        from .aio import write_async, write_text
+
+        if self.is_empty:
+            raise ValueError("No readings to output")
+
+        if not file_path:
+            file_path = f"{self.nem_filename()}.zip"
+        file_path = Path(file_path)
+        lines = self.build_lines(decimals)
+        digest = hashlib.new(DEFAULT_HASH)
+        await write_async(
+            file_path,
+            lines,
+            write_text,
+            True,
+            compression,
+            compresslevel,
+            executor,
+            date_time=self.zip_time,
+            digest=digest,
+        )
+        self.output_hash = digest.hexdigest()
+        return file_path
+
+
+class NEM12Writer:
+    """Write a NEM12 file one NMI at a time without holding it in memory
+
+    NMIs must be added in ascending order, the same order build_output uses.
+    Rows for the current NMI are spooled per channel, and copied to the file
+    in channel order once the next NMI starts or the writer is closed.
+    As rows are spooled straight away, readings for a day are not merged
+    with readings added in an earlier call. Use a file path ending in .zip
+    to write a zipped csv.
+    """
+
+    def __init__(
+        self,
+        file_path: str | Path,
+        to_participant: str,
+        from_participant: str | None = None,
+        spool_size: int = 2**20,
+        compression: int = ZIP_DEFLATED,
+        compresslevel: int | None = None,
+        decimals: int | None = None,
+        stats: Stats | None = None,
+        file_time: datetime | None = None,
+        block_cache: BlockCache | None = None,
+    ) -> None:
+        self.file_path = Path(file_path)
+        self.builder = NEM12(
+            to_participant,
+            from_participant,
+            stats=stats,
+            file_time=file_time,
+            block_cache=block_cache,
+        )
+        self.stats = self.builder.stats
+        self.spool_size = spool_size
+        self.compression = compression
+        self.compresslevel = compresslevel
+        self.decimals = decimals
+        self.nmi = None
+        self.spools = {}
+        self.last_headers = {}
+        self.stream = None
+        self.zip_archive = None
+        self.output_hash = None  # Hash of the csv text, set once closed
+
+    def __repr__(self):
+        return f"<NEM12 Writer {self.file_path}>"
+
+    def __enter__(self) -> "NEM12Writer":
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close(write_trailer=exc_type is None)
+
+    def open(self) -> None:
+        """Open the output file and write the header row"""
+        if self.file_path.suffix.lower() == ".zip":
+            self.zip_archive = ZipFile(
+                self.file_path,
+                "w",
+                compression=self.compression,
+                compresslevel=self.compresslevel,
+            )
+            entry_name = f"{self.file_path.stem}.csv"
+            stream = open_zip_entry(
+                self.zip_archive,
+                entry_name,
+                self.compresslevel,
+                self.builder.zip_time,
+            )
+        else:
+            stream = open(self.file_path, "w", encoding="utf-8", newline="")  # noqa: SIM115
+        self.stream = HashingWriter(stream)
+        self.stream.write(format_row(self.builder.header))
+
+    def close(self, write_trailer: bool = True) -> None:
+        """Write any spooled rows and the end of data row, then close the file"""
+        if self.stream is None:
+            return
+        try:
+            if write_trailer:
+                self.flush_nmi()
+                self.stream.write(format_row([900]))  # End of data row
+        finally:
+            for spool in self.spools.values():
+                spool.close()
+            self.spools = {}
+            self.stream.close()
+            self.output_hash = self.stream.hexdigest()
+            self.stream = None
+            if self.zip_archive is not None:
+                self.zip_archive.close()
+                self.zip_archive = None
+
+    def add_readings(
+        self,
+        nmi: str,
+        nmi_configuration: str,
+        nmi_suffix: str,
+        uom: str,
+        readings: Iterable[list | tuple],
+        **kwargs,
+    ) -> None:
+        """Add readings for a channel, see NEM12.add_readings"""
+        self.start_nmi(nmi)
+        self.builder.add_readings(
+            nmi, nmi_configuration, nmi_suffix, uom, readings, **kwargs
+        )
+        self.spool_rows()
+
+    def add_dataframe(
+        self,
+        nmi: str,
+        df: "DataFrame",
+        uoms: dict[str, str] = UOMS,
+        meter_serial_number: str = "",
+    ) -> None:
+        """Add readings from pandas dataframe, see NEM12.add_dataframe"""
+        self.start_nmi(nmi)
+        self.builder.add_dataframe(nmi, df, uoms, meter_serial_number)
+        self.spool_rows()
+
+    def add_dataframe_chunks(
+        self,
+        nmi: str,
+        chunks: Iterable["DataFrame"],
+        uoms: dict[str, str] = UOMS,
+        meter_serial_number: str = "",
+    ) -> None:
+        """Add readings from dataframes sorted by time, one chunk at a time
+        A day split across chunks is kept together, so only a chunk and
+        the readings of one day are held in memory.
+        """
+        for df in day_chunks(chunks):
+            self.add_dataframe(nmi, df, uoms, meter_serial_number)
+
+    def add_csv(
+        self,
+        nmi: str,
+        file_path: str | Path,
+        uoms: dict[str, str] = UOMS,
+        meter_serial_number: str = "",
+        chunksize: int = DEFAULT_CHUNKSIZE,
+        **kwargs,
+    ) -> None:
+        """Add readings from a csv with a column of interval end times,
+        then a column for each channel, reading chunksize rows at a time
+        Extra arguments are passed to pandas.read_csv
+        """
+        chunks = read_csv_chunks(file_path, chunksize, **kwargs)
+        self.add_dataframe_chunks(nmi, chunks, uoms, meter_serial_number)
+
+    def add_arrow(
+        self,
+        nmi: str,
+        table,
+        uoms: dict[str, str] = UOMS,
+        meter_serial_number: str = "",
+        time_column: str | None = None,
+    ) -> None:
+        """Add readings from a pyarrow Table or RecordBatch, see NEM12.add_arrow"""
+        self.start_nmi(nmi)
+        self.builder.add_arrow(nmi, table, uoms, meter_serial_number, time_column)
+        self.spool_rows()
+
+    def add_parquet(
+        self,
+        nmi: str,
+        file_path: str | Path,
+        uoms: dict[str, str] = UOMS,
+        meter_serial_number: str = "",
+        chunksize: int = DEFAULT_CHUNKSIZE,
+        index_col: str | None = None,
+    ) -> None:
+        """Add readings from a parquet file, reading chunksize rows at a time
+        Needs pyarrow, but not pandas. The saved index or index_col holds
+        interval end times.
+        """
+        from .arrow import arrow_day_batches, read_parquet_batches
+
+        batches = read_parquet_batches(file_path, chunksize)
+        for table in arrow_day_batches(batches, index_col):
+            self.add_arrow(nmi, table, uoms, meter_serial_number, index_col)
+
+    def start_nmi(self, nmi: str) -> None:
+        """Write out the previous NMI when a new one is started"""
+        if self.stream is None:
+            raise ValueError("Writer is not open")
+        if self.nmi is not None and nmi < self.nmi:
+            raise ValueError(f"NMI {nmi} must be added before {self.nmi}")
+        if self.nmi is not None and nmi != self.nmi:
+            self.flush_nmi()
+        self.nmi = nmi
+
+    def spool_rows(self) -> None:
+        """Move rows from the builder into the channel spools"""
+        for nmi_suffix, rows in self.builder.meters.get(self.nmi, {}).items():
+            if nmi_suffix not in self.spools:
+                self.spools[nmi_suffix] = SpooledTemporaryFile(  # noqa: SIM115
+                    max_size=self.spool_size, mode="w+", newline=""
+                )
+            spool = self.spools[nmi_suffix]
+            for record in rows.records:
+                if isinstance(record, ChannelHeader):
+                    # Only repeat the 200 row if the channel details change
+                    if record == self.last_headers.get(nmi_suffix):
+                        continue
+                    self.last_headers[nmi_suffix] = record
+                    spool.write(format_row(record.to_row()))
+                elif self.builder.block_cache is not None:
+                    header = self.last_headers[nmi_suffix]
+                    spool.write(
+                        format_day_block(
+                            record, header, self.builder.block_cache, self.decimals
+                        )
+                    )
+                else:
+                    spool.write(format_day(record, self.decimals))
+            rows.clear()
+
+    @timed("flush_nmi")
+    def flush_nmi(self) -> None:
+        """Copy the spooled rows of the current NMI to the file"""
+        stage = self.stats["flush_nmi"]
+        for nmi_suffix in sorted(self.spools):
+            spool = self.spools[nmi_suffix]
+            size = spool.tell()  # Spooled rows are only ever appended
+            stage.bytes += size
+            stage.peak_bytes = max(stage.peak_bytes, size)
+            spool.seek(0)
+            shutil.copyfileobj(spool, self.stream)
+            spool.close()
+        self.spools = {}
+        self.last_headers = {}
+        self.builder.meters = {}
@@ -4,22 +4,114 @@
     Write meter readings to MDFF format
 """
 
-import csv
 import datetime
-from collections.abc import Generator
-from io import StringIO
+import hashlib
+from collections.abc import AsyncGenerator, Generator, Mapping, Sequence
+from itertools import groupby, repeat
+from operator import itemgetter
 from pathlib import Path
-from zipfile import ZIP_DEFLATED, ZipFile, ZipInfo
+from typing import TYPE_CHECKING
+from zipfile import ZIP_DEFLATED
+
+from .output import DEFAULT_HASH, open_output, write_rows, zip_date_time
+from .stats import NULL_STATS, Stats, timed, timed_rows
+
+if TYPE_CHECKING:
+    # numpy, pandas and asyncio are only imported once they are used
+    from concurrent.futures import Executor
+
+    from pandas import DataFrame
+
+# Fields of the 250 record, in the order they are written
+READ_FIELDS = (
+    "nmi",
+    "nmi_configuration",
+    "register_id",
+    "nmi_suffix",
+    "mdm_datastream_identitfier",
+    "meter_serial_number",
+    "direction_indicator",
+    "previous_read",
+    "previous_read_date",
+    "previous_quality_method",
+    "previous_reason_code",
+    "previous_reason_desc",
+    "current_read",
+    "current_read_date",
+    "current_quality_method",
+    "current_reason_code",
+    "current_reason_desc",
+    "quantity",
+    "uom",
+    "next_scheduled_read_date",
+    "update_date",
+    "mstats_load_date",
+)
+REQUIRED_FIELDS = (
+    "nmi",
+    "nmi_configuration",
+    "register_id",
+    "nmi_suffix",
+    "previous_read",
+    "previous_read_date",
+    "current_read",
+    "current_read_date",
+    "quantity",
+)
+FIELD_DEFAULTS = {"direction_indicator": "E", "uom": "kWh"}
+DATE_FIELDS = ("previous_read_date", "current_read_date")
+
+
+def date_column(values: Sequence) -> list[str]:
+    """Format a column of read dates as DateTime(14) text in one go"""
+    from pandas import DatetimeIndex
+
+    from .columnar import format_timestamps
+
+    index = DatetimeIndex(values)
+    if index.hasnans:
+        raise ValueError("Read dates can not be missing")
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    return format_timestamps(index.as_unit("ns").asi8)
+
+
+def is_missing(value: object) -> bool:
+    """Check for None, NaN, NaT or the pandas NA"""
+    if value is None:
+        return True
+    try:
+        return bool(value != value)  # NaN and NaT are not equal to themselves
+    except TypeError:
+        return True  # The pandas NA has no truth value
+
+
+def value_column(values: Sequence) -> list:
+    """Get column values as a list, with missing values as None
+    Each value keeps its own type, as if it was given to add_reading.
+    """
+    if hasattr(values, "tolist"):  # numpy arrays and pandas columns
+        values = values.tolist()
+    return [None if is_missing(x) else x for x in values]
 
 
 class NEM13:
     """An NEM file object"""
 
     def __init__(
-        self, to_participant: str, from_participant: str | None = None
+        self,
+        to_participant: str,
+        from_participant: str | None = None,
+        stats: Stats | None = None,
+        file_time: datetime.datetime | None = None,
     ) -> None:
+        """Set file_time to write the same header and zip entry time on every
+        run, so the same readings always give the same bytes
+        """
         version_header = "NEM13"
-        self.file_time = datetime.datetime.now().strftime("%Y%m%d%H%M")
+        if file_time is None:
+            file_time = datetime.datetime.now()
+        self.file_time = file_time.strftime("%Y%m%d%H%M")
         self.from_participant = from_participant
         self.to_participant = to_participant
         self.header = [
@@ -31,6 +123,8 @@ class NEM13:
         ]
 
         self.meters = dict()
+        self.stats = stats if stats is not None else NULL_STATS
+        self.output_hash = None  # Hash of the csv text last output
 
     def __repr__(self):
         return f"<NEM13 Builder {self.file_time} {self.to_participant}>"
@@ -100,6 +194,42 @@ class NEM13:
 
         self.meters[nmi][nmi_suffix].append(data_record)
 
+    @timed("add_records")
+    def add_records(self, columns: Mapping[str, Sequence]) -> None:
+        """Add many accumulation reads from columns named after the
+        add_reading arguments, such as a dict of lists or arrays
+        """
+        missing = [x for x in REQUIRED_FIELDS if x not in columns]
+        if missing:
+            raise ValueError(f"Missing columns: {', '.join(missing)}")
+        num_records = len(columns["nmi"])
+        self.stats["add_records"].rows += num_records
+
+        fields = []
+        for field in READ_FIELDS:
+            if field not in columns:
+                fields.append(repeat(FIELD_DEFAULTS.get(field)))
+            elif field in DATE_FIELDS:
+                fields.append(date_column(columns[field]))
+            else:
+                fields.append(value_column(columns[field]))
+        if any(len(x) != num_records for x in fields if isinstance(x, list)):
+            raise ValueError("Columns must all be the same length")
+
+        records = map(list, zip(repeat(250), *fields))
+        for (nmi, nmi_suffix), group in groupby(records, key=itemgetter(1, 4)):
+            readings = self.meters.setdefault(nmi, dict()).setdefault(
+                nmi_suffix, list()
+            )
+            readings.extend(group)
+
+    def add_dataframe(self, df: "DataFrame") -> None:
+        """Add accumulation reads from a dataframe with a column for each
+        add_reading argument
+        """
+        self.add_records({x: df[x] for x in READ_FIELDS if x in df.columns})
+
+    @timed_rows("build_output")
     def build_output(self) -> Generator[list, None, None]:
         """Emit rows for NEM file"""
         yield self.header
@@ -109,6 +239,11 @@ class NEM13:
                 yield from readings
         yield [900]  # End of data row
 
+    @property
+    def zip_time(self) -> tuple:
+        """Time of the zip entries, the same as the header file time"""
+        return zip_date_time(self.file_time)
+
     def nem_filename(self) -> str:
         """Return suggested NEM filename"""
         nmis = list(self.meters.keys())
@@ -120,6 +255,7 @@ class NEM13:
         file_name = f"NEM13#{uid}#{self.from_participant}#{self.to_participant}"
         return file_name
 
+    @timed("output_csv")
     def output_csv(self, file_path="") -> str:
         """Output NEM file"""
 
@@ -128,15 +264,24 @@ class NEM13:
 
         if not file_path:
             file_path = f"{self.nem_filename()}.csv"
-        with open(file_path, "w", newline="") as csvfile:
-            writer = csv.writer(csvfile, quoting=csv.QUOTE_MINIMAL)
-            for row in self.build_output():
-                writer.writerow(row)
+        digest = hashlib.new(DEFAULT_HASH)
+        with open_output(Path(file_path), digest=digest) as csvfile:
+            write_rows(self.build_output(), csvfile)
+        self.output_hash = digest.hexdigest()
+        if self.stats.enabled:
+            self.stats["output_csv"].bytes += Path(file_path).stat().st_size
         return file_path
 
-    def output_zip(self, file_path="") -> str:
-        """Output NEM file"""
-
+    @timed("output_zip")
+    def output_zip(
+        self,
+        file_path="",
+        compression: int = ZIP_DEFLATED,
+        compresslevel: int | None = None,
+    ) -> str:
+        """Output NEM file as a csv in a zip archive
+        Rows are compressed as they are written, use ZIP_STORED for no compression
+        """
         if self.is_empty:
             raise ValueError("No readings to output")
 
@@ -144,13 +289,72 @@ class NEM13:
             file_path = f"{self.nem_filename()}.zip"
         file_path = Path(file_path)
 
-        with StringIO(newline="") as stream:
-            writer = csv.writer(stream, quoting=csv.QUOTE_MINIMAL)
-            for row in self.build_output():
-                writer.writerow(row)
-            csv_str = stream.getvalue()
+        digest = hashlib.new(DEFAULT_HASH)
+        with open_output(
+            file_path, True, compression, compresslevel, self.zip_time, digest
+        ) as stream:
+            write_rows(self.build_output(), stream)
+        self.output_hash = digest.hexdigest()
+        if self.stats.enabled:
+            self.stats["output_zip"].bytes += file_path.stat().st_size
+        return file_path
+
+    async def abuild_output(self) -> AsyncGenerator[list, None]:
+        """Emit rows for NEM file with async for, letting other tasks run"""
+        from .aio import iterate
+
+        async for row in iterate(self.build_output()):
+            yield row
+
+    async def output_csv_async(
+        self, file_path="", executor: "Executor | None" = None
+    ) -> str:
+        """Output NEM file, writing in chunks in the executor"""
+        from .aio import write_async, write_csv_rows
+
+        if self.is_empty:
+            raise ValueError("No readings to output")
+
+        if not file_path:
+            file_path = f"{self.nem_filename()}.csv"
+        rows = self.build_output()
+        digest = hashlib.new(DEFAULT_HASH)
+        await write_async(
+            Path(file_path), rows, write_csv_rows, executor=executor, digest=digest
+        )
+        self.output_hash = digest.hexdigest()
+        return file_path
+
+    async def output_zip_async(
+        self,
+        file_path="",
+        compression: int = ZIP_DEFLATED,
+        compresslevel: int | None = None,
+        executor: "Executor | None" = None,
+    ) -> Path:
+        """Output NEM file as a csv in a zip archive, compressing in chunks
+        in the executor
+        """
+        from .aio import write_async, write_csv_rows
+
+        if self.is_empty:
+            raise ValueError("No readings to output")
 
-        with ZipFile(file_path, "w", compression=ZIP_DEFLATED) as zip_archive:
-            file1 = ZipInfo(f"{file_path.stem}.csv")
-            zip_archive.writestr(file1, csv_str, compress_type=ZIP_DEFLATED)
+        if not file_path:
+            file_path = f"{self.nem_filename()}.zip"
+        file_path = Path(file_path)
+        rows = self.build_output()
+        digest = hashlib.new(DEFAULT_HASH)
+        await write_async(
+            file_path,
+            rows,
+            write_csv_rows,
+            True,
+            compression,
+            compresslevel,
+            executor,
+            date_time=self.zip_time,
+            digest=digest,
+        )
+        self.output_hash = digest.hexdigest()
         return file_path
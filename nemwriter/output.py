@@ -0,0 +1,125 @@
+"""
+    nemwriter.output
+    ~~~~~
+    Write NEM rows to csv files and zip archives
+"""
+
+import csv
+import hashlib
+from collections.abc import Generator, Iterable
+from contextlib import contextmanager
+from datetime import datetime
+from io import TextIOWrapper
+from pathlib import Path
+from typing import TextIO
+from zipfile import ZIP_DEFLATED, ZipFile, ZipInfo
+
+ZIP_UNIX_SYSTEM = 3
+ZIP_FILE_MODE = 0o644
+DEFAULT_HASH = "sha256"
+
+
+class HashingWriter:
+    """Text stream that hashes the encoded text as it is written"""
+
+    def __init__(self, stream: TextIO, digest=None) -> None:
+        self.stream = stream
+        self.digest = digest if digest is not None else hashlib.new(DEFAULT_HASH)
+
+    def write(self, text: str) -> int:
+        self.digest.update(text.encode("utf-8"))
+        return self.stream.write(text)
+
+    def writelines(self, lines: Iterable[str]) -> None:
+        update = self.digest.update
+        for line in lines:
+            update(line.encode("utf-8"))
+            self.stream.write(line)
+
+    def hexdigest(self) -> str:
+        return self.digest.hexdigest()
+
+    def close(self) -> None:
+        self.stream.close()
+
+
+def hash_lines(lines: Iterable[str], name: str = DEFAULT_HASH) -> str:
+    """Get the hash of csv lines as they would be written to a file"""
+    digest = hashlib.new(name)
+    for line in lines:
+        digest.update(line.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def zip_date_time(file_time: str) -> tuple[int, int, int, int, int, int]:
+    """Get the zip entry time of a YYYYMMDDHHMM file time"""
+    return datetime.strptime(file_time, "%Y%m%d%H%M").timetuple()[:6]
+
+
+def write_rows(rows: Iterable[list], stream: TextIO) -> None:
+    """Write rows to a text stream as csv"""
+    writer = csv.writer(stream, quoting=csv.QUOTE_MINIMAL)
+    writer.writerows(rows)
+
+
+def open_zip_entry(
+    zip_archive: ZipFile,
+    name: str,
+    compresslevel: int | None = None,
+    date_time: tuple | None = None,
+) -> TextIOWrapper:
+    """Open a csv file in a zip archive to write text to
+    The archive compression method is used for the entry. The entry
+    metadata is the same on every platform, so identical text and
+    date_time give an identical archive.
+    """
+    entry = ZipInfo(name) if date_time is None else ZipInfo(name, date_time)
+    entry.create_system = ZIP_UNIX_SYSTEM
+    entry.external_attr = ZIP_FILE_MODE << 16
+    entry.compress_type = zip_archive.compression
+    entry._compresslevel = compresslevel  # Same as ZipFile.writestr sets it
+    # The size is not known in advance, so allow entries over 2 GiB
+    raw = zip_archive.open(entry, "w", force_zip64=True)
+    return TextIOWrapper(raw, encoding="utf-8", newline="")
+
+
+@contextmanager
+def open_output(
+    file_path: Path,
+    zipped: bool = False,
+    compression: int = ZIP_DEFLATED,
+    compresslevel: int | None = None,
+    date_time: tuple | None = None,
+    digest=None,
+) -> Generator[TextIO, None, None]:
+    """Open a csv file, or a csv of the same name in a zip archive, to write
+    With a hashlib digest, the text is added to it as it is written
+    """
+    if not zipped:
+        with open(file_path, "w", encoding="utf-8", newline="") as csvfile:
+            yield csvfile if digest is None else HashingWriter(csvfile, digest)
+        return
+    with ZipFile(
+        file_path, "w", compression=compression, compresslevel=compresslevel
+    ) as zip_archive:
+        entry_name = f"{file_path.stem}.csv"
+        with open_zip_entry(
+            zip_archive, entry_name, compresslevel, date_time
+        ) as stream:
+            yield stream if digest is None else HashingWriter(stream, digest)
+
+
+def write_lines(
+    file_path: Path,
+    lines: Iterable[str],
+    zipped: bool = False,
+    compression: int = ZIP_DEFLATED,
+    compresslevel: int | None = None,
+    date_time: tuple | None = None,
+) -> Path:
+    """Write csv lines to a file, or to a csv of the same name in a zip archive"""
+    with open_output(
+        file_path, zipped, compression, compresslevel, date_time
+    ) as stream:
+        stream.writelines(lines)
+    return file_path
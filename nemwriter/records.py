@@ -0,0 +1,581 @@
+"""
+    nemwriter.records
+    ~~~~~
+    Compact storage of NEM12 channel rows
+"""
+
+from array import array
+from bisect import bisect_right, insort
+from collections.abc import Generator, Iterable, Iterator, Sequence
+from datetime import datetime
+from functools import lru_cache
+from threading import Lock
+
+MAX_EXACT_FLOAT = 2**53  # Larger integers can not be stored exactly as a float
+MAX_DECIMALS = 6
+MINUTES_PER_DAY = 24 * 60
+NULL_EVENT = ("N", None, None)  # Quality of intervals without a reading
+NO_EVENT = (None, None, None)
+RUN_TYPECODE = "I"  # Quality runs are packed as start, end and label index
+RUN_SIZE = 3 * array(RUN_TYPECODE).itemsize
+
+
+def decimal_scale(values: Iterable) -> int | None:
+    """Find the fewest decimal places that store all values exactly as integers"""
+    try:
+        for scale in range(MAX_DECIMALS + 1):
+            factor = 10**scale
+            if all(round(x * factor) / factor == x for x in values):
+                return scale
+    except (ValueError, OverflowError):
+        pass  # NaN or infinite values
+    return None
+
+
+def compact_values(values: list) -> tuple[array | list, int | None]:
+    """Store interval values in the smallest typed array that keeps their text
+    Values with a decimal scale are stored as integer counts of 10**-scale
+    """
+    types = set(map(type, values))
+    if types <= {int}:
+        for typecode in ("i", "q"):
+            try:
+                return array(typecode, values), 0
+            except OverflowError:
+                continue
+        return values, None
+    if not all(issubclass(x, (int, float)) for x in types):
+        return values, None
+
+    # Days repeat a few values (often zero), so only check each one once.
+    # Equal ints and floats are written the same, so can share a check.
+    distinct = set(values)
+    largest_int = max((abs(x) for x in distinct if type(x) is int), default=0)
+    if largest_int >= MAX_EXACT_FLOAT:
+        return values, None
+
+    scale = decimal_scale(distinct)
+    if scale is not None:
+        factor = 10**scale
+        scaled = {x: round(x * factor) for x in distinct}
+        try:
+            return array("i", map(scaled.__getitem__, values)), scale
+        except OverflowError:
+            pass
+    return array("d", values), None
+
+
+class ChannelHeader:
+    """NMI data details (200) record"""
+
+    __slots__ = (
+        "nmi",
+        "nmi_configuration",
+        "register_id",
+        "nmi_suffix",
+        "mdm_datastream_identitfier",
+        "meter_serial_number",
+        "uom",
+        "interval_length",
+        "next_scheduled_read_date",
+    )
+
+    def __init__(
+        self,
+        nmi: str,
+        nmi_configuration: str,
+        register_id: str,
+        nmi_suffix: str,
+        mdm_datastream_identitfier: str,
+        meter_serial_number: str,
+        uom: str,
+        interval_length: int | None,
+        next_scheduled_read_date: datetime | None,
+    ) -> None:
+        self.nmi = nmi
+        self.nmi_configuration = nmi_configuration
+        self.register_id = register_id
+        self.nmi_suffix = nmi_suffix
+        self.mdm_datastream_identitfier = mdm_datastream_identitfier
+        self.meter_serial_number = meter_serial_number
+        self.uom = uom
+        self.interval_length = interval_length
+        self.next_scheduled_read_date = next_scheduled_read_date
+
+    def __repr__(self):
+        return f"<ChannelHeader {self.nmi} {self.nmi_suffix} {self.interval_length}>"
+
+    def __eq__(self, other):
+        if not isinstance(other, ChannelHeader):
+            return NotImplemented
+        return self.to_row() == other.to_row()
+
+    def with_interval_length(self, interval_length: int) -> "ChannelHeader":
+        """Copy of the header for a different interval length"""
+        header = ChannelHeader(*[getattr(self, x) for x in self.__slots__])
+        header.interval_length = interval_length
+        return header
+
+    def to_row(self) -> list:
+        return [200, *[getattr(self, x) for x in self.__slots__]]
+
+
+class QualityEvent:
+    """Interval event (400) record, a run of intervals with the same quality"""
+
+    __slots__ = (
+        "start_interval",
+        "end_interval",
+        "quality",
+        "event_code",
+        "event_desc",
+    )
+
+    def __init__(
+        self,
+        start_interval: int,
+        end_interval: int,
+        quality: str | None,
+        event_code: int | None = None,
+        event_desc: str | None = None,
+    ) -> None:
+        self.start_interval = start_interval
+        self.end_interval = end_interval
+        self.quality = quality
+        self.event_code = event_code
+        self.event_desc = event_desc
+
+    def __repr__(self):
+        return (
+            f"<QualityEvent {self.start_interval}-{self.end_interval} {self.quality}>"
+        )
+
+    def to_row(self) -> list:
+        return [
+            "400",
+            self.start_interval,
+            self.end_interval,
+            self.quality,
+            self.event_code,
+            self.event_desc,
+        ]
+
+
+class QualityLabels:
+    """The (quality, event_code, event_desc) of quality runs, each stored once
+    Packed runs refer to labels by index, so labels are never removed.
+    """
+
+    def __init__(self) -> None:
+        self.labels = [NULL_EVENT]
+        self.indexes = {NULL_EVENT: 0}
+        self.lock = Lock()
+
+    def __getitem__(self, index: int) -> tuple:
+        return self.labels[index]
+
+    def index(self, label: tuple) -> int:
+        try:
+            index = self.indexes.get(label)
+            hashable = True
+        except TypeError:  # Unhashable event details are only found by a scan
+            index = next((i for i, x in enumerate(self.labels) if x == label), None)
+            hashable = False
+        if index is None:
+            with self.lock:
+                index = len(self.labels)
+                self.labels.append(label)
+                if hashable:
+                    self.indexes[label] = index
+        return index
+
+
+QUALITY_LABELS = QualityLabels()
+
+
+@lru_cache(maxsize=1024)
+def shared_runs(runs: bytes) -> bytes:
+    """Share the packed runs of common quality patterns between days"""
+    return runs
+
+
+def pack_runs(runs: Iterable[tuple]) -> bytes:
+    """Pack (start_interval, end_interval, quality, event_code, event_desc) runs"""
+    packed = array(RUN_TYPECODE)
+    for start, end, *label in runs:
+        packed.extend((start, end, QUALITY_LABELS.index(tuple(label))))
+    return shared_runs(packed.tobytes())
+
+
+def unpack_runs(runs: bytes) -> Iterator[tuple]:
+    """Get the (start_interval, end_interval, quality, event_code, event_desc)
+    of packed runs
+    """
+    packed = memoryview(runs).cast(RUN_TYPECODE)
+    for i in range(0, len(packed), 3):
+        yield (packed[i], packed[i + 1], *QUALITY_LABELS[packed[i + 2]])
+
+
+def dense_day(
+    readings: Iterable[tuple], num_intervals: int
+) -> tuple[list, list[tuple]]:
+    """Place (pos, value, quality, event_code, event_desc) readings in the
+    intervals of a day. Returns the value of each interval and the
+    (pos, quality, event_code, event_desc) where each quality run starts.
+
+    The last reading for an interval is used, and intervals without a
+    reading are null (N) with a value of 0. Runs are found from the sorted
+    reading positions, so sparse days only cost as much as their readings.
+    """
+    placed = {}
+    for reading in readings:
+        placed[reading[0]] = reading
+
+    values = [0] * num_intervals
+    day_events = []
+    prev_key = NO_EVENT  # A first run without quality details is not recorded
+    next_pos = 0
+    for pos in sorted(placed):
+        if pos >= num_intervals:
+            continue  # Past the end of the day
+        reading = placed[pos]
+        key = reading[2:5]
+        if len(key) < 3:
+            key = (*key, None, None, None)[:3]
+        if pos > next_pos and prev_key != NULL_EVENT:
+            day_events.append((next_pos, *NULL_EVENT))  # Gap before the reading
+            prev_key = NULL_EVENT
+        if key != prev_key:
+            day_events.append((pos, *key))
+            prev_key = key
+        values[pos] = reading[1]
+        next_pos = pos + 1
+    if next_pos < num_intervals and prev_key != NULL_EVENT:
+        day_events.append((next_pos, *NULL_EVENT))
+    return values, day_events
+
+
+def quality_events(day_events: Iterable[tuple], num_intervals: int) -> bytes:
+    """Get the packed runs of the (pos, quality, event_code, event_desc) where
+    each run of the day starts. Common patterns are shared between days.
+    """
+    day_events = list(day_events)
+    if not day_events:
+        return b""  # No quality details, written as V without 400 rows
+    end_positions = [x[0] for x in day_events[1:]] + [num_intervals]
+    return pack_runs(
+        (pos + 1, end_pos, *label)
+        for (pos, *label), end_pos in zip(day_events, end_positions, strict=True)
+    )
+
+
+class DayRecord:
+    """Interval data (300) record and the quality runs of the day
+    Runs are packed as the start, end and quality label index of each run.
+    """
+
+    __slots__ = (
+        "day",
+        "values",
+        "scale",
+        "runs",
+        "update_time",
+        "msats_time",
+        "text",
+    )
+
+    def __init__(
+        self,
+        day: str,
+        values: array | memoryview | list,
+        scale: int | None,
+        runs: bytes,
+        update_time: str | None = None,
+        msats_time: str | None = None,
+    ) -> None:
+        self.day = day
+        self.values = values
+        self.scale = scale
+        self.runs = runs
+        self.update_time = update_time
+        self.msats_time = msats_time
+        self.text = None  # Formatted rows, kept as (decimals, text) if cached
+
+    def __repr__(self):
+        return f"<DayRecord {self.day} {len(self.values)} intervals>"
+
+    @property
+    def interval_length(self) -> int:
+        """Interval length in minutes, from the number of intervals"""
+        return MINUTES_PER_DAY // len(self.values)
+
+    def __len__(self) -> int:
+        """Number of rows for the day"""
+        return 1 if self.num_runs == 1 else 1 + self.num_runs
+
+    def __getstate__(self) -> dict:
+        # Label indexes are only known in this process, so pickle the labels
+        state = {x: getattr(self, x) for x in self.__slots__}
+        state["runs"] = list(unpack_runs(self.runs))
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        state["runs"] = pack_runs(state["runs"])
+        for name, value in state.items():
+            setattr(self, name, value)
+
+    @property
+    def num_runs(self) -> int:
+        return len(self.runs) // RUN_SIZE
+
+    @property
+    def events(self) -> tuple[QualityEvent, ...]:
+        """400 records of the quality runs"""
+        return tuple(QualityEvent(*x) for x in unpack_runs(self.runs))
+
+    def row_values(self) -> list:
+        """Interval values, with whole floats as integers to shrink file size"""
+        if self.scale:
+            factor = 10**self.scale
+            return [
+                x // factor if x % factor == 0 else x / factor
+                for x in self.values.tolist()
+            ]
+        if self.scale is None and isinstance(self.values, array | memoryview):
+            return [int(x) if x.is_integer() else x for x in self.values.tolist()]
+        return list(self.values)
+
+    def slot_events(self) -> list[tuple]:
+        """Get the (quality, event_code, event_desc) of each interval"""
+        if not self.runs:
+            return [NO_EVENT] * len(self.values)
+        slots = []
+        for start, end, *key in unpack_runs(self.runs):
+            slots.extend([tuple(key)] * (end - start + 1))
+        return slots
+
+    def to_rows(self) -> Generator[list, None, None]:
+        """Emit 300 row and 400 rows if there is more than one quality"""
+        if self.num_runs == 1:
+            # Same quality for all records
+            _, _, quality_method, event_code, event_desc = next(unpack_runs(self.runs))
+        else:
+            quality_method = "V"
+            event_code = None
+            event_desc = None
+
+        yield [
+            300,
+            self.day,
+            *self.row_values(),
+            quality_method,
+            event_code,
+            event_desc,
+            self.update_time,
+            self.msats_time,
+        ]
+        if self.num_runs > 1:
+            for run in unpack_runs(self.runs):
+                yield ["400", *run]
+
+
+def merge_day_records(old: DayRecord, new: DayRecord) -> DayRecord:
+    """Merge the intervals of a new record into an existing record of the day
+    Intervals of the new record with null (N) quality keep their old values.
+    Only the quality runs of the merged day are worked out again.
+    """
+    if len(old.values) != len(new.values):
+        raise ValueError(
+            f"Can not merge {new.day} with {len(new.values)} intervals "
+            f"into {len(old.values)} intervals"
+        )
+    values = old.row_values()
+    slots = old.slot_events()
+    for pos, (value, key) in enumerate(
+        zip(new.row_values(), new.slot_events(), strict=True)
+    ):
+        if key[0] != "N":
+            values[pos] = value
+            slots[pos] = key
+
+    day_events = [
+        (pos, *key)
+        for pos, key in enumerate(slots)
+        if pos == 0 or key != slots[pos - 1]
+    ]
+    if day_events and day_events[0][1:] == NO_EVENT:
+        del day_events[0]  # A first run without quality details, as dense_day
+    values, scale = compact_values(values)
+    return DayRecord(
+        old.day,
+        values,
+        scale,
+        quality_events(day_events, len(slots)),
+        new.update_time or old.update_time,
+        new.msats_time or old.msats_time,
+    )
+
+
+class ChannelRows(Sequence):
+    """Rows of an NMI channel, stored as records until they are output
+
+    Iterating gives the same row lists as the NEM file. Plain row lists
+    can still be appended alongside records. Days added with add_day are
+    indexed, so readings for a day that was already added are merged in,
+    and the positions of 200 records are kept to select days without a scan.
+    """
+
+    def __init__(self, records: Iterable = ()) -> None:
+        self.records = []
+        self.day_index = {}
+        self.header_positions = []
+        self.last_header = None
+        self.extend(records)
+
+    def __repr__(self):
+        return f"<ChannelRows {len(self.records)} records>"
+
+    def __iter__(self) -> Iterator[list]:
+        for record in self.records:
+            if isinstance(record, DayRecord):
+                yield from record.to_rows()
+            elif isinstance(record, ChannelHeader):
+                yield record.to_row()
+            else:
+                yield record
+
+    def __len__(self) -> int:
+        return sum(len(x) if isinstance(x, DayRecord) else 1 for x in self.records)
+
+    def __getitem__(self, index):
+        return list(self)[index]
+
+    def __eq__(self, other):
+        if isinstance(other, ChannelRows | list):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def append(self, record) -> None:
+        if isinstance(record, ChannelHeader):
+            self.header_positions.append(len(self.records))
+        self.records.append(record)
+
+    def extend(self, records: Iterable) -> None:
+        for record in records:
+            self.append(record)
+
+    def clear(self) -> None:
+        self.records.clear()
+        self.day_index.clear()
+        self.header_positions.clear()
+        self.last_header = None
+
+    def day(self, day: str) -> tuple[int, DayRecord] | None:
+        """Get the interval length and record of a day that was added"""
+        try:
+            record = self.records[self.day_index[day]]
+        except KeyError:
+            return None
+        return record.interval_length, record
+
+    def add_day(
+        self, interval_length: int, record: DayRecord, header: ChannelHeader
+    ) -> None:
+        """Add a day record, merging it into the record of the day if it
+        was already added. A 200 record is added when the channel details
+        or interval length change.
+        """
+        if record.day in self.day_index:
+            index = self.day_index[record.day]
+            self.records[index] = merge_day_records(self.records[index], record)
+            return
+        if header.interval_length != interval_length:
+            header = header.with_interval_length(interval_length)
+        later = self.later_position(record.day)
+        if later is not None:
+            self.insert_day(later, record, header)
+            return
+        if header != self.last_header:
+            self.append(header)
+            self.last_header = header
+        self.day_index[record.day] = len(self.records)
+        self.records.append(record)
+
+    def later_position(self, day: str) -> int | None:
+        """Get the position of the first day after a day, if any"""
+        last = self.records[-1] if self.records else None
+        if isinstance(last, DayRecord) and last.day < day:
+            return None  # Days are usually added in order
+        return min((pos for x, pos in self.day_index.items() if x > day), default=None)
+
+    def insert_day(self, later: int, record: DayRecord, header: ChannelHeader) -> None:
+        """Insert a day record before the day at a position, keeping days in
+        date order. 200 records are added so each day keeps its own header.
+        """
+        header_pos = bisect_right(self.header_positions, later) - 1
+        later_header = self.records[self.header_positions[header_pos]]
+        if self.header_positions[header_pos] == later - 1 and header != later_header:
+            # Insert before the 200 record that starts the later day
+            position = later - 1
+            previous = None
+            if header_pos:
+                previous = self.records[self.header_positions[header_pos - 1]]
+            following = None
+        else:
+            position = later
+            previous = following = later_header
+        inserted = [record]
+        if header != previous:
+            inserted.insert(0, header)
+            if following is not None:
+                inserted.append(following)
+        shift = len(inserted)
+        for day, pos in self.day_index.items():
+            if pos >= position:
+                self.day_index[day] = pos + shift
+        self.header_positions = [
+            pos + shift if pos >= position else pos for pos in self.header_positions
+        ]
+        for offset, item in enumerate(inserted):
+            if isinstance(item, ChannelHeader):
+                insort(self.header_positions, position + offset)
+            else:
+                self.day_index[item.day] = position + offset
+        self.records[position:position] = inserted
+
+    def select(
+        self, first_day: str | None = None, last_day: str | None = None
+    ) -> "ChannelRows":
+        """Get the days from first_day to last_day (YYYYMMDD) as new rows
+        Records are shared, not copied. Each day keeps the 200 record it was
+        added under, which is repeated whenever it changes. Plain row lists
+        are not part of any day, so are left out.
+        """
+        positions = sorted(
+            pos
+            for day, pos in self.day_index.items()
+            if (first_day is None or day >= first_day)
+            and (last_day is None or day <= last_day)
+        )
+        selected = ChannelRows()
+        for pos in positions:
+            record = self.records[pos]
+            header_pos = bisect_right(self.header_positions, pos) - 1
+            header = self.records[self.header_positions[header_pos]]
+            if header is not selected.last_header:
+                selected.append(header)
+                selected.last_header = header
+            selected.day_index[record.day] = len(selected.records)
+            selected.records.append(record)
+        return selected
+
+    def merge(self, other: "ChannelRows") -> None:
+        """Add the records of another channel, merging days already added"""
+        header = None
+        for record in other.records:
+            if isinstance(record, ChannelHeader):
+                header = record
+            elif isinstance(record, DayRecord) and header is not None:
+                self.add_day(header.interval_length, record, header)
+            else:
+                self.append(record)
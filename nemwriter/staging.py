@@ -0,0 +1,195 @@
+"""
+    nemwriter.staging
+    ~~~~~
+    Binary staging files of NEM12 day records, to build the NEM file later
+    without the source data
+"""
+
+import json
+import mmap
+import struct
+import sys
+from array import array
+from collections.abc import Iterable
+from datetime import datetime
+from pathlib import Path
+
+from .records import ChannelHeader, ChannelRows, DayRecord, pack_runs, unpack_runs
+
+MAGIC = b"NEM12STG"
+VERSION = 1
+ALIGN = 8
+META = struct.Struct("<HI")  # Version, length of the JSON details
+# Channel, 200 record, day, update time, MSATS time, number of values,
+# typecode, scale, first quality run, number of runs, offset of the values
+SLOT = struct.Struct("<IIIIIHcbIHQ")
+RUN = struct.Struct("<HHI")  # Start and end interval, quality label
+NO_SCALE = -1
+
+
+def padding(size: int) -> int:
+    return -size % ALIGN
+
+
+def encode_value(value: object) -> object:
+    if isinstance(value, datetime):
+        return {"datetime": value.isoformat()}
+    raise TypeError(f"Can not stage {value!r}")
+
+
+def decode_value(value: dict) -> object:
+    if "datetime" in value:
+        return datetime.fromisoformat(value["datetime"])
+    return value
+
+
+class Table(dict):
+    """Index of each distinct value, in the order they were added"""
+
+    def index(self, value: object) -> int:
+        return self.setdefault(value, len(self))
+
+
+def write_staged(
+    file_path: str | Path,
+    meters: dict[str, dict[str, ChannelRows]],
+    days: Iterable[str],
+    details: dict | None = None,
+) -> Path:
+    """Write the channel records to a staging file
+    The file holds a fixed width slot for each day of a channel and a table
+    of quality runs, followed by the interval values of every slot.
+    """
+    channels = []
+    headers = Table()
+    day_names = Table()
+    labels = Table()
+    strings = Table({None: 0})
+    slots = bytearray()
+    runs = bytearray()
+    values = []
+    values_size = 0
+    num_runs = 0
+    for nmi in meters:
+        for nmi_suffix, channel_rows in meters[nmi].items():
+            channel = len(channels)
+            channels.append([nmi, nmi_suffix])
+            header = None
+            for record in channel_rows.records:
+                if isinstance(record, ChannelHeader):
+                    header = headers.index(tuple(record.to_row()[1:]))
+                    continue
+                if not isinstance(record, DayRecord) or header is None:
+                    raise ValueError(f"Can not stage {record!r} of {nmi} {nmi_suffix}")
+                if not isinstance(record.values, array | memoryview):
+                    raise ValueError(f"Can not stage values of {nmi} {record.day}")
+                data = memoryview(record.values).cast("B")
+                slots += SLOT.pack(
+                    channel,
+                    header,
+                    day_names.index(record.day),
+                    strings.index(record.update_time),
+                    strings.index(record.msats_time),
+                    len(record.values),
+                    memoryview(record.values).format.encode(),
+                    NO_SCALE if record.scale is None else record.scale,
+                    num_runs,
+                    record.num_runs,
+                    values_size,
+                )
+                for start, end, *label in unpack_runs(record.runs):
+                    runs += RUN.pack(start, end, labels.index(tuple(label)))
+                    num_runs += 1
+                values.append(data)
+                values_size += len(data) + padding(len(data))
+
+    meta = {
+        "details": details or {},
+        "byteorder": sys.byteorder,
+        "days": list(days),
+        "channels": channels,
+        "headers": list(headers),
+        "day_names": list(day_names),
+        "labels": list(labels),
+        "strings": list(strings),
+        "slots": len(slots) // SLOT.size,
+        "runs": num_runs,
+    }
+    meta_bytes = json.dumps(meta, default=encode_value).encode()
+
+    file_path = Path(file_path)
+    with open(file_path, "wb") as f:
+        f.write(MAGIC + META.pack(VERSION, len(meta_bytes)) + meta_bytes)
+        for section in (slots, runs, *values):
+            f.write(b"\0" * padding(f.tell()))
+            f.write(section)
+    return file_path
+
+
+def read_staged(
+    file_path: str | Path,
+) -> tuple[dict[str, dict[str, ChannelRows]], list[str], dict]:
+    """Read the channel records of a staging file
+    The file is memory mapped and interval values are views of the mapping,
+    so they are only read from disk as they are output.
+    Returns the channels of each NMI, the days and the details written.
+    """
+    with open(file_path, "rb") as f:
+        try:
+            mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # Empty file
+            mapping = b""
+    view = memoryview(mapping)
+    if bytes(view[: len(MAGIC)]) != MAGIC:
+        raise ValueError(f"{file_path} is not a NEM12 staging file")
+    version, meta_size = META.unpack_from(view, len(MAGIC))
+    if version != VERSION:
+        raise ValueError(f"Staging file version {version} is not supported")
+    offset = len(MAGIC) + META.size
+    meta = json.loads(
+        bytes(view[offset : offset + meta_size]), object_hook=decode_value
+    )
+    if meta["byteorder"] != sys.byteorder:
+        raise ValueError(f"Staging file is {meta['byteorder']} endian")
+
+    offset += meta_size
+    offset += padding(offset)
+    slots = view[offset : offset + meta["slots"] * SLOT.size]
+    offset += len(slots) + padding(len(slots))
+    runs = list(RUN.iter_unpack(view[offset : offset + meta["runs"] * RUN.size]))
+    offset += meta["runs"] * RUN.size
+    values_start = offset + padding(offset)
+
+    headers = [ChannelHeader(*x) for x in meta["headers"]]
+    labels = [tuple(x) for x in meta["labels"]]
+    strings = meta["strings"]
+    day_names = [sys.intern(x) for x in meta["day_names"]]
+    channels = [ChannelRows() for _ in meta["channels"]]
+    meters = {}
+    for (nmi, nmi_suffix), channel_rows in zip(meta["channels"], channels, strict=True):
+        meters.setdefault(nmi, {})[nmi_suffix] = channel_rows
+
+    for slot in SLOT.iter_unpack(slots):
+        channel, header, day, update, msats, length, typecode, scale = slot[:8]
+        first_run, num_runs, values_offset = slot[8:]
+        start = values_start + values_offset
+        typecode = typecode.decode()
+        size = length * array(typecode).itemsize
+        record = DayRecord(
+            day_names[day],
+            view[start : start + size].cast(typecode),
+            None if scale == NO_SCALE else scale,
+            pack_runs(
+                (start, end, *labels[label])
+                for start, end, label in runs[first_run : first_run + num_runs]
+            ),
+            strings[update],
+            strings[msats],
+        )
+        channel_rows = channels[channel]
+        if channel_rows.last_header is not headers[header]:
+            channel_rows.append(headers[header])
+            channel_rows.last_header = headers[header]
+        channel_rows.day_index[record.day] = len(channel_rows.records)
+        channel_rows.append(record)
+    return meters, meta["days"], meta["details"]
@@ -0,0 +1,154 @@
+"""
+    nemwriter.stats
+    ~~~~~
+    Opt-in timing and size counters for each stage of building a NEM file
+"""
+
+from collections.abc import Callable, Generator, Iterable
+from contextlib import contextmanager
+from functools import wraps
+from time import perf_counter
+
+
+class StageStats:
+    """Totals for one stage, over all the times it was run"""
+
+    __slots__ = ("calls", "seconds", "rows", "bytes", "peak_bytes")
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.seconds = 0.0
+        self.rows = 0
+        self.bytes = 0
+        self.peak_bytes = 0
+
+    def __repr__(self):
+        return f"<StageStats {self.calls} calls {self.seconds:.3f}s {self.rows} rows>"
+
+    def as_dict(self) -> dict[str, int | float]:
+        return {x: getattr(self, x) for x in self.__slots__}
+
+
+class Stats:
+    """Collect stage durations, row counts, bytes written and peak buffer sizes
+
+    Pass to NEM12, NEM12Writer or NEM13 to record their stages. The
+    callback is called with (stage name, seconds, stage totals) each time a
+    stage finishes, for sending on to a metrics system.
+    """
+
+    enabled = True
+
+    def __init__(
+        self, callback: Callable[[str, float, StageStats], None] | None = None
+    ) -> None:
+        self.stages: dict[str, StageStats] = {}
+        self.callback = callback
+
+    def __repr__(self):
+        return f"<Stats {', '.join(self.stages)}>"
+
+    def __getitem__(self, name: str) -> StageStats:
+        stage = self.stages.get(name)
+        if stage is None:
+            stage = self.stages[name] = StageStats()
+        return stage
+
+    def finish(self, name: str, seconds: float) -> None:
+        stage = self[name]
+        stage.calls += 1
+        stage.seconds += seconds
+        if self.callback is not None:
+            self.callback(name, seconds, stage)
+
+    @contextmanager
+    def stage(self, name: str) -> Generator[StageStats, None, None]:
+        """Time a stage, yielding its totals to add rows and bytes to"""
+        start = perf_counter()
+        try:
+            yield self[name]
+        finally:
+            self.finish(name, perf_counter() - start)
+
+    def iter_rows(self, name: str, rows: Iterable) -> Generator:
+        """Time making each row of an iterable, counting rows
+        Lines of text also count bytes and the longest line, as NEM files
+        are ASCII.
+        """
+        stage = self[name]
+        seconds = 0.0
+        iterator = iter(rows)
+        try:
+            while True:
+                start = perf_counter()
+                try:
+                    row = next(iterator)
+                except StopIteration:
+                    break
+                finally:
+                    seconds += perf_counter() - start
+                stage.rows += 1
+                if isinstance(row, str):
+                    stage.bytes += len(row)
+                    stage.peak_bytes = max(stage.peak_bytes, len(row))
+                yield row
+        finally:
+            self.finish(name, seconds)
+
+    def as_dict(self) -> dict[str, dict[str, int | float]]:
+        """Get the totals of each stage, ready to export"""
+        return {name: stage.as_dict() for name, stage in self.stages.items()}
+
+    def reset(self) -> None:
+        self.stages.clear()
+
+
+class NullStats(Stats):
+    """Stats that record nothing, used when instrumentation is off"""
+
+    enabled = False
+
+    def __getitem__(self, name: str) -> StageStats:
+        return StageStats()  # Thrown away
+
+    def finish(self, name: str, seconds: float) -> None:
+        pass
+
+    @contextmanager
+    def stage(self, name: str) -> Generator[StageStats, None, None]:
+        yield StageStats()
+
+    def iter_rows(self, name: str, rows: Iterable) -> Iterable:
+        return rows
+
+
+NULL_STATS = NullStats()
+
+
+def timed(name: str) -> Callable:
+    """Time each call of a method as a stage, when its object has stats"""
+
+    def decorator(func: Callable) -> Callable:
+        @wraps(func)
+        def wrapper(self, *args, **kwargs):
+            if not self.stats.enabled:
+                return func(self, *args, **kwargs)
+            with self.stats.stage(name):
+                return func(self, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def timed_rows(name: str) -> Callable:
+    """Time and count the rows of a generator method as a stage"""
+
+    def decorator(func: Callable) -> Callable:
+        @wraps(func)
+        def wrapper(self, *args, **kwargs):
+            return self.stats.iter_rows(name, func(self, *args, **kwargs))
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,96 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from nemwriter import NEM12, NEM13
+
+FILE_TIME = datetime(2024, 5, 6, 7, 8)
+
+
+def interval_readings(
+    day=1, num_days=1, interval=30, estimate_every=None, estimate="E52"
+):
+    """Readings of whole days from 2004-04-day, every estimate_every-th estimated"""
+    start = datetime(2004, 4, day)
+    num_intervals = num_days * 24 * 60 // interval
+    return [
+        [
+            start + timedelta(minutes=interval * (x + 1)),
+            x,
+            "A" if estimate_every is None or x % estimate_every else estimate,
+        ]
+        for x in range(num_intervals)
+    ]
+
+
+def add_nmi_readings(m, num_nmis=3):
+    """Add a day of readings for each NMI, NMI{i} on 2004-04-(1 + i)"""
+    for i in range(num_nmis):
+        m.add_readings(f"NMI{i}", "E1", "E1", "kWh", interval_readings(1 + i))
+
+
+def nmi_builder(num_nmis=3, file_time=FILE_TIME, **kwargs):
+    """NEM12 with a day of readings for each NMI, see add_nmi_readings"""
+    m = NEM12(to_participant="123", file_time=file_time, **kwargs)
+    add_nmi_readings(m, num_nmis)
+    return m
+
+
+def nem13_builder(file_time=FILE_TIME):
+    """NEM13 with a single accumulation read"""
+    m = NEM13(to_participant="123", file_time=file_time)
+    m.add_reading(
+        nmi="123",
+        nmi_configuration="11",
+        register_id="01",
+        nmi_suffix="11",
+        previous_read=0,
+        previous_read_date=datetime(2004, 1, 1),
+        current_read=10,
+        current_read_date=datetime(2004, 4, 1),
+        quantity=10,
+    )
+    return m
+
+
+def interval_frame(periods=3 * 48, start="2004-04-01 00:30", tz=None, estimate=None):
+    """E1 and B1 every 30 minutes, every 11th interval estimated if given"""
+    index = pd.date_range(start, periods=periods, freq="30min", tz=tz, name="t_end")
+    df = pd.DataFrame(
+        {"E1": np.arange(periods) / 4, "B1": np.arange(periods) % 7}, index=index
+    )
+    if estimate is not None:
+        df["Quality"] = np.where(np.arange(periods) % 11 == 0, estimate, "A")
+    return df
+
+
+@pytest.fixture
+def file_time():
+    return FILE_TIME
+
+
+@pytest.fixture
+def make_readings():
+    return interval_readings
+
+
+@pytest.fixture
+def add_readings():
+    return add_nmi_readings
+
+
+@pytest.fixture
+def make_builder():
+    return nmi_builder
+
+
+@pytest.fixture
+def make_nem13():
+    return nem13_builder
+
+
+@pytest.fixture
+def make_frame():
+    return interval_frame
@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from nemwriter import NEM12
+
+pa = pytest.importorskip("pyarrow")
+
+
+@pytest.fixture
+def example_frame(make_frame):
+    def build(tz=None):
+        df = make_frame(tz=tz, estimate="E52")
+        df.loc[df.index[5:9], "E1"] = np.nan
+        descs = np.where(df["Quality"] == "E52", "Estimated", None)
+        df["EventDesc"] = pd.Series(descs, index=df.index, dtype=object)
+        return df
+
+    return build
+
+
+def nem12_lines(add, *args):
+    m = NEM12(to_participant="123")
+    add(m)("123", *args)
+    return list(m.build_lines())[1:]
+
+
+@pytest.mark.parametrize("tz", [None, "Australia/Brisbane"])
+def test_add_arrow(tz, example_frame):
+    """An Arrow table should give the same rows as the dataframe"""
+    df = example_frame(tz=tz)
+    table = pa.Table.from_pandas(df)
+    expected = nem12_lines(lambda m: m.add_dataframe, df)
+    assert nem12_lines(lambda m: m.add_arrow, table) == expected
+    batch = table.to_batches()[0]
+    assert nem12_lines(lambda m: m.add_arrow, batch) == expected
+
+
+def test_add_arrow_time_column(example_frame):
+    """End times can be in any named column, in any unit"""
+    df = example_frame()
+    ends = df.index.to_numpy().astype("datetime64[s]")
+    table = pa.table(
+        {
+            "E1": df["E1"].to_numpy(),
+            "ends": pa.array(ends, pa.timestamp("s")),
+            "Quality": df["Quality"].to_numpy(),
+        }
+    )
+    expected = nem12_lines(lambda m: m.add_dataframe, df[["E1", "Quality"]])
+    assert nem12_lines(lambda m: m.add_arrow, table, {}, "", "ends")[1:] == expected[1:]
+
+
+def test_add_arrow_channel_quality(example_frame):
+    """Quality columns of one channel should match the dataframe"""
+    df = example_frame()
+    df["B1_Quality"] = pd.Categorical(np.where(df["B1"] == 3, "S14", "A"))
+    table = pa.Table.from_pandas(df)
+    expected = nem12_lines(lambda m: m.add_dataframe, df)
+    assert any(",S14," in x for x in expected)
+    assert nem12_lines(lambda m: m.add_arrow, table) == expected
+
+
+def test_add_parquet(tmp_path, example_frame):
+    """A parquet file should give the same rows as the dataframe"""
+    df = example_frame()
+    df.to_parquet(tmp_path / "input.parquet")
+    expected = nem12_lines(lambda m: m.add_dataframe, df)
+    assert nem12_lines(lambda m: m.add_parquet, tmp_path / "input.parquet") == expected
+
+
+def test_add_arrow_errors():
+    """End times must be timestamps without nulls, and values numbers"""
+    m = NEM12(to_participant="123")
+    with pytest.raises(ValueError):
+        m.add_arrow("123", pa.table({"E1": [1.0]}))
+    with pytest.raises(ValueError):
+        m.add_arrow(
+            "123", pa.table({"t": ["2004-04-01"], "E1": [1.0]}), time_column="t"
+        )
+    ends = pa.array([None, 0], pa.timestamp("ns"))
+    with pytest.raises(ValueError):
+        m.add_arrow("123", pa.table({"t": ends, "E1": [1.0, 2.0]}))
+    ends = pa.array([0, 1], pa.timestamp("ns"))
+    with pytest.raises(ValueError):
+        m.add_arrow("123", pa.table({"t": ends, "E1": ["a", "b"]}))
+    dst = pd.date_range(
+        "2021-04-04 01:30", periods=4, freq="30min", tz="Australia/Sydney"
+    )
+    with pytest.raises(ValueError, match="UTC offset"):
+        m.add_arrow("123", pa.table({"t": pa.array(dst), "E1": [1.0] * 4}))
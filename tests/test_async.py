@@ -0,0 +1,52 @@
+import asyncio
+from zipfile import ZipFile
+
+from nemwriter import NEM12
+
+
+async def readings_stream(readings):
+    for reading in readings:
+        await asyncio.sleep(0)
+        yield reading
+
+
+def test_nem12_async(tmp_path, make_readings):
+    """Async output should match the regular output"""
+    readings = make_readings(num_days=3, estimate_every=7, estimate="E")
+    expected = NEM12(to_participant="123")
+    expected.add_readings("123", "E1", "E1", "kWh", readings)
+    expected_file = expected.output_csv(tmp_path / "expected.csv")
+
+    async def build():
+        m = NEM12(to_participant="123")
+        await m.add_readings_async("123", "E1", "E1", "kWh", readings_stream(readings))
+        rows = [row async for row in m.abuild_output()]
+        csv_file = await m.output_csv_async(tmp_path / "async.csv")
+        zip_file = await m.output_zip_async(tmp_path / "async.zip")
+        return rows, csv_file, zip_file
+
+    rows, csv_file, zip_file = asyncio.run(build())
+    assert rows[1:] == list(expected.build_output())[1:]
+    expected_text = expected_file.read_bytes().split(b"\r\n", 1)[1]
+    assert csv_file.read_bytes().split(b"\r\n", 1)[1] == expected_text
+    with ZipFile(zip_file) as zf:
+        text = zf.read("async.csv")
+    assert text.split(b"\r\n", 1)[1] == expected_text
+
+
+def test_nem13_async(tmp_path, make_nem13):
+    """Async output should match the regular output"""
+    m = make_nem13()
+    expected_file = m.output_csv(tmp_path / "expected.csv")
+
+    async def build():
+        rows = [row async for row in m.abuild_output()]
+        csv_file = await m.output_csv_async(tmp_path / "async.csv")
+        zip_file = await m.output_zip_async(tmp_path / "async.zip")
+        return rows, csv_file, zip_file
+
+    rows, csv_file, zip_file = asyncio.run(build())
+    assert rows == list(m.build_output())
+    assert csv_file.read_bytes() == expected_file.read_bytes()
+    with ZipFile(zip_file) as zf:
+        assert zf.read("async.csv") == expected_file.read_bytes()
@@ -0,0 +1,90 @@
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from zipfile import ZIP_STORED, ZipFile
+
+import pytest
+
+from nemwriter import NEM12
+from nemwriter.bundle import write_bundle
+
+
+@pytest.fixture
+def nem12_builder(make_readings, file_time):
+    def build(nmi):
+        m = NEM12(to_participant="123", file_time=file_time)
+        readings = make_readings(num_days=3, estimate_every=9, estimate="F14")
+        m.add_readings(nmi, "E1", "E1", "kWh", readings)
+        return m
+
+    return build
+
+
+@pytest.mark.parametrize("compression", [None, ZIP_STORED])
+def test_bundle(tmp_path, compression, nem12_builder, make_nem13):
+    """Each member should match the csv of its builder"""
+    builders = [nem12_builder(f"NMI{i}") for i in range(5)] + [make_nem13()]
+    kwargs = {} if compression is None else {"compression": compression}
+    bundle = write_bundle(tmp_path / "bundle.zip", builders, max_workers=3, **kwargs)
+    with ZipFile(bundle) as zf:
+        assert zf.testzip() is None
+        entries = zf.infolist()
+        assert [x.filename for x in entries] == [
+            f"{x.nem_filename()}.csv" for x in builders
+        ]
+        for entry, m in zip(entries, builders, strict=True):
+            csv_file = m.output_csv(tmp_path / "member.csv")
+            text = csv_file.read_bytes()
+            assert zf.read(entry) == text
+            assert entry.date_time == (2024, 5, 6, 7, 8, 0)
+            assert entry.create_system == 3
+            assert entry.external_attr >> 16 == 0o644
+    assert sorted(x.name for x in tmp_path.iterdir()) == ["bundle.zip", "member.csv"]
+
+
+def test_bundle_rows(tmp_path):
+    """Rows, csv lines and names can be given directly"""
+    members = {
+        "rows.csv": iter([[100, "NEM12"], [900]]),
+        "lines.csv": ["100,NEM12\r\n", "900\r\n"],
+        "empty.csv": [],
+        "ünïcode.csv": ["900\r\n"],
+    }
+    date_time = datetime(2024, 1, 2, 3, 4, 6)
+    bundle = write_bundle(tmp_path / "rows.zip", members, date_time=date_time)
+    with ZipFile(bundle) as zf:
+        assert zf.namelist() == list(members)
+        assert zf.read("rows.csv") == b"100,NEM12\r\n900\r\n"
+        assert zf.read("lines.csv") == zf.read("rows.csv")
+        assert zf.read("empty.csv") == b""
+        assert zf.getinfo("ünïcode.csv").date_time == (2024, 1, 2, 3, 4, 6)
+
+
+def test_bundle_processes(tmp_path, nem12_builder):
+    builders = [nem12_builder(f"NMI{i}") for i in range(2)]
+    with ProcessPoolExecutor(2) as executor:
+        bundle = write_bundle(tmp_path / "bundle.zip", builders, executor=executor)
+    with ZipFile(bundle) as zf:
+        text = zf.read(zf.infolist()[1])
+    assert builders[1].output_hash == hashlib.sha256(text).hexdigest()
+
+
+def test_bundle_errors(tmp_path, nem12_builder):
+    with pytest.raises(ValueError, match="different names"):
+        write_bundle(tmp_path / "a.zip", [nem12_builder("1"), nem12_builder("1")])
+    with pytest.raises(ValueError, match="No readings"):
+        write_bundle(tmp_path / "a.zip", [NEM12(to_participant="123")])
+    with pytest.raises(ValueError, match="deflated or stored"):
+        write_bundle(tmp_path / "a.zip", {"a.csv": []}, compression=14)
+    assert not (tmp_path / "a.zip").exists()
+
+
+def test_bundle_zip64(tmp_path, monkeypatch):
+    """Sizes and offsets past the limit should use ZIP64 records"""
+    monkeypatch.setattr("nemwriter.bundle.ZIP64_LIMIT", 10)
+    monkeypatch.setattr("nemwriter.bundle.MAX_ENTRIES", 1)
+    members = {"a.csv": ["100,NEM12\r\n", "900\r\n"], "b.csv": ["900\r\n"] * 9}
+    bundle = write_bundle(tmp_path / "bundle.zip", members)
+    with ZipFile(bundle) as zf:
+        assert zf.testzip() is None
+        assert zf.read("b.csv") == b"900\r\n" * 9
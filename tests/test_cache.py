@@ -0,0 +1,84 @@
+import pytest
+
+from nemwriter import NEM12, NEM12Writer
+from nemwriter.cache import (
+    BlockCache,
+    MemoryBlockCache,
+    block_key,
+)
+
+
+@pytest.fixture
+def add_example_readings(make_readings):
+    def add(m, last_value=47):
+        for day in range(1, 4):
+            readings = make_readings(day, estimate_every=7)
+            readings[-1][1] = last_value
+            m.add_readings("NMI1", "E1", "E1", "kWh", readings)
+
+    return add
+
+
+@pytest.fixture
+def example_builder(add_example_readings):
+    def build(block_cache=None, last_value=47):
+        m = NEM12(to_participant="123", block_cache=block_cache)
+        add_example_readings(m, last_value)
+        return m
+
+    return build
+
+
+def day_records(m):
+    return [x for x in m.meters["NMI1"]["E1"].records if hasattr(x, "values")]
+
+
+def test_block_key(example_builder):
+    """Keys should change with anything the text depends on"""
+    first = day_records(example_builder())[0]
+    changed = day_records(example_builder(last_value=1))[0]
+    key = block_key("NMI1", "E1", first)
+    assert key == block_key("NMI1", "E1", day_records(example_builder())[0])
+    assert key != block_key("NMI2", "E1", first)
+    assert key != block_key("NMI1", "E1", first, decimals=3)
+    assert key != block_key("NMI1", "E1", changed)
+
+
+@pytest.mark.parametrize("decimals", [None, 2])
+def test_cached_lines(decimals, example_builder):
+    """Cached blocks should give the same text as formatting"""
+    expected = list(example_builder().build_lines(decimals))
+    cache = MemoryBlockCache()
+    assert list(example_builder(cache).build_lines(decimals)) == expected
+    assert len(cache.blocks) == 3
+    assert list(example_builder(cache).build_lines(decimals)) == expected
+
+    changed = example_builder(cache, last_value=1)
+    assert list(changed.build_lines(decimals)) != expected
+    assert len(cache.blocks) == 6  # The last value of each day changed
+
+
+def test_memory_lru():
+    cache = MemoryBlockCache(max_items=2)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    assert cache.get("a") == "1"
+    cache.set("c", "3")
+    assert cache.get("b") is None
+    assert cache.get_many(["a", "b", "c"]) == {"a": "1", "c": "3"}
+
+
+def test_writer_cache(tmp_path, example_builder, add_example_readings):
+    expected = example_builder().output_csv(tmp_path / "expected.csv")
+    cache = MemoryBlockCache()
+    for name in ("first.csv", "second.csv"):
+        with NEM12Writer(tmp_path / name, "123", block_cache=cache) as w:
+            add_example_readings(w)
+        with open(tmp_path / name) as f, open(expected) as g:
+            assert f.readlines()[1:] == g.readlines()[1:]
+    assert len(cache.blocks) == 3
+
+
+def test_block_cache_is_abstract():
+    with pytest.raises(TypeError):
+        BlockCache()
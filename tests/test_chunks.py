@@ -0,0 +1,49 @@
+from itertools import pairwise
+
+import pytest
+
+from nemwriter import NEM12, NEM12Writer
+from nemwriter.chunks import day_chunks, read_days
+
+
+def expected_lines(df):
+    m = NEM12(to_participant="123")
+    m.add_dataframe("123", df)
+    return "".join(list(m.build_lines())[1:])
+
+
+def written_lines(file_path):
+    with open(file_path, newline="") as f:
+        return "".join(f.readlines()[1:])
+
+
+def test_day_chunks(make_frame):
+    """Chunks should only end on a day boundary"""
+    df = make_frame(estimate="E")
+    chunks = [df.iloc[i : i + 20] for i in range(0, len(df), 20)]
+    days = [read_days(x.index) for x in day_chunks(chunks)]
+    assert sum(len(x) for x in days) == len(df)
+    for first, second in pairwise(days):
+        assert first.max() < second.min()
+
+
+@pytest.mark.parametrize("chunksize", [7, 48, 1000])
+def test_add_csv(chunksize, make_frame):
+    """Readings from a csv in chunks should match the whole dataframe"""
+    df = make_frame(estimate="E")
+    df.to_csv("tests/stream_input.csv")
+    output_file = "tests/stream_chunks.csv"
+    with NEM12Writer(output_file, to_participant="123") as w:
+        w.add_csv("123", "tests/stream_input.csv", chunksize=chunksize)
+    assert written_lines(output_file) == expected_lines(df)
+
+
+def test_add_parquet(tmp_path, make_frame):
+    """Readings from a parquet file in chunks should match the whole dataframe"""
+    pytest.importorskip("pyarrow")
+    df = make_frame(estimate="E")
+    df.to_parquet(tmp_path / "input.parquet")
+    output_file = tmp_path / "chunks.csv"
+    with NEM12Writer(output_file, to_participant="123") as w:
+        w.add_parquet("123", tmp_path / "input.parquet", chunksize=50)
+    assert written_lines(output_file) == expected_lines(df)
@@ -0,0 +1,96 @@
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pytest
+
+from nemwriter import NEM12, NEM13
+from nemwriter.cli import file_nmi, find_files, main
+
+
+def output_rows(file_path):
+    with open(file_path, newline="") as f:
+        return f.read().splitlines()[1:]
+
+
+@pytest.mark.parametrize("workers", ["0", "1"])
+def test_nem12(tmp_path, workers, make_frame):
+    """Files should be grouped by NMI and match adding the dataframes"""
+    frames = {
+        "NMI1_a.csv": make_frame(48, "2004-04-01 00:30"),
+        "NMI1_b.csv": make_frame(48, "2004-04-02 00:30"),
+        "NMI2_a.csv": make_frame(48, "2004-04-01 00:30"),
+    }
+    for name, df in frames.items():
+        df.to_csv(tmp_path / name)
+
+    out_dir = tmp_path / "out"
+    args = [str(tmp_path / "*.csv"), "-t", "123", "-o", str(out_dir), "--csv"]
+    assert main(["nem12", *args, "--uom", "B1=kVArh", "-w", workers]) == 0
+
+    m = NEM12(to_participant="123")
+    uoms = {"E1": "kWh", "B1": "kVArh"}
+    m.add_dataframe(
+        "NMI1", pd.concat([frames["NMI1_a.csv"], frames["NMI1_b.csv"]]), uoms
+    )
+    m.add_dataframe("NMI2", frames["NMI2_a.csv"], uoms)
+    (output_file,) = out_dir.iterdir()
+    assert output_file.name == f"{m.nem_filename()}.csv"
+    assert output_rows(output_file) == output_rows(m.output_csv(tmp_path / "m.csv"))
+
+
+def test_nem12_parts_and_failures(tmp_path, capsys, make_frame):
+    """A bad file should be reported without stopping the others"""
+    for i in range(3):
+        make_frame(48, "2004-04-01 00:30").to_csv(tmp_path / f"NMI{i}.csv")
+    (tmp_path / "NMI9.csv").write_text("not,a\nmeter,file\n")
+    args = ["nem12", str(tmp_path), "-t", "123", "-o", str(tmp_path / "out")]
+    assert main([*args, "--max-nmis", "2", "-w", "0"]) == 1
+    assert len(list((tmp_path / "out").glob("*.zip"))) == 2
+    captured = capsys.readouterr()
+    assert "Failed" in captured.err and "NMI9.csv" in captured.err
+    assert "Converted 3 of 4 files" in captured.err
+
+
+def test_nem13(tmp_path):
+    """Accumulation files are written as they were read"""
+    start = datetime(2024, 1, 1)
+    reads = [
+        {
+            "nmi": f"NMI{i}",
+            "nmi_configuration": "11",
+            "register_id": "01",
+            "nmi_suffix": "11",
+            "previous_read": 1000,
+            "previous_read_date": start,
+            "current_read": 1100.5,
+            "current_read_date": start + timedelta(days=91),
+            "quantity": 100.5,
+        }
+        for i in range(2)
+    ]
+    pd.DataFrame(reads).to_csv(tmp_path / "reads.csv", index=False)
+    out_dir = tmp_path / "out"
+    args = [str(tmp_path / "reads.csv"), "-t", "123", "-o", str(out_dir), "--csv"]
+    assert main(["nem13", *args, "-w", "0"]) == 0
+
+    m = NEM13(to_participant="123")
+    for read in reads:
+        m.add_reading(**read)
+    (output_file,) = out_dir.iterdir()
+    assert output_rows(output_file) == output_rows(m.output_csv(tmp_path / "m.csv"))
+
+
+def test_find_files(tmp_path):
+    for name in ("a.csv", "b.parquet", "c.txt"):
+        (tmp_path / name).touch()
+    assert [x.name for x in find_files([str(tmp_path)])] == ["a.csv", "b.parquet"]
+    assert file_nmi(tmp_path / "NMI1_2024.csv", r"[^_]+") == "NMI1"
+    assert file_nmi(tmp_path / "x-NMI1.csv", r"x-(\w+)") == "NMI1"
+    with pytest.raises(ValueError):
+        file_nmi(tmp_path / "a.csv", r"\d+")
+
+
+def test_no_files(tmp_path):
+    assert main(["nem12", str(tmp_path), "-t", "123"]) == 1
+    with pytest.raises(SystemExit):
+        main(["nem12", str(tmp_path), "-t", "123", "--uom", "kWh"])
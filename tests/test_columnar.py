@@ -0,0 +1,141 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from nemwriter import NEM12
+from nemwriter.columnar import label_columns
+from nemwriter.nem12_writer import convert_to_channels
+
+
+def legacy_rows(nmi, df):
+    """Build rows one reading at a time"""
+    m = NEM12(to_participant="123")
+    channels = convert_to_channels(df)
+    for nmi_suffix in channels:
+        m.add_readings(
+            nmi=nmi,
+            nmi_configuration="".join(channels.keys()),
+            nmi_suffix=nmi_suffix,
+            uom="kWh",
+            readings=channels[nmi_suffix],
+        )
+    return list(m.build_output())[1:], m.days
+
+
+def vectorised_rows(nmi, df):
+    """Build rows from the dataframe columns"""
+    m = NEM12(to_participant="123")
+    m.add_dataframe(nmi=nmi, df=df, uoms={"E1": "kWh", "E2": "kWh", "V1": "kWh"})
+    return list(m.build_output())[1:], m.days
+
+
+def interval_frame(interval, days=2, start=datetime(2004, 4, 1)):
+    num_intervals = int(60 / interval) * 24 * days
+    index = [
+        start + timedelta(minutes=interval * x) for x in range(1, num_intervals + 1)
+    ]
+    rng = np.random.default_rng(interval)
+    return pd.DataFrame(
+        {
+            "E1": rng.integers(0, 10, num_intervals) / 4,
+            "E2": rng.integers(0, 5, num_intervals),
+        },
+        index=index,
+    )
+
+
+def mixed_interval_frame():
+    df = interval_frame(30)
+    v1 = interval_frame(10)["E1"].rename("V1")
+    return pd.concat([df, v1], axis=1, sort=True)
+
+
+def quality_frame():
+    df = interval_frame(15, days=3)
+    quality = ["A"] * len(df)
+    desc = [None] * len(df)
+    for i in range(10, 14):
+        quality[i] = "F14"
+        desc[i] = "Comms fault"
+    quality[200] = "S14"
+    df["Quality"] = quality
+    df["EventDesc"] = desc
+    return df
+
+
+def channel_quality_frame():
+    """E1 has its own quality and events, E2 uses the shared Quality column"""
+    df = interval_frame(30, days=3)
+    df["Quality"] = pd.Categorical(["A"] * len(df))
+    quality = np.where(np.arange(len(df)) % 13 == 0, "E52", "A")
+    df["E1_Quality"] = pd.Categorical(quality)
+    df["E1_EventCode"] = np.where(quality == "E52", 79, None)
+    df["E1_EventDesc"] = pd.Series(
+        np.where(quality == "E52", "Est", None), dtype=object
+    ).values
+    return df
+
+
+def gaps_frame():
+    df = interval_frame(5)
+    df.iloc[3:40, 0] = np.nan
+    return df.drop(df.index[[0, 1, 100, -1]])
+
+
+def timezone_frame():
+    df = interval_frame(30)
+    df.index = pd.DatetimeIndex(df.index).tz_localize("Australia/Brisbane")
+    return df
+
+
+def daylight_saving_frame(start):
+    """Reads at even UTC gaps over a change of the Sydney UTC offset"""
+    df = interval_frame(30, days=3)
+    df.index = pd.date_range(
+        start, periods=len(df), freq="30min", tz="Australia/Sydney"
+    )
+    return df
+
+
+FRAMES = [
+    interval_frame(5),
+    interval_frame(30, days=5),
+    mixed_interval_frame(),
+    quality_frame(),
+    channel_quality_frame(),
+    gaps_frame(),
+    timezone_frame(),
+    daylight_saving_frame("2021-04-03 00:30"),
+    daylight_saving_frame("2021-10-02 00:30"),
+]
+
+
+@pytest.mark.parametrize("df", FRAMES)
+def test_vectorised_matches_readings(df):
+    """Dataframe rows should be identical to adding one reading at a time"""
+    assert vectorised_rows("A123", df) == legacy_rows("A123", df)
+
+
+def test_vectorised_all_missing():
+    """A channel with no readings should still be registered"""
+    df = interval_frame(30)
+    df["E2"] = np.nan
+    assert vectorised_rows("A123", df) == legacy_rows("A123", df)
+
+
+def test_channel_quality():
+    rows, _ = vectorised_rows("A123", channel_quality_frame())
+    e1_events = rows[2]
+    assert e1_events[:6] == ["400", 1, 1, "E52", 79, "Est"]
+    e2_start = next(i for i, x in enumerate(rows) if x[:5] == [200, *x[1:4], "E2"])
+    assert [x[0] for x in rows[e2_start + 1 :]] == [300, 300, 300, 900]
+
+
+def test_label_columns():
+    channels, labels = label_columns(["E1", "B1", "Quality", "B1_EventDesc"])
+    assert channels == ["E1", "B1"]
+    assert labels == {"Quality": "Quality", "B1_EventDesc": "EventDesc"}
+    with pytest.raises(ValueError, match="E2_Quality"):
+        label_columns(["E1", "E2_Quality"])
@@ -0,0 +1,55 @@
+import asyncio
+import hashlib
+from datetime import datetime
+from zipfile import ZipFile
+
+from nemwriter import NEM12Writer
+
+
+def sha256(file_path):
+    return hashlib.sha256(file_path.read_bytes()).hexdigest()
+
+
+def test_same_bytes(tmp_path, make_builder):
+    """The same readings and file time should give identical files"""
+    (tmp_path / "a").mkdir()
+    (tmp_path / "b").mkdir()
+    first = make_builder().output_zip(tmp_path / "a" / "output.zip")
+    second = make_builder().output_zip(tmp_path / "b" / "output.zip")
+    assert first.read_bytes() == second.read_bytes()
+    with ZipFile(first) as zf:
+        (entry,) = zf.infolist()
+    assert entry.date_time == (2024, 5, 6, 7, 8, 0)
+    assert entry.create_system == 3
+
+
+def test_output_hash(tmp_path, make_builder, add_readings, file_time):
+    """The hash should be of the csv text, whether zipped or not"""
+    m = make_builder()
+    csv_file = m.output_csv(tmp_path / "output.csv")
+    assert m.header[2] == "202405060708"
+    assert m.output_hash == sha256(csv_file)
+    m.output_zip(tmp_path / "output.zip")
+    assert m.output_hash == sha256(csv_file)
+    asyncio.run(m.output_zip_async(tmp_path / "async.zip"))
+    assert m.output_hash == sha256(csv_file)
+
+    with NEM12Writer(tmp_path / "stream.zip", "123", file_time=file_time) as w:
+        add_readings(w)
+    assert w.output_hash == sha256(csv_file)
+
+
+def test_nmi_hash(make_builder):
+    """NMI hashes do not depend on the file time"""
+    m = make_builder()
+    later = make_builder(file_time=datetime(2025, 1, 1))
+    assert m.nmi_hash("NMI1") == later.nmi_hash("NMI1")
+    assert m.nmi_hash("NMI1") != m.nmi_hash("NMI2")
+
+
+def test_nem13_output_hash(tmp_path, make_nem13):
+    m = make_nem13()
+    csv_file = m.output_csv(tmp_path / "output.csv")
+    assert m.output_hash == sha256(csv_file)
+    first = m.output_zip(tmp_path / "output.zip").read_bytes()
+    assert m.output_zip(tmp_path / "output.zip").read_bytes() == first
@@ -0,0 +1,52 @@
+from datetime import datetime, timedelta
+from io import StringIO
+
+import pytest
+
+from nemwriter import NEM12
+from nemwriter.output import write_rows
+
+VALUES = [
+    [1, 2, 3],
+    [0.1, 0.25, 10.0],
+    [-0.0, -1.5, 2e-05],
+    [1e16, 0.5, 3],
+    [123456.789, 0.001, 1],
+]
+
+
+def nem12_builder(values, event_desc="Power Outage, Alarm"):
+    m = NEM12(to_participant="123")
+    readings = [
+        [datetime(2004, 4, 18, 0, 0) + timedelta(minutes=30 * (i + 1)), 0.5, "A"]
+        for i in range(24 * 2)
+    ]
+    for i, value in enumerate(values):
+        readings[i][1] = value
+    readings[-1] += [79, event_desc]
+    m.add_readings(
+        nmi="123",
+        nmi_configuration="E1",
+        nmi_suffix="E1",
+        uom="kWh",
+        readings=readings,
+        update_datetime=datetime(2004, 4, 20, 9, 1, 3),
+    )
+    return m
+
+
+@pytest.mark.parametrize("values", VALUES)
+def test_lines_match_csv_writer(values):
+    """Formatted lines should match writing the rows with csv.writer"""
+    m = nem12_builder(values, event_desc='Said "hello", twice')
+    with StringIO(newline="") as stream:
+        write_rows(m.build_output(), stream)
+        expected = stream.getvalue()
+    assert "".join(m.build_lines()) == expected
+
+
+def test_fixed_decimals():
+    """Values can be written with a fixed number of decimal places"""
+    m = nem12_builder([1, 0.1234, 2.5])
+    day_row = list(m.build_lines(decimals=3))[2]
+    assert day_row.startswith("300,20040418,1.000,0.123,2.500,0.500,")
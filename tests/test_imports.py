@@ -0,0 +1,29 @@
+import subprocess
+import sys
+
+
+def loaded_modules(code: str) -> set[str]:
+    check = f"import sys; {code}; print(*sys.modules)"
+    result = subprocess.run(
+        [sys.executable, "-c", check], check=True, capture_output=True, text=True
+    )
+    return set(result.stdout.split())
+
+
+def test_import_is_light():
+    """Importing nemwriter should not load numpy, pandas or asyncio"""
+    modules = loaded_modules("import nemwriter")
+    assert not modules & {"numpy", "pandas", "pyarrow", "asyncio"}
+
+
+def test_readings_without_pandas():
+    """Plain readings and NEM13 output should not need numpy or pandas"""
+    code = (
+        "from datetime import datetime; from nemwriter import NEM12, NEM13; "
+        "m = NEM12('123'); "
+        "reads = [(datetime(2004, 4, 1, 0, 30), 1, 'A')]; "
+        "m.add_readings('123', 'E1', 'E1', 'kWh', reads); "
+        "list(m.build_lines()); NEM13('123')"
+    )
+    modules = loaded_modules(code)
+    assert not modules & {"numpy", "pandas"}
@@ -0,0 +1,29 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from nemwriter.intervals import detect_interval_length, interval_geometry
+
+
+@pytest.mark.parametrize("interval_length", [1, 5, 7, 10, 15, 30, 45, 60])
+def test_interval_geometry(interval_length):
+    """Lookups should match working out each slot with float division"""
+    geometry = interval_geometry(interval_length)
+    num_intervals = 60 * 24 / interval_length
+    assert geometry.num_intervals == int(num_intervals)
+    for minute in range(60 * 24):
+        expected = int((minute / (60 * 24)) * num_intervals)
+        assert geometry.slot_of_minute[minute] == expected
+    assert geometry.slot_starts[1] == interval_length
+    assert interval_geometry(interval_length) is geometry
+
+
+def test_detect_interval_length():
+    """Interval length is the smallest gap in whole minutes"""
+    start = datetime(2004, 4, 1)
+    ends = [start + timedelta(minutes=x) for x in [30, 60, 75, 105]]
+    assert detect_interval_length(ends) == 15
+    assert detect_interval_length(ends[:1]) is None
+    ends = [start + timedelta(minutes=x, seconds=50) for x in [0, 5]]
+    ends[1] -= timedelta(seconds=40)
+    assert detect_interval_length(ends) == 4
@@ -0,0 +1,118 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from nemwriter import NEM12
+
+
+def wide_frame(nmi_number, periods=2 * 48):
+    index = pd.date_range("2004-04-01 00:30", periods=periods, freq="30min")
+    df = pd.DataFrame(
+        {
+            "E1": np.arange(periods) / (4 + nmi_number),
+            "B1": np.arange(periods) % (7 + nmi_number),
+        },
+        index=index,
+    )
+    estimated = np.arange(periods) % (11 + nmi_number) == 0
+    df["Quality"] = np.where(estimated, "E52", "A")
+    descs = np.where(estimated, "Estimated", None)
+    df["EventDesc"] = pd.Series(descs, index=index, dtype=object)
+    return df
+
+
+def long_frame(frames):
+    """Stack wide frames into one row per NMI, channel and reading"""
+    parts = []
+    for nmi, df in frames.items():
+        for suffix in ("E1", "B1"):
+            parts.append(
+                pd.DataFrame(
+                    {
+                        "nmi": nmi,
+                        "nmi_suffix": suffix,
+                        "end_time": df.index,
+                        "value": df[suffix].to_numpy(),
+                        "quality": df["Quality"].to_numpy(),
+                        "event_desc": df["EventDesc"].to_numpy(),
+                    }
+                )
+            )
+    return pd.concat(parts, ignore_index=True)
+
+
+def test_long_dataframe():
+    """Grouping a long table should give the same rows as each wide frame"""
+    frames = {f"NMI{i}": wide_frame(i) for i in range(3)}
+    expected = NEM12(to_participant="123")
+    for nmi, df in frames.items():
+        expected.add_dataframe(nmi, df)
+
+    long = long_frame(frames)
+    interleaved = long.sort_values("end_time", kind="stable")
+    shuffled = long.groupby(["nmi", "nmi_suffix"], sort=False).sample(
+        frac=1, random_state=1
+    )
+    for rows in (long, interleaved, shuffled):
+        m = NEM12(to_participant="123")
+        m.add_long_dataframe(rows, nmi_configuration="E1B1")
+        assert list(m.meters) == list(frames)
+        assert list(m.build_lines())[1:] == list(expected.build_lines())[1:]
+
+
+def test_long_row_order():
+    """The same rows in any order should give the same bytes"""
+    long = long_frame({f"NMI{i}": wide_frame(i) for i in range(2)})
+    outputs = []
+    for rows in (long, long[::-1]):
+        m = NEM12(to_participant="123", file_time=datetime(2024, 5, 6))
+        m.add_long_dataframe(rows)
+        outputs.append(list(m.build_lines()))
+    assert outputs[0] == outputs[1]
+    assert outputs[0][1].startswith("200,NMI0,B1E1,,B1,")
+
+
+def test_long_mapping():
+    m = NEM12(to_participant="123")
+    m.add_long_dataframe(
+        {
+            "nmi": ["123", "123", "456"],
+            "nmi_suffix": ["E1", "E1", "E1"],
+            "end_time": pd.to_datetime(
+                ["2004-04-01 12:00", "2004-04-02 00:00", "2004-04-01 12:00"]
+            ),
+            "value": [1.5, 2.0, 3.0],
+        },
+        uoms={"E1": "kWh"},
+    )
+    lines = list(m.build_lines())
+    assert lines[1].startswith("200,123,E1,,E1,,,kWh,720,")
+    assert lines[2].startswith("300,20040401,")
+
+
+def test_long_errors():
+    m = NEM12(to_participant="123")
+    with pytest.raises(ValueError, match="nmi_suffix"):
+        m.add_long_dataframe({"nmi": ["123"], "end_time": [1], "value": [1]})
+    rows = {"nmi": ["1"], "nmi_suffix": ["E1"], "end_time": ["x"], "value": [1]}
+    with pytest.raises(ValueError, match="datetimes"):
+        m.add_long_dataframe(rows)
+    rows["end_time"] = pd.to_datetime(["2004-04-01 12:00"])
+    rows["value"] = ["x"]
+    with pytest.raises(ValueError, match="numbers"):
+        m.add_long_dataframe(rows)
+
+
+def test_long_daylight_saving():
+    """Reads over a change of UTC offset should match the wide frame"""
+    df = wide_frame(0, periods=3 * 48)
+    df.index = pd.date_range(
+        "2021-04-03 00:30", periods=len(df), freq="30min", tz="Australia/Sydney"
+    )
+    expected = NEM12(to_participant="123")
+    expected.add_dataframe("NMI0", df)
+    m = NEM12(to_participant="123")
+    m.add_long_dataframe(long_frame({"NMI0": df}), nmi_configuration="E1B1")
+    assert list(m.build_lines())[1:] == list(expected.build_lines())[1:]
@@ -0,0 +1,165 @@
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pytest
+
+from nemwriter import NEM12
+
+
+def readings(day, interval=30, quality="A"):
+    start = datetime(2004, 4, day)
+    return [
+        [start + timedelta(minutes=interval * (i + 1)), i / 10, quality]
+        for i in range(24 * 60 // interval)
+    ]
+
+
+def add(m, reads, nmi_suffix="E1"):
+    m.add_readings(
+        nmi="123",
+        nmi_configuration="E1",
+        nmi_suffix=nmi_suffix,
+        uom="kWh",
+        readings=reads,
+    )
+
+
+def test_merge_chunks():
+    """Readings added in chunks should match adding them all at once"""
+    reads = readings(1) + readings(2)
+    expected = NEM12(to_participant="123")
+    add(expected, reads)
+
+    m = NEM12(to_participant="123")
+    for chunk in [reads[:30], reads[30:70], reads[70:]]:
+        add(m, chunk)
+    assert list(m.build_output()) == list(expected.build_output())
+    assert m.days == ["20040401", "20040402"]
+
+
+@pytest.mark.parametrize(
+    "order, intervals",
+    [
+        ([2, 3, 1], [30, 30, 30]),
+        ([1, 3, 2], [30, 30, 15]),
+        ([1, 2, 4, 3], [30, 30, 15, 30]),
+        ([2, 3, 1], [15, 30, 30]),
+        ([3, 1, 2], [30, 15, 30]),
+    ],
+)
+def test_merge_backfilled_days(order, intervals):
+    """Days added out of order are written in date order"""
+    lengths = dict(zip(order, intervals, strict=True))
+    expected = NEM12(to_participant="123")
+    for day in sorted(order):
+        add(expected, readings(day, lengths[day]))
+    m = NEM12(to_participant="123")
+    for day in order:
+        add(m, readings(day, lengths[day]))
+    assert list(m.build_output())[1:] == list(expected.build_output())[1:]
+    assert m.meters["123"]["E1"].select("20040402") == expected.meters["123"][
+        "E1"
+    ].select("20040402")
+    last = max(order)
+    assert m.nem_filename() == f"NEM12#123_20040401_2004040{last}#None#123"
+
+
+def test_merge_late_reading():
+    """A late reading should only change its own day"""
+    m = NEM12(to_participant="123")
+    add(m, readings(1) + readings(2))
+    channel_rows = m.meters["123"]["E1"]
+    _, first_day = channel_rows.day("20040401")
+
+    late = [datetime(2004, 4, 2, 1, 0), 9.5, "E", 79, "Late"]
+    add(m, [late])
+    assert channel_rows.day("20040401")[1] is first_day
+    rows = list(channel_rows)
+    assert len(rows) == 1 + 1 + 4  # Header, first day, second day and events
+    assert rows[2][2 + 1] == 9.5
+    assert rows[3] == ["400", 1, 1, "A", None, None]
+    assert rows[4] == ["400", 2, 2, "E", 79, "Late"]
+
+
+def test_merge_keeps_data_over_null():
+    """Null intervals filled for missing readings don't replace data"""
+    m = NEM12(to_participant="123")
+    add(m, readings(1))
+    add(m, readings(1)[:4])
+    expected = NEM12(to_participant="123")
+    add(expected, readings(1))
+    assert list(m.build_output()) == list(expected.build_output())
+
+
+def test_merge_interval_change():
+    """A day can not be merged with a different interval length"""
+    m = NEM12(to_participant="123")
+    add(m, readings(1, interval=30))
+    with pytest.raises(ValueError):
+        add(m, readings(1, interval=15))
+
+
+def test_merge_late_readings_length():
+    """Late readings must have the intervals of the day, or be a single read"""
+    m = NEM12(to_participant="123")
+    add(m, readings(1))
+    add(m, [[datetime(2004, 4, 1, 1, 0), 9.5, "E"]])
+    add(m, [[datetime(2004, 4, 1, 3, 0), 8.5, "E"]])
+    rows = list(m.meters["123"]["E1"])
+    assert len(rows[1]) == 2 + 48 + 5
+    assert rows[1][2 + 1] == 9.5
+    assert rows[1][2 + 5] == 8.5
+    coarser = [
+        [datetime(2004, 4, 1, 1, 0), 1, "E"],
+        [datetime(2004, 4, 1, 2, 0), 2, "E"],
+    ]
+    with pytest.raises(ValueError):
+        add(m, coarser)
+
+
+def test_merge_dataframe_late_reading():
+    """A single late reading in a dataframe uses the intervals of the day"""
+    index = pd.date_range("2004-04-01 00:30", periods=48, freq="30min")
+    m = NEM12(to_participant="123")
+    m.add_dataframe("123", pd.DataFrame({"E1": range(48)}, index=index))
+    late = pd.DataFrame({"E1": [9.5]}, index=[datetime(2004, 4, 1, 1, 0)])
+    m.add_dataframe("123", late)
+    later = pd.DataFrame({"E1": [1.5, 2.5]}, index=index[5:7])
+    m.add_dataframe("123", later)
+    rows = list(m.meters["123"]["E1"])
+    assert rows[0][8] == 30
+    assert rows[1][2:10] == [0, 9.5, 2, 3, 4, 1.5, 2.5, 7]
+    for freq in ("15min", "60min"):
+        index = pd.date_range("2004-04-01 01:00", periods=2, freq=freq)
+        with pytest.raises(ValueError):
+            m.add_dataframe("123", pd.DataFrame({"E1": [1, 2]}, index=index))
+
+
+def test_merge_dataframe():
+    """Dataframes for the same NMI are merged"""
+    index = pd.date_range("2004-04-01 00:30", periods=96, freq="30min")
+    df = pd.DataFrame({"E1": range(96)}, index=index)
+    expected = NEM12(to_participant="123")
+    expected.add_dataframe("123", df)
+
+    m = NEM12(to_participant="123")
+    m.add_dataframe("123", df.iloc[:50])
+    m.add_dataframe("123", df.iloc[50:])
+    assert list(m.build_output()) == list(expected.build_output())
+
+
+def test_cache_lines():
+    """Only changed days are formatted again"""
+    m = NEM12(to_participant="123", cache_lines=True)
+    add(m, readings(1) + readings(2))
+    first = list(m.build_lines())
+    channel_rows = m.meters["123"]["E1"]
+    _, first_day = channel_rows.day("20040401")
+    assert first_day.text is not None
+
+    add(m, [[datetime(2004, 4, 2, 1, 0), 9.5, "A"]])
+    assert channel_rows.day("20040401")[1].text is first_day.text
+    assert channel_rows.day("20040402")[1].text is None
+    second = list(m.build_lines())
+    assert second[:3] == first[:3]
+    assert second[3] != first[3]
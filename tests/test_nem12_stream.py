@@ -0,0 +1,69 @@
+import csv
+from datetime import datetime, timedelta
+
+import nemreader as nr
+import pytest
+
+from nemwriter import NEM12, NEM12Writer
+
+
+def day_readings(day, interval=30):
+    num_intervals = int(60 / interval) * 24
+    start = datetime(2004, 4, day)
+    return [
+        [start + timedelta(minutes=interval * (i + 1)), i, "A"]
+        for i in range(num_intervals)
+    ]
+
+
+def add_channels(m, nmi):
+    for nmi_suffix in ["E1", "B1"]:
+        m.add_readings(
+            nmi=nmi,
+            nmi_configuration="E1B1",
+            nmi_suffix=nmi_suffix,
+            uom="kWh",
+            readings=day_readings(1) + day_readings(2),
+        )
+
+
+def test_stream_matches_builder():
+    """Streamed rows should match building the whole file in memory"""
+    m = NEM12(to_participant="123")
+    for nmi in ["A123", "B123"]:
+        add_channels(m, nmi)
+    expected = m.output_csv("tests/stream_expected.csv")
+
+    output_file = "tests/stream_output.csv"
+    with NEM12Writer(output_file, to_participant="123") as w:
+        for nmi in ["A123", "B123"]:
+            add_channels(w, nmi)
+
+    with open(expected, newline="") as f1, open(output_file, newline="") as f2:
+        assert list(csv.reader(f1))[1:] == list(csv.reader(f2))[1:]
+
+
+def test_stream_zip_chunks():
+    """Readings added in chunks should not repeat the 200 row"""
+    output_file = "tests/stream_output.zip"
+    with NEM12Writer(output_file, to_participant="123") as w:
+        for day in [1, 2, 3]:
+            w.add_readings(
+                nmi="A123",
+                nmi_configuration="E1",
+                nmi_suffix="E1",
+                uom="kWh",
+                readings=day_readings(day),
+            )
+
+    readback = nr.read_nem_file(output_file)
+    assert len(readback.readings["A123"]["E1"]) == 3 * 48
+    assert len(readback.transactions["A123"]) == 1
+
+
+def test_stream_nmi_order():
+    """NMIs must be added in the order they are output"""
+    with NEM12Writer("tests/stream_output.csv", to_participant="123") as w:
+        add_channels(w, "B123")
+        with pytest.raises(ValueError):
+            add_channels(w, "A123")
@@ -0,0 +1,106 @@
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from nemwriter import NEM13
+
+START = datetime(2024, 1, 1, 0, 0, 10)
+
+
+def example_reads(num_nmis=3, num_reads=4):
+    reads = []
+    for i in range(num_nmis):
+        for j in range(num_reads):
+            estimated = (i + j) % 3 == 0
+            reads.append(
+                {
+                    "nmi": f"NMI{i}",
+                    "nmi_configuration": "11",
+                    "register_id": "01",
+                    "nmi_suffix": "11" if j % 2 else "12",
+                    "previous_read": 1000 + j * 100,
+                    "previous_read_date": START + timedelta(days=91 * j),
+                    "current_read": 1100.5 + j * 100,
+                    "current_read_date": START + timedelta(days=91 * (j + 1)),
+                    "quantity": 100.5,
+                    "current_quality_method": "E52" if estimated else "A",
+                    "current_reason_code": 79 if estimated else None,
+                }
+            )
+    return reads
+
+
+def expected_meters(reads):
+    m = NEM13(to_participant="123")
+    for read in reads:
+        m.add_reading(**read)
+    return m.meters
+
+
+def test_add_dataframe():
+    """Bulk reads should match adding each reading"""
+    reads = example_reads()
+    m = NEM13(to_participant="123")
+    m.add_dataframe(pd.DataFrame(reads))
+    assert m.meters == expected_meters(reads)
+
+
+def test_add_records():
+    """Bulk reads from columns of lists and arrays"""
+    reads = example_reads()
+    columns = {x: [read[x] for read in reads] for x in reads[0]}
+    columns["previous_read"] = np.array(columns["previous_read"])
+    m = NEM13(to_participant="123")
+    m.add_records(columns)
+    assert m.meters == expected_meters(reads)
+
+
+def test_add_records_timezone():
+    """Read dates are written as local time"""
+    reads = example_reads(num_nmis=1, num_reads=1)
+    tz = ZoneInfo("Australia/Brisbane")
+    columns = {x: [read[x] for read in reads] for x in reads[0]}
+    columns["previous_read_date"] = [
+        x.replace(tzinfo=tz) for x in columns["previous_read_date"]
+    ]
+    m = NEM13(to_participant="123")
+    m.add_records(columns)
+    assert m.meters["NMI0"]["12"][0][9] == "20240101000010"
+
+
+def test_add_records_missing():
+    """Required columns and read dates must be given"""
+    reads = example_reads()
+    m = NEM13(to_participant="123")
+    with pytest.raises(ValueError):
+        m.add_records({"nmi": ["NMI0"]})
+    df = pd.DataFrame(reads)
+    df.loc[0, "current_read_date"] = None
+    with pytest.raises(ValueError):
+        m.add_dataframe(df)
+
+
+def test_add_records_value_types():
+    """Values keep their own type, whatever the other rows hold"""
+    reads = example_reads(num_nmis=1, num_reads=3)
+    for read, quantity in zip(reads, [100, 100.0, None], strict=True):
+        read["quantity"] = quantity
+    columns = {x: [read[x] for read in reads] for x in reads[0]}
+    columns["current_read"] = np.array([1100.0, np.nan, 1300.0])
+    for read, value in zip(reads, [1100.0, None, 1300.0], strict=True):
+        read["current_read"] = value
+    m = NEM13(to_participant="123")
+    m.add_records(columns)
+
+    def typed(meters):
+        return [
+            [(type(x), x) for x in row]
+            for channels in meters.values()
+            for rows in channels.values()
+            for row in rows
+        ]
+
+    assert typed(m.meters) == typed(expected_meters(reads))
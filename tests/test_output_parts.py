@@ -0,0 +1,48 @@
+import csv
+from zipfile import ZipFile
+
+import pytest
+
+
+def part_rows(file_path):
+    with ZipFile(file_path) as zf:
+        name = zf.namelist()[0]
+        with zf.open(name) as f:
+            return list(csv.reader(line.decode() for line in f))
+
+
+def test_output_parts_by_nmis(tmp_path, make_builder):
+    """Each part should have its own header and trailer"""
+    m = make_builder(num_nmis=5, from_participant="456")
+    paths = m.output_parts(tmp_path, max_nmis=2, max_workers=2)
+    assert len(paths) == 3
+    assert paths[0].name == "NEM12#20040401_20040402_1#456#123.zip"
+    assert paths[2].name == "NEM12#NMI4_20040405_20040405_3#456#123.zip"
+
+    all_rows = []
+    for file_path in paths:
+        rows = part_rows(file_path)
+        assert rows[0][:2] == ["100", "NEM12"]
+        assert rows[-1] == ["900"]
+        all_rows.extend(rows[1:-1])
+    expected = [
+        [str(x) if x is not None else "" for x in row] for row in m.build_output()
+    ]
+    assert all_rows == expected[1:-1]
+
+
+def test_output_parts_by_size(tmp_path, make_builder):
+    """Parts are cut between NMIs to stay under the size"""
+    m = make_builder(num_nmis=5, from_participant="456")
+    nmi_size = sum(map(len, m.nmi_lines("NMI0")))
+    paths = m.output_parts(tmp_path, max_bytes=3 * nmi_size, zipped=False)
+    assert len(paths) == 3
+    for file_path in paths:
+        assert file_path.stat().st_size <= 3 * nmi_size
+
+    # An NMI larger than the size is a part of its own
+    assert len(list(m.split_parts(max_bytes=10))) == 5
+    with pytest.raises(ValueError):
+        m.output_parts(tmp_path)
+    with pytest.raises(ValueError, match="max_workers"):
+        m.output_parts(tmp_path, max_nmis=2, max_workers=0)
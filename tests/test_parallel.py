@@ -0,0 +1,41 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from nemwriter import NEM12
+
+
+def nmi_frames(num_nmis=6):
+    index = [datetime(2004, 4, 1) + timedelta(minutes=30 * x) for x in range(1, 97)]
+    rng = np.random.default_rng(1)
+    return {
+        f"NMI{i:03d}": pd.DataFrame(
+            {"E1": rng.integers(0, 10, 96) / 4, "B1": rng.integers(0, 5, 96)},
+            index=index,
+        )
+        for i in reversed(range(num_nmis))
+    }
+
+
+def sequential_rows(frames):
+    m = NEM12(to_participant="123")
+    for nmi, df in frames.items():
+        m.add_dataframe(nmi, df)
+    return list(m.build_output())[1:], m.days
+
+
+@pytest.mark.parametrize("use_threads", [True, False])
+def test_parallel_matches_sequential(use_threads):
+    """Building NMIs in a pool should give the same rows"""
+    frames = nmi_frames()
+    m = NEM12(to_participant="123")
+    if use_threads:
+        with ThreadPoolExecutor(2) as executor:
+            m.add_dataframes(frames, executor=executor)
+    else:
+        m.add_dataframes(frames.items(), max_workers=2, chunksize=2)
+    assert list(m.meters) == sorted(frames)
+    assert (list(m.build_output())[1:], m.days) == sequential_rows(frames)
@@ -0,0 +1,120 @@
+import pickle
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import pytest
+
+from nemwriter import NEM12
+from nemwriter.records import DayRecord, compact_values, dense_day, quality_events
+
+VALUES = [
+    [0, 1, 2, 3],
+    [0.123, 1.5, 0, 2.25],
+    [-1.0, 0.1, 0.2, 0.3],
+    [1e-9, 0.5, 3.0, 1],
+    [2**40, 0, 5, 1],
+    [2**60, 0, 1.5, 1],
+    [123456.789, 0.001, 1, 2],
+    [Decimal("1.10"), 2, 3, 4],
+    [0.0, 0, 1.5, 2],
+]
+
+
+@pytest.mark.parametrize("values", VALUES)
+def test_compact_values(values):
+    """Stored values should give the same row text"""
+    expected = [int(x) if x == int(x) else x for x in values]
+    stored, scale = compact_values(values)
+    record = DayRecord(
+        "20040101", stored, scale, quality_events([(0, "A", None, None)], 4)
+    )
+    row_values = record.row_values()
+    assert [str(x) for x in row_values] == [str(x) for x in expected]
+
+
+def test_channel_rows():
+    """Channel rows should behave like the list of rows"""
+    m = NEM12(to_participant="123")
+    readings = [
+        [datetime(2004, 4, 18, 0, 0) + timedelta(minutes=30 * (i + 1)), i / 10, "A"]
+        for i in range(24 * 2)
+    ]
+    readings[3][2] = "E"
+    m.add_readings(
+        nmi="123",
+        nmi_configuration="E1",
+        nmi_suffix="E1",
+        uom="kWh",
+        readings=readings,
+    )
+    channel_rows = m.meters["123"]["E1"]
+    rows = list(channel_rows)
+    assert len(channel_rows) == len(rows) == 5
+    assert channel_rows[0][0] == 200
+    assert channel_rows[1][:4] == [300, "20040418", 0, 0.1]
+    assert channel_rows[-1] == ["400", 5, 48, "A", None, None]
+    assert channel_rows == rows
+
+    channel_rows.append([900])
+    assert list(channel_rows)[-1] == [900]
+
+
+def test_dense_day():
+    """Gaps should be null runs, and the last reading of an interval used"""
+    readings = [(2, 1.5, "A"), (3, 2, "E", 79, "Est"), (3, 4, "A"), (9, 1, "A")]
+    values, day_events = dense_day(readings, 8)
+    assert values == [0, 0, 1.5, 4, 0, 0, 0, 0]
+    assert day_events == [
+        (0, "N", None, None),
+        (2, "A", None, None),
+        (4, "N", None, None),
+    ]
+
+    # A first run without any quality is not recorded
+    values, day_events = dense_day([(0, 1), (1, 2)], 3)
+    assert day_events == [(2, "N", None, None)]
+
+
+def test_readings_without_quality():
+    """Readings without a quality give a V day without 400 rows"""
+    start = datetime(2004, 4, 1)
+    readings = [(start + timedelta(minutes=30 * (x + 1)), x) for x in range(48)]
+    m = NEM12(to_participant="123")
+    m.add_readings("123", "E1", "E1", "kWh", readings)
+    rows = list(m.build_output())
+    assert rows[2][-5:] == ["V", None, None, None, None]
+    assert len(rows) == 4
+
+    # Merging in a late reading keeps the day without quality details
+    m.add_readings("123", "E1", "E1", "kWh", [(start + timedelta(hours=1), 9)])
+    rows = list(m.build_output())
+    assert rows[2][2:5] == [0, 9, 2]
+    assert rows[2][-5] == "V"
+    assert len(rows) == 4
+
+
+def test_packed_runs():
+    """Quality runs are packed, shared between days and pickled as labels"""
+    day_events = [(0, "A", None, None), (2, "E", 79, "Est")]
+    runs = quality_events(day_events, 4)
+    assert runs is quality_events(list(day_events), 4)
+    record = DayRecord("20040101", [1, 2, 3, 4], None, runs)
+    assert record.num_runs == 2
+    assert [x.to_row() for x in record.events] == [
+        ["400", 1, 2, "A", None, None],
+        ["400", 3, 4, "E", 79, "Est"],
+    ]
+    assert record.__getstate__()["runs"] == [
+        (1, 2, "A", None, None),
+        (3, 4, "E", 79, "Est"),
+    ]
+    copied = pickle.loads(pickle.dumps(record))
+    assert list(copied.to_rows()) == list(record.to_rows())
+
+    # Unhashable event details are still packed
+    runs = quality_events([(0, "E", 79, ["Est"])], 4)
+    assert list(DayRecord("20040101", [1] * 4, None, runs).to_rows())[0][-5:-2] == [
+        "E",
+        79,
+        ["Est"],
+    ]
@@ -0,0 +1,52 @@
+from datetime import date
+
+import pytest
+
+from nemwriter import NEM12
+
+
+@pytest.fixture
+def example_builder(make_readings, file_time):
+    def build(nmis=("NMI1", "NMI2", "NMI3"), days=range(1, 7)):
+        """Readings change from 30 to 15 minute intervals on the 4th"""
+        m = NEM12(to_participant="123", file_time=file_time)
+        for nmi in nmis:
+            for day in days:
+                readings = make_readings(
+                    day, interval=30 if day < 4 else 15, estimate_every=5
+                )
+                m.add_readings(nmi, "E1B1", "E1", "kWh", readings)
+                m.add_readings(nmi, "E1B1", "B1", "kWh", readings)
+        return m
+
+    return build
+
+
+def test_select(example_builder):
+    """A selection should match building only the NMIs and days selected"""
+    m = example_builder()
+    subset = m.select(["NMI3", "NMI1", "NMI9"], date(2004, 4, 2), date(2004, 4, 5))
+    expected = example_builder(["NMI1", "NMI3"], range(2, 6))
+    assert list(subset.build_output()) == list(expected.build_output())
+    assert subset.days == expected.days
+    assert subset.nem_filename() == expected.nem_filename()
+    assert len(list(m.build_output())) > len(list(subset.build_output()))
+
+
+def test_select_header(example_builder):
+    """Days after an interval change keep the 200 record of their length"""
+    subset = example_builder().select("NMI2", start_date=date(2004, 4, 5))
+    rows = list(subset.build_output())
+    assert rows[1][:9] == [200, "NMI2", "E1B1", "", "B1", "", "", "kWh", 15]
+    assert subset.days == ["20040405", "20040406"]
+
+
+def test_select_output(tmp_path, example_builder):
+    m = example_builder()
+    subset = m.select(end_date=date(2004, 4, 1))
+    assert list(subset.meters) == ["NMI1", "NMI2", "NMI3"]
+    csv_file = subset.output_csv(tmp_path / "subset.csv")
+    expected = example_builder(days=[1]).output_csv(tmp_path / "expected.csv")
+    assert csv_file.read_text() == expected.read_text()
+    assert subset.output_hash is not None
+    assert m.output_hash is None
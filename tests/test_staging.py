@@ -0,0 +1,72 @@
+import mmap
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from nemwriter import NEM12
+
+
+def example_builder(file_time):
+    m = NEM12(to_participant="123", from_participant="456", file_time=file_time)
+    index = pd.date_range("2004-04-01 00:05", periods=3 * 288, freq="5min")
+    df = pd.DataFrame({"E1": np.arange(len(index)) / 8, "B1": 1.0}, index=index)
+    df["Quality"] = np.where(np.arange(len(index)) % 50 == 0, "E52", "A")
+    m.add_dataframe("NMI1", df)
+    start = datetime(2004, 4, 2)
+    readings = [
+        [start + timedelta(minutes=30 * (x + 1)), x * 10**11, "F14", 79, "Comms"]
+        for x in range(20)
+    ]
+    m.add_readings(
+        "NMI2",
+        "E1",
+        "E1",
+        "kWh",
+        readings,
+        next_scheduled_read_date=datetime(2004, 5, 1),
+        update_datetime=datetime(2004, 4, 3, 1, 2, 3),
+    )
+    return m
+
+
+def test_staged_output(tmp_path, file_time):
+    """A loaded staging file should give the same output"""
+    m = example_builder(file_time)
+    staged = m.dump_staged(tmp_path / "output.stg")
+    loaded = NEM12.load_staged(staged, file_time=file_time)
+    assert loaded.from_participant == "456"
+    assert loaded.days == m.days
+    assert list(loaded.build_output()) == list(m.build_output())
+    assert list(loaded.build_lines(3)) == list(m.build_lines(3))
+    assert loaded.nem_filename() == m.nem_filename()
+
+    # Values are views of the mapped file, not copies
+    record = loaded.meters["NMI1"]["E1"].records[1]
+    assert isinstance(record.values, memoryview)
+    assert isinstance(record.values.obj, mmap.mmap)
+
+    # Readings can still be merged into the loaded days
+    later = [[datetime(2004, 4, 2, 0, 30), 1, "A"]]
+    loaded.add_readings("NMI2", "E1", "E1", "kWh", later)
+    m.add_readings("NMI2", "E1", "E1", "kWh", later)
+    assert list(loaded.build_lines()) == list(m.build_lines())
+
+
+def test_staged_errors(tmp_path):
+    m = NEM12(to_participant="123")
+    m.add_readings("NMI1", "E1", "E1", "kWh", [[datetime(2004, 4, 1, 1), 2**70, "A"]])
+    with pytest.raises(ValueError, match="Can not stage"):
+        m.dump_staged(tmp_path / "output.stg")
+    (tmp_path / "empty.stg").touch()
+    with pytest.raises(ValueError, match="not a NEM12 staging file"):
+        NEM12.load_staged(tmp_path / "empty.stg")
+
+
+def test_staged_without_quality(tmp_path, make_readings):
+    m = NEM12(to_participant="123")
+    readings = [tuple(x[:2]) for x in make_readings()]
+    m.add_readings("NMI1", "E1", "E1", "kWh", readings)
+    loaded = NEM12.load_staged(m.dump_staged(tmp_path / "output.stg"))
+    assert list(loaded.build_output())[1:] == list(m.build_output())[1:]
@@ -0,0 +1,74 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from nemwriter import NEM12, NEM13, NEM12Writer
+from nemwriter.stats import NULL_STATS, Stats
+
+
+def test_nem12_stats(tmp_path, make_readings):
+    """Each stage should be timed with its rows and bytes"""
+    finished = []
+    stats = Stats(callback=lambda name, seconds, stage: finished.append(name))
+    m = NEM12(to_participant="123", stats=stats)
+    m.add_readings("123", "E1", "E1", "kWh", make_readings())
+    index = pd.date_range("2004-04-02 00:30", periods=48, freq="30min")
+    m.add_dataframe("456", pd.DataFrame({"E1": np.arange(48.0)}, index=index))
+    output_file = m.output_csv(tmp_path / "output.csv")
+    m.output_zip(tmp_path / "output.zip")
+
+    totals = stats.as_dict()
+    assert totals["add_readings"]["rows"] == 48
+    assert totals["add_dataframe"]["rows"] == 48
+    assert totals["channel_days"]["calls"] == 1
+    assert totals["build_lines"]["calls"] == 2
+    assert totals["build_lines"]["rows"] == 2 * 6
+    assert totals["output_csv"]["bytes"] == output_file.stat().st_size
+    assert totals["build_lines"]["bytes"] == 2 * totals["output_csv"]["bytes"]
+    assert 0 < totals["build_lines"]["peak_bytes"] < totals["output_csv"]["bytes"]
+    assert totals["output_zip"]["bytes"] > 0
+    assert all(x["seconds"] >= 0 for x in totals.values())
+    assert finished.count("build_lines") == 2
+    stats.reset()
+    assert stats.as_dict() == {}
+
+
+def test_writer_stats(tmp_path, make_readings):
+    stats = Stats()
+    with NEM12Writer(tmp_path / "output.csv", to_participant="123", stats=stats) as w:
+        w.add_readings("123", "E1", "E1", "kWh", make_readings(1))
+        w.add_readings("456", "E1", "E1", "kWh", make_readings(2))
+    assert stats["flush_nmi"].calls == 2
+    assert stats["add_readings"].rows == 96
+    assert 0 < stats["flush_nmi"].peak_bytes < stats["flush_nmi"].bytes
+
+
+def test_nem13_stats():
+    stats = Stats()
+    m = NEM13(to_participant="123", stats=stats)
+    m.add_records(
+        {
+            "nmi": ["123", "123"],
+            "nmi_configuration": ["11", "11"],
+            "register_id": ["01", "01"],
+            "nmi_suffix": ["11", "11"],
+            "previous_read": [0, 10],
+            "previous_read_date": [datetime(2004, 1, 1), datetime(2004, 4, 1)],
+            "current_read": [10, 20],
+            "current_read_date": [datetime(2004, 4, 1), datetime(2004, 7, 1)],
+            "quantity": [10, 10],
+        }
+    )
+    assert len(list(m.build_output())) == 4
+    assert stats["add_records"].rows == 2
+    assert stats["build_output"].rows == 4
+
+
+def test_disabled(make_readings):
+    """Without stats nothing is recorded"""
+    m = NEM12(to_participant="123")
+    assert m.stats is NULL_STATS
+    m.add_readings("123", "E1", "E1", "kWh", make_readings())
+    list(m.build_lines())
+    assert NULL_STATS.as_dict() == {}
@@ -0,0 +1,56 @@
+from datetime import datetime, timedelta
+from zipfile import ZIP_DEFLATED, ZIP_STORED, ZipFile
+
+import pytest
+
+from nemwriter import NEM12, NEM13
+
+
+def nem12_builder():
+    m = NEM12(to_participant="123")
+    readings = [
+        [datetime(2004, 4, 18, 0, 0) + timedelta(minutes=30 * (i + 1)), i, "A"]
+        for i in range(24 * 2)
+    ]
+    m.add_readings(
+        nmi="123",
+        nmi_configuration="E1",
+        nmi_suffix="E1",
+        uom="kWh",
+        readings=readings,
+    )
+    return m
+
+
+def nem13_builder():
+    m = NEM13(to_participant="123")
+    m.add_reading(
+        nmi="123",
+        nmi_configuration="E1",
+        register_id="1",
+        nmi_suffix="E1",
+        previous_read=412,
+        previous_read_date=datetime(2017, 1, 1),
+        current_read=512,
+        current_read_date=datetime(2017, 2, 1),
+        quantity=100,
+    )
+    return m
+
+
+@pytest.mark.parametrize("builder", [nem12_builder, nem13_builder])
+@pytest.mark.parametrize("compression", [ZIP_STORED, ZIP_DEFLATED])
+def test_zip_compression(builder, compression):
+    """Zipped csv should match the csv output for any compression"""
+    m = builder()
+    csv_file = m.output_csv(file_path="tests/compression.csv")
+    zip_file = m.output_zip(
+        file_path="tests/compression.zip", compression=compression, compresslevel=1
+    )
+
+    with ZipFile(zip_file) as zf:
+        (entry,) = zf.infolist()
+        assert entry.filename == "compression.csv"
+        assert entry.compress_type == compression
+        with open(csv_file, "rb") as f:
+            assert zf.read(entry) == f.read()